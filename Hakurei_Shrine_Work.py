@@ -2,9 +2,42 @@ import random
 import json
 import os
 import threading
+import time
 from datetime import datetime, timedelta
 
-file_lock = threading.Lock()  # A lock to keep my shrine’s records safe from chaos!
+from periodic import PeriodicTask
+
+file_lock = threading.RLock()  # A lock to keep my shrine’s records safe from chaos!
+
+WORK_FILE = "Hakurei_work.json"  # Snapshot of everyone’s progress
+JOURNAL_FILE = "Hakurei_work.journal"  # One line per chore done since the last snapshot
+
+_view = None  # Everyone’s progress as of the latest chore, kept in memory
+_plan = None  # Set by configure_shards; None keeps everyone in one snapshot and one journal
+_journals = {}  # The open journal of each shard (None is the key when not sharded)
+_journal_entries = {}  # Chores written down per shard since its last snapshot
+_compactor = None  # The regular tidy-up, set up by start_compaction
+on_timing = None  # Set to on_timing(op, seconds) if someone wants to know how long my paperwork takes
+
+def _report(op, started):
+    if on_timing is not None:
+        on_timing(op, time.perf_counter() - started)
+
+def configure_shards(plan):
+    # Splitting the paperwork so each process only carries its own shards’ guilds
+    global _plan
+    _plan = plan if plan is not None and plan.enabled else None
+
+def _shard_ids():
+    return [None] if _plan is None else _plan.shard_ids
+
+def _shard_of(guild_id):
+    return None if _plan is None else _plan.shard_of(guild_id)
+
+def _files(shard_id):
+    if shard_id is None:
+        return WORK_FILE, JOURNAL_FILE
+    return _plan.path(WORK_FILE, shard_id), _plan.path(JOURNAL_FILE, shard_id)
 
 def load_json(filename, default=None):
     # Reimu’s way of grabbing JSON files—don’t mess up my shrine’s records!
@@ -26,26 +59,140 @@ def save_json(filename, data):
     except Exception as e:
         print(f"Hey, something went wrong saving {filename}: {e}")  # Reimu’s grumble when saving fails
 
-def get_user_work_data(guild_id, user_id):
-    # Fetching work records from the shrine’s dusty archive
-    data = load_json("Hakurei_work.json")
-    data.setdefault(guild_id, {})
-    data[guild_id].setdefault(user_id, {
+def _new_record():
+    return {
         "basic": 0,
         "normal": 0,
         "hard": 0,
         "last_work": None  # Setting up cooldown for shrine chores
-    })
+    }
+
+def _replay(view, journal_file):
+    # Replaying every chore written down since the snapshot
+    entries = 0
+    if os.path.exists(journal_file):
+        with open(journal_file, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # A half-written line from a crash—skip it
+                # Each line holds the whole record, so replaying it twice is harmless
+                view.setdefault(entry["g"], {})[entry["u"]] = entry["r"]
+                entries += 1
+    return entries
+
+def _read_layout(paths):
+    work_file, journal_file = paths
+    part = load_json(work_file)
+    _replay(part, journal_file)
+    return part
+
+def _seed_shard(shard_id, part):
+    _write_snapshot(_files(shard_id)[0], part)
+
+def _write_snapshot(work_file, snapshot):
+    tmp_file = f"{work_file}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    os.replace(tmp_file, work_file)
+
+def load_work_data():
+    # Reading the last snapshot of each shard and replaying its journal
+    global _view, _journal_entries
+    started = time.perf_counter()
+    with file_lock:
+        view = {}
+        entries = {}
+        if _plan is not None:
+            # First run for a shard (or this shard count): its guilds come from the newest earlier layout
+            _plan.seed_new_shards((WORK_FILE, JOURNAL_FILE), _read_layout, _seed_shard)
+        for shard_id in _shard_ids():
+            work_file, journal_file = _files(shard_id)
+            shard_view = load_json(work_file)
+            entries[shard_id] = _replay(shard_view, journal_file)
+            view.update(shard_view)
+        _view = view
+        _journal_entries = entries
+    _report("work_load", started)
+    return _view
+
+def _get_view():
+    if _view is None:
+        load_work_data()
+    return _view
+
+def _append_journal(guild_id, user_id, record):
+    # Jotting one chore down at the end of its shard’s journal instead of rewriting everything
+    started = time.perf_counter()
+    shard_id = _shard_of(guild_id)
+    journal = _journals.get(shard_id)
+    if journal is None:
+        journal = _journals[shard_id] = open(_files(shard_id)[1], "a", encoding="utf-8")
+    journal.write(json.dumps({"g": guild_id, "u": user_id, "r": record}, ensure_ascii=False) + "\n")
+    journal.flush()
+    _journal_entries[shard_id] = _journal_entries.get(shard_id, 0) + 1
+    _report("work_journal", started)
+
+def compact():
+    # Tidying up: write a fresh snapshot and start a new, empty journal for every shard with new chores
+    started = time.perf_counter()
+    with file_lock:
+        pending = [shard_id for shard_id, entries in _journal_entries.items() if entries]
+        if _view is None or not pending:
+            return False
+        for shard_id in pending:
+            work_file, journal_file = _files(shard_id)
+            if shard_id is None:
+                snapshot = _view
+            else:
+                snapshot = {g: users for g, users in _view.items() if _plan.shard_of(g) == shard_id}
+            _write_snapshot(work_file, snapshot)
+            journal = _journals.get(shard_id)
+            if journal is not None:
+                journal.seek(0)
+                journal.truncate()
+            else:
+                open(journal_file, "w", encoding="utf-8").close()
+            _journal_entries[shard_id] = 0
+    _report("work_compact", started)
+    return True
+
+def journal_size():
+    return sum(_journal_entries.values())
+
+def start_compaction(interval=600):
+    # Scheduling a regular clean-up of the work journal; if one fails, it’s logged and I’ll tidy up next time, then
+    global _compactor
+    if _compactor is None:
+        _compactor = PeriodicTask(compact, interval, f"Compaction of {JOURNAL_FILE}", in_executor=True)
+    _compactor.start()
+
+async def stop_compaction():
+    # Waiting for a tidy-up already underway, so no snapshot is left half written
+    if _compactor is not None:
+        await _compactor.stop()
+
+def get_user_work_data(guild_id, user_id):
+    # Fetching work records from the shrine’s dusty archive
+    data = _get_view()
+    with file_lock:
+        data.setdefault(guild_id, {})
+        data[guild_id].setdefault(user_id, _new_record())
     return data
 
 def save_user_work_data(data):
     # Stashing work records back in the shrine’s storage
-    save_json("Hakurei_work.json", data)
+    global _view
+    with file_lock:
+        _view = data
+        for shard_id in _shard_ids():
+            _journal_entries[shard_id] = _journal_entries.get(shard_id, 0) + 1  # Everything changed, so every shard gets a fresh snapshot
+        compact()
 
 def is_on_work_cooldown(guild_id, user_id, cooldown_hours=1):
     # Checking if you’re slacking or spamming shrine work—give me a break!
-    data = load_json("Hakurei_work.json")
-    user_data = data.get(guild_id, {}).get(user_id, {})
+    user_data = _get_view().get(guild_id, {}).get(user_id, {})
     last_work = user_data.get("last_work")
 
     if not last_work:
@@ -67,6 +214,10 @@ def is_on_work_cooldown(guild_id, user_id, cooldown_hours=1):
 
 def do_work(guild_id, user_id):
     # Assigning chores at the shrine—don’t expect me to do all the work!
+    with file_lock:
+        return _do_work(guild_id, user_id)
+
+def _do_work(guild_id, user_id):
     data = get_user_work_data(guild_id, user_id)
     user_data = data[guild_id][user_id]
 
@@ -111,11 +262,10 @@ def do_work(guild_id, user_id):
     # Updating your work progress and setting a cooldown
     user_data[selected_work] += 1
     user_data["last_work"] = datetime.utcnow().isoformat()
-    save_user_work_data(data)
+    _append_journal(guild_id, user_id, user_data)
 
     return selected_work, task, reward
 
 def get_user_progress(guild_id, user_id):
     # Checking how much you’ve helped at the shrine—impress me!
-    data = load_json("Hakurei_work.json")
-    return data.get(guild_id, {}).get(user_id, {"basic": 0, "normal": 0, "hard": 0, "last_work": None})
+    return _get_view().get(guild_id, {}).get(user_id, _new_record())
@@ -1,171 +1,378 @@
-import sqlite3
-from datetime import datetime, timedelta, timezone
+import time
+STARTED = time.perf_counter()
+import multiprocessing
+from datetime import datetime, timedelta
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
 import os
-import openai
 import sys
 import logging
-from omikuji import draw_lots
+from omikuji import OmikujiEngine
 import json
-import yaml
-import random
 import Hakurei_Shrine_Work as HSW
+from reimu_db import Database
+from ledger import Ledger, InsufficientFunds, SPECIAL
+from lots_cache import LotsCache, ShardedLotsCache
+from llm_client import LLMClient
+from key_pool import KeyPool
+from message_store import MessageStore, RetentionJanitor
+from context_builder import ContextBuilder
+from persona import PersonaCache
+from response_cache import ResponseCache, cache_key
+from user_locks import UserLocks
+from reply_tracker import ReplyTracker
+from leaderboard import Leaderboards, DONATIONS, BALANCE
+from embeds import EmbedTemplates
+from metrics import Metrics, LoopLagMonitor, MetricsExporter, PhaseTimer
+from trace_recorder import TraceRecorder
+from storage import AsyncStorage
+from sharding import ShardPlan, parse_shard_ids
+from workers import WorkerPool, WorkerError
+from streaming_reply import StreamingReply
+from mention_batcher import MentionBatcher
+from collections import Counter
 import asyncio
-import yt_dlp
+
+startup = PhaseTimer(STARTED)
+startup.mark("imports")
 
 load_dotenv()
 
 TOKEN = os.getenv('REIMU_TOKEN')
 AUTHOR_ID = int(os.getenv('AUTHOR_ID', 0))
-API_URL = 'https://api.chatanywhere.org/v1/'
+API_URL = os.getenv('REIMU_API_URL', 'https://api.chatanywhere.org/v1/')
+LLM_CONCURRENCY = int(os.getenv('REIMU_LLM_CONCURRENCY', 8))
+LLM_TIMEOUT = float(os.getenv('REIMU_LLM_TIMEOUT', 60))
+CONTEXT_ROWS = int(os.getenv('REIMU_CONTEXT_ROWS', 50))
+CONTEXT_TOKENS = int(os.getenv('REIMU_CONTEXT_TOKENS', 1000))
+OMIKUJI_WEIGHTS = json.loads(os.getenv('REIMU_OMIKUJI_WEIGHTS', '{}'))
+OMIKUJI_DAILY = os.getenv('REIMU_OMIKUJI_DAILY', '0') == '1'
+RESPONSE_CACHE_SIZE = int(os.getenv('REIMU_RESPONSE_CACHE_SIZE', 1024))
+RESPONSE_CACHE_TTL = float(os.getenv('REIMU_RESPONSE_CACHE_TTL', 600))
+RESPONSE_CACHE_PERSIST = os.getenv('REIMU_RESPONSE_CACHE_PERSIST', '0') == '1'
 api_keys = [
     {"key": os.getenv('CHATANYWHERE_API3'), "limit": 200, "remaining": 200}
+] + [
+    {"key": key.strip(), "limit": 200, "remaining": 200}
+    for key in os.getenv('CHATANYWHERE_API_KEYS', '').split(',') if key.strip()
 ]
-current_api_index = 0
+KEY_POLICY = os.getenv('REIMU_KEY_POLICY', 'lrt')
+METRICS_PORT = int(os.getenv('REIMU_METRICS_PORT', 0)) or None
+METRICS_FILE = os.getenv('REIMU_METRICS_FILE') or None
+TRACE_FILE = os.getenv('REIMU_TRACE_FILE') or None
+TRACE_SALT = os.getenv('REIMU_TRACE_SALT') or None
+STORAGE_WORKERS = int(os.getenv('REIMU_STORAGE_WORKERS', 4))
+SHARD_COUNT = int(os.getenv('REIMU_SHARD_COUNT', 0)) or None
+SHARD_IDS = parse_shard_ids(os.getenv('REIMU_SHARD_IDS'))
+WORKERS = int(os.getenv('REIMU_WORKERS', 0))
+WORKER_QUEUE = int(os.getenv('REIMU_WORKER_QUEUE', 32))
+STREAM_REPLIES = os.getenv('REIMU_STREAM', '0') == '1'
+STREAM_EDIT_INTERVAL = float(os.getenv('REIMU_STREAM_EDIT_INTERVAL', 1.2))
+COALESCE_WINDOW = float(os.getenv('REIMU_COALESCE_WINDOW', 0))
+COALESCE_MAX = int(os.getenv('REIMU_COALESCE_MAX', 8))
+# Worker processes re-run this module on spawn; they must not truncate the log or append to the trace
+IS_WORKER = multiprocessing.parent_process() is not None
 
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler(filename='reimu-error.log', encoding='utf-8', mode='w'),
+        logging.FileHandler(filename='reimu-error.log', encoding='utf-8', mode='a' if IS_WORKER else 'w'),
         logging.StreamHandler()
     ]
 )
+startup.mark("config")
 
 intents = discord.Intents.default()
 intents.message_content = True
 intents.guilds = True
 intents.members = True
-bot = commands.Bot(command_prefix='!', intents=intents)
+shard_plan = ShardPlan(SHARD_COUNT, SHARD_IDS)
+
+class ReimuBot(commands.AutoShardedBot if shard_plan.enabled else commands.Bot):
+    async def close(self):
+        await loop_lag.stop()
+        if worker_pool is not None:
+            await worker_pool.stop()
+        await metrics_exporter.stop()
+        await janitor.stop()
+        await persona.stop()
+        await HSW.stop_compaction()
+        await lots_cache.stop()
+        await llm.close()
+        if trace_recorder is not None:
+            trace_recorder.close()
+        await super().close()
+
+bot = ReimuBot(command_prefix='!', intents=intents, **shard_plan.bot_kwargs())
+metrics = Metrics()
+loop_lag = LoopLagMonitor(metrics)
+metrics_exporter = MetricsExporter(metrics, port=METRICS_PORT, path=METRICS_FILE)
+db = Database("example3.db", on_timing=metrics.observer("reimu_sqlite_seconds"))
+ledger = Ledger(db)
+message_store = MessageStore(db)
+storage = AsyncStorage(ledger, message_store, max_workers=STORAGE_WORKERS, on_timing=metrics.observer("reimu_storage_seconds"))
+# Windows expire as often as the janitor runs: worker processes never see its on_reclaim
+context_builder = ContextBuilder(message_store, max_rows=CONTEXT_ROWS, token_budget=CONTEXT_TOKENS, ttl=60.0)
+janitor = RetentionJanitor(message_store, minutes=30, interval=60.0, on_reclaim=lambda rows: context_builder.invalidate())
+if shard_plan.enabled:
+    lots_cache = ShardedLotsCache("Reimu_lots.json", shard_plan, on_timing=metrics.observer("reimu_json_seconds"))
+else:
+    lots_cache = LotsCache("Reimu_lots.json", on_timing=metrics.observer("reimu_json_seconds"))
+HSW.on_timing = metrics.observer("reimu_json_seconds")
+HSW.configure_shards(shard_plan)
+persona = PersonaCache(db, "Reimu Hakurei")
+response_cache = ResponseCache(
+    max_entries=RESPONSE_CACHE_SIZE,
+    ttl=RESPONSE_CACHE_TTL,
+    db=db if RESPONSE_CACHE_PERSIST else None
+)
+user_locks = UserLocks()
+reply_tracker = ReplyTracker()
+leaderboards = Leaderboards()
+omikuji_engine = OmikujiEngine(weights=OMIKUJI_WEIGHTS)
+embed_templates = EmbedTemplates(omikuji_engine.fortunes)
+# Every worker runs its own pool over the same keys, so each gets an even share of the quota
+key_pool = KeyPool(api_keys, policy=KEY_POLICY, shares=WORKERS if IS_WORKER else 1)
+llm = LLMClient(API_URL, max_concurrency=LLM_CONCURRENCY, timeout=LLM_TIMEOUT, key_pool=key_pool)
+trace_recorder = TraceRecorder(TRACE_FILE, salt=TRACE_SALT) if TRACE_FILE and not IS_WORKER else None
+startup.mark("objects")
 
 def init_db():
-    conn = sqlite3.connect("example3.db")
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS UserMessages 
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                  user_id TEXT, 
-                  message TEXT, 
-                  repeat_count INTEGER DEFAULT 0, 
-                  is_permanent BOOLEAN DEFAULT FALSE,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS BackgroundInfo 
-                 (user_id TEXT PRIMARY KEY, 
-                  info TEXT)''')
-    conn.commit()
-    conn.close()
-
-def record_message(user_id, message):
-    conn = sqlite3.connect("example3.db")
-    c = conn.cursor()
-    c.execute("""
-        SELECT id, repeat_count, is_permanent FROM UserMessages 
-        WHERE user_id = ? AND message = ? AND is_permanent = FALSE
-    """, (user_id, message))
-    row = c.fetchone()
-
-    if row:
-        new_count = row[1] + 1
-        c.execute("""
-            UPDATE UserMessages SET repeat_count = ? WHERE id = ?
-        """, (new_count, row[0]))
-        if new_count >= 10:
-            c.execute("""
-                UPDATE UserMessages SET is_permanent = TRUE WHERE id = ?
-            """, (row[0],))
-    else:
-        c.execute("""
-            INSERT INTO UserMessages (user_id, message) VALUES (?, ?)
-        """, (user_id, message))
+    message_store.init_schema()
+    with db.write("init_db") as conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS BackgroundInfo 
+                     (user_id TEXT PRIMARY KEY, 
+                      info TEXT)''')
+    persona.init_schema()
+    persona.load()
+    response_cache.init_schema()
+    response_cache.load()
+    ledger.init_schema()
+    ledger.migrate_from_json("Reimu_balance.json", "balance.json")
+    # Balances live in one shared database; each shard only ranks its own guilds
+    leaderboards.rebuild(lots_cache.data, (row for row in ledger.totals() if shard_plan.owns(row[0])))
+
+async def record_message(user_id, message):
+    repeat_count = await storage.record_message(user_id, message)
+    context_builder.add(user_id, message, repeat_count)
+    return repeat_count
+
+async def fetch_context(user_id, peek=False):
+    """The context block for ``user_id``; a cache miss is read on the storage pool, not the event loop."""
+    if context_builder.cached(user_id):
+        return context_builder.peek(user_id) if peek else context_builder.build(user_id)
+    with context_builder.loading(user_id) as load:
+        rows = await storage.recent_messages(user_id, context_builder.max_rows)
+        if peek or load.stale:
+            # A message recorded during the read may be missing from rows; don't cache them
+            return context_builder.peek(user_id, rows)
+        return context_builder.build(user_id, rows)
+
+async def build_prompt(prompt, user_id, guild_id=None):
+    """Return the response cache key and the chat messages for a mention."""
+    context = await fetch_context(user_id)
+
+    updated_background_info = persona.get(guild_id)
+
+    said = f"{user_id} says {prompt}"
+    # Keyed on the user turn as sent, which names the speaker: one user's reply never answers another
+    key = cache_key(said, f"{persona.version}:{guild_id}", context)
+    messages = [
+        {"role": "system", "content": f"You are now Reimu Hakurei, the shrine maiden of the Hakurei Shrine. Background info: {updated_background_info}"},
+        {"role": "user", "content": said},
+        {"role": "assistant", "content": f"Known context: \n{context}"}
+    ]
+    return key, messages
+
+async def build_batch_prompt(mentions):
+    """Chat messages asking for one reply to a coalesced batch of ``(user_id, message, guild_id)`` mentions."""
+    speakers = list(dict.fromkeys(user_id for user_id, _, _ in mentions))
+    # peek: in worker mode a batch may be answered outside its speakers' own workers, which must not keep their windows
+    context = "\n".join(filter(None, [await fetch_context(user_id, peek=True) for user_id in speakers]))
+
+    updated_background_info = persona.get(mentions[0][2])
+
+    said = "\n".join(f"<@{user_id}> says {user_message}" for user_id, user_message, _ in mentions)
+    return [
+        {"role": "system", "content": f"You are now Reimu Hakurei, the shrine maiden of the Hakurei Shrine. Background info: {updated_background_info}"},
+        {"role": "system", "content": "Several people spoke to you at once. Answer all of them in one reply, addressing each speaker by their <@id> mention."},
+        {"role": "user", "content": said},
+        {"role": "assistant", "content": f"Known context: \n{context}"}
+    ]
 
-    conn.commit()
-    conn.close()
+async def prompt_for(mentions):
+    """Cache key and chat messages for one mention or a batch; batches are never cached."""
+    if len(mentions) == 1:
+        user_id, user_message, guild_id = mentions[0]
+        return await build_prompt(user_message, user_id, guild_id)
+    return None, await build_batch_prompt(mentions)
 
-def clean_old_messages(minutes=30):
+async def complete(messages):
     try:
-        with sqlite3.connect("example3.db") as conn:
-            c = conn.cursor()
-            time_ago = datetime.now(timezone.utc) - timedelta(minutes=minutes)
-            c.execute("""
-                DELETE FROM UserMessages 
-                WHERE created_at < ? AND is_permanent = FALSE
-            """, (time_ago,))
-            deleted_rows = c.rowcount
-            conn.commit()
-            logging.info(f"Deleted {deleted_rows} old messages")
-            return deleted_rows
-    except sqlite3.Error as e:
-        logging.error(f"Database error: {e}")
-        return 0
-
-def summarize_context(context):
-    return context[:1500]
-
-def generate_response(prompt, user_id):
-    try:
-        openai.api_base = API_URL
-        openai.api_key = os.getenv('CHATANYWHERE_API3')
-
-        conn = sqlite3.connect("example3.db")
-        c = conn.cursor()
-        c.execute("""
-            SELECT message FROM UserMessages 
-            WHERE user_id = ? OR user_id = 'system'
-        """, (user_id,))
-        context = "\n".join([f"{user_id} says {row[0]}" for row in c.fetchall()])
-        conn.close()
-
-        user_background_info = get_user_background_info("Reimu Hakurei")
-        if not user_background_info:
-            updated_background_info = (
-                "I am Reimu Hakurei, the shrine maiden of the Hakurei Shrine, and the resolver of incidents in Gensokyo. "
-                "As the guardian of Gensokyo, I possess the ability to manipulate spiritual power and barriers, "
-                "defeating troublesome youkai with my spell cards. "
-                "I usually lead a relaxed life, enjoying tea and rice dumplings, "
-                "but the shrine's offerings are scarce, so I'm always worried about donation money. "
-                "Oh, if you visit the shrine, please donate some offering money; I'll be very happy~"
-            )
-            conn = sqlite3.connect("example3.db")
-            c = conn.cursor()
-            c.execute("""
-                INSERT INTO BackgroundInfo (user_id, info) VALUES (?, ?)
-            """, ("Reimu Hakurei", updated_background_info))
-            conn.commit()
-            conn.close()
-        else:
-            updated_background_info = user_background_info
+        with metrics.timer("reimu_llm_seconds"):
+            return await llm.complete(messages)
+    except Exception as e:
+        metrics.inc("reimu_llm_errors_total", error=type(e).__name__)
+        raise
 
-        if len(context.split()) > 3000:
-            context = summarize_context(context)
+async def cache_response(key, response):
+    if response_cache.db is not None:
+        await storage.run("response_cache_put", response_cache.put, key, response)
+    else:
+        response_cache.put(key, response)
 
-        messages = [
-            {"role": "system", "content": f"You are now Reimu Hakurei, the shrine maiden of the Hakurei Shrine. Background info: {updated_background_info}"},
-            {"role": "user", "content": f"{user_id} says {prompt}"},
-            {"role": "assistant", "content": f"Known context: \n{context}"}
-        ]
+async def generate_response(prompt, user_id, guild_id=None):
+    try:
+        key, messages = await build_prompt(prompt, user_id, guild_id)
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
 
-        response = openai.ChatCompletion.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            request_timeout=600
-        )
+        response = await complete(messages)
+        await cache_response(key, response)
+        return response
 
-        return response['choices'][0]['message']['content'].strip()
+    except Exception as e:
+        logging.error(f"API error: {str(e)}")
+        return "Reimu is a bit busy right now, come back later~♪"
 
+async def generate_batch_response(mentions):
+    try:
+        return await complete(await build_batch_prompt(mentions))
     except Exception as e:
         logging.error(f"API error: {str(e)}")
         return "Reimu is a bit busy right now, come back later~♪"
 
-def get_user_background_info(user_id):
-    conn = sqlite3.connect("example3.db")
-    c = conn.cursor()
-    c.execute("""
-        SELECT info FROM BackgroundInfo WHERE user_id = ?
-    """, (user_id,))
-    rows = c.fetchall()
-    conn.close()
-    return "\n".join([row[0] for row in rows]) if rows else None
+async def stream_response(channel, mentions):
+    """Post the reply to ``channel`` while it is generated; returns the messages sent."""
+    reply = StreamingReply(channel, edit_interval=STREAM_EDIT_INTERVAL)
+    try:
+        key, messages = await prompt_for(mentions)
+        cached = response_cache.get(key) if key is not None else None
+        if cached is not None:
+            await reply.feed(cached)
+            return await reply.finish()
+
+        started = time.perf_counter()
+        try:
+            with metrics.timer("reimu_llm_seconds"):
+                async for chunk in llm.stream(messages):
+                    if not reply.text:
+                        metrics.observe("reimu_llm_first_chunk_seconds", time.perf_counter() - started)
+                    await reply.feed(chunk)
+        except Exception as e:
+            metrics.inc("reimu_llm_errors_total", error=type(e).__name__)
+            raise
+        if key is not None:
+            await cache_response(key, reply.text.strip())
+        return await reply.finish()
+
+    except Exception as e:
+        logging.error(f"API error: {str(e)}")
+        if not reply.messages:
+            # Nothing shown yet; a reply cut off mid-stream keeps what it has
+            await reply.feed("Reimu is a bit busy right now, come back later~♪")
+        return await reply.finish()
+
+async def answer_mentions(mentions, record=True, reply=True):
+    """Record and answer one mention, or a coalesced batch of them with a single completion.
+
+    In worker mode a batch is split up: each speaker's own worker records
+    their line (``reply=False``) and one worker answers it (``record=False``).
+    """
+    if record:
+        for user_id, user_message, _ in mentions:
+            await record_message(user_id, user_message)
+    if not reply:
+        return None
+    if len(mentions) == 1:
+        user_id, user_message, guild_id = mentions[0]
+        return await generate_response(user_message, user_id, guild_id)
+    return await generate_batch_response(mentions)
+
+def init_worker():
+    # Runs in each worker process; the gateway already created the schema
+    persona.load()
+    response_cache.load()
+    persona.start()
+
+async def close_worker():
+    # Runs in each worker process once it has answered its last mention
+    await persona.stop()
+    await llm.close()
+    storage.close()
+    db.close()
+
+def worker_health():
+    stats = llm.stats()
+    return {"llm_in_flight": stats["in_flight"], "llm_errors": stats["errors"] + stats["timeouts"], "keys": key_pool.stats()}
+
+worker_pool = WorkerPool(
+    answer_mentions, size=WORKERS, max_pending=WORKER_QUEUE,
+    initializer=init_worker, shutdown=close_worker, health=worker_health
+) if WORKERS and not IS_WORKER else None
+
+def key_pool_stats():
+    """``KeyPool.stats()`` of the pool doing the completions; with workers, summed over their shares of each key."""
+    if worker_pool is None:
+        return key_pool.stats()
+    keys = {}
+    for health in worker_pool.health_reports():
+        for stats in health.get("keys", []):
+            total = keys.get(stats["key"])
+            if total is None:
+                keys[stats["key"]] = dict(stats)
+                continue
+            for field in ("remaining", "limit", "requests", "throttles", "errors"):
+                total[field] += stats[field]
+            total["backoff_s"] = max(total["backoff_s"], stats["backoff_s"])
+    return list(keys.values())
+
+def publish_key_stats():
+    for stats in key_pool_stats():
+        for field in ("remaining", "limit", "requests", "throttles", "errors", "backoff_s"):
+            metrics.set(f"reimu_api_key_{field}", stats[field], key=stats["key"])
+
+metrics.collect(publish_key_stats)
+
+async def reply_to_mentions(channel, mentions):
+    if STREAM_REPLIES and worker_pool is None:
+        for user_id, user_message, _ in mentions:
+            await record_message(user_id, user_message)
+        sent = await stream_response(channel, mentions)
+    else:
+        if worker_pool is not None:
+            try:
+                if len(mentions) == 1:
+                    response = await worker_pool.submit(mentions[0][0], mentions)
+                else:
+                    # Each line is recorded by its speaker's own worker, keeping that worker's context cache current;
+                    # the batch itself has several speakers, so it is answered by the channel's worker
+                    by_speaker = {}
+                    for mention in mentions:
+                        by_speaker.setdefault(mention[0], []).append(mention)
+                    await asyncio.gather(*(
+                        worker_pool.submit(user_id, own, reply=False) for user_id, own in by_speaker.items()
+                    ))
+                    response = await worker_pool.submit(f"channel:{channel.id}", mentions, record=False)
+            except WorkerError as e:
+                metrics.inc("reimu_worker_errors_total", error=type(e).__name__)
+                logging.error(f"Worker error: {e}")
+                response = "Reimu is a bit busy right now, come back later~♪"
+        else:
+            response = await answer_mentions(mentions)
+        # Split rather than fail when a reply (usually a batch's) runs past Discord's limit
+        reply = StreamingReply(channel)
+        await reply.feed(response)
+        sent = await reply.finish()
+    for message in sent:
+        reply_tracker.remember(message.id)
+
+mention_batcher = MentionBatcher(
+    reply_to_mentions, window=COALESCE_WINDOW, max_batch=COALESCE_MAX
+) if COALESCE_WINDOW > 0 else None
 
 def load_json(file_name, default=None):
     if default is None:
@@ -187,6 +394,7 @@ def load_yaml(file_name, default=None):
     if default is None:
         default = {}
     """Load YAML file"""
+    import yaml  # Only needed here, so not loaded at startup
     try:
         with open(file_name, 'r', encoding='utf-8') as f:
             return yaml.safe_load(f) or default
@@ -199,112 +407,57 @@ def load_yaml(file_name, default=None):
 
 def save_yaml(file_name, data):
     """Save YAML file"""
+    import yaml
     with open(file_name, 'w', encoding='utf-8') as f:
         yaml.dump(data, f, allow_unicode=True)
 
-def is_on_cooldown(user_id, cooldown_hours):
-    user_data = load_json("Reimu_lots.json", default={})
-    guild_id = str(user_id.guild.id)
-    user_id = str(user_id.id)
-
-    if guild_id in user_data and user_id in user_data[guild_id]:
-        last_used = datetime.fromisoformat(user_data[guild_id][user_id].get("draw_cooldown", "1970-01-01T00:00:00"))
-        now = datetime.now()
-        cooldown_period = timedelta(hours=cooldown_hours)
-        if now < last_used + cooldown_period:
-            remaining = last_used + cooldown_period - now
-            remaining_time = f"{remaining.seconds // 3600} hours {remaining.seconds % 3600 // 60} minutes"
-            return True, remaining_time
+def is_on_cooldown(user_lots, cooldown_hours):
+    last_used = datetime.fromisoformat(user_lots.get("draw_cooldown") or "1970-01-01T00:00:00")
+    now = datetime.now()
+    cooldown_period = timedelta(hours=cooldown_hours)
+    if now < last_used + cooldown_period:
+        remaining = last_used + cooldown_period - now
+        remaining_time = f"{remaining.seconds // 3600} hours {remaining.seconds % 3600 // 60} minutes"
+        return True, remaining_time
 
     return False, None
 
-def update_cooldown(user_id):
-    user_data = load_json("Reimu_lots.json", default={})
-    guild_id = str(user_id.guild.id)
-    user_id = str(user_id.id)
-
-    if guild_id not in user_data:
-        user_data[guild_id] = {}
-    if user_id not in user_data[guild_id]:
-        user_data[guild_id][user_id] = {}
-
-    user_data[guild_id][user_id]["draw_cooldown"] = datetime.now().isoformat()
-    save_json("Reimu_lots.json", user_data)
-
-def is_on_donation_cooldown(user_id, cooldown_hours):
-    user_data = load_json("Reimu_lots.json", default={})
-    guild_id = str(user_id.guild.id)
-    user_id_str = str(user_id.id)
+def update_cooldown(user_lots):
+    user_lots["draw_cooldown"] = datetime.now().isoformat()
 
-    if guild_id in user_data and user_id_str in user_data[guild_id]:
-        last_donated = user_data[guild_id][user_id_str].get("donation_cooldown", "1970-01-01T00:00:00")
-        last_donated = datetime.fromisoformat(last_donated)
-        now = datetime.now()
-        cooldown_period = timedelta(hours=cooldown_hours)
-        if now < last_donated + cooldown_period:
-            remaining = last_donated + cooldown_period - now
-            remaining_time = f"{remaining.seconds // 3600} hours {remaining.seconds % 3600 // 60} minutes"
-            return True, remaining_time
+def is_on_donation_cooldown(user_lots, cooldown_hours):
+    last_donated = datetime.fromisoformat(user_lots.get("donation_cooldown") or "1970-01-01T00:00:00")
+    now = datetime.now()
+    cooldown_period = timedelta(hours=cooldown_hours)
+    if now < last_donated + cooldown_period:
+        remaining = last_donated + cooldown_period - now
+        remaining_time = f"{remaining.seconds // 3600} hours {remaining.seconds % 3600 // 60} minutes"
+        return True, remaining_time
 
     return False, None
 
-def update_donation_record(user_id, amount):
-    user_data = load_json("Reimu_lots.json", default={})
-    guild_id = str(user_id.guild.id)
-    user_id_str = str(user_id.id)
-
-    if guild_id not in user_data:
-        user_data[guild_id] = {}
-    if user_id_str not in user_data[guild_id]:
-        user_data[guild_id][user_id_str] = {}
-
-    user_data[guild_id][user_id_str]["donation_cooldown"] = datetime.now().isoformat()
-    user_data[guild_id][user_id_str]["donation_count"] = user_data[guild_id][user_id_str].get("donation_count", 0) + 1
-    user_data[guild_id][user_id_str]["total_donated"] = user_data[guild_id][user_id_str].get("total_donated", 0) + amount
-    save_json("Reimu_lots.json", user_data)
-
-def format_currency(amount):
-    units = [
-        (10**20, "gai"),
-        (10**16, "kyo"),
-        (10**12, "cho"),
-        (10**8, "oku"),
-        (10**4, "man")
-    ]
-    for value, unit in units:
-        if amount >= value:
-            return f"{amount / value:.2f} {unit}"
-    return str(amount)
-
 @bot.event
 async def on_message(message):
     if message.author == bot.user:
+        reply_tracker.remember(message.id)
         return
 
-    content = message.content
-    
-    is_reply_to_bot = message.reference and message.reference.message_id
     is_mentioning_bot = bot.user.mention in message.content
-
-    if is_reply_to_bot:
-        try:
-            referenced_message = await message.channel.fetch_message(message.reference.message_id)
-            if referenced_message.author == bot.user:
-                is_reply_to_bot = True
-            else:
-                is_reply_to_bot = False
-        except discord.NotFound:
-            is_reply_to_bot = False
+    is_reply_to_bot = await reply_tracker.is_reply_to_bot(message, bot)
 
     if is_reply_to_bot or is_mentioning_bot:
-        user_message = message.content
-        user_id = str(message.author.id)
-
-        record_message(user_id, user_message)
-        clean_old_messages()
-
-        response = generate_response(user_message, user_id)
-        await message.channel.send(response)
+        if trace_recorder is not None:
+            trace_recorder.record_message(message, is_mentioning_bot, is_reply_to_bot)
+        with metrics.timer("reimu_mention_seconds"):
+            user_message = message.content
+            user_id = str(message.author.id)
+            guild_id = str(message.guild.id) if message.guild else None
+
+            mention = (user_id, user_message, guild_id)
+            if mention_batcher is not None:
+                await mention_batcher.submit(message.channel, mention)
+            else:
+                await reply_to_mentions(message.channel, [mention])
         
     if message.content.startswith('shut down bot'):
         if message.author.id == AUTHOR_ID:
@@ -316,6 +469,11 @@ async def on_message(message):
         
     await bot.process_commands(message)
     
+@bot.listen("on_application_command")
+async def trace_application_command(ctx):
+    if trace_recorder is not None:
+        trace_recorder.record_command(ctx)
+
 @bot.event
 async def on_ready():
     logging.info(f"Logged in as {bot.user}")
@@ -328,147 +486,93 @@ async def on_ready():
         logging.info("Successfully set bot presence")
     except Exception as e:
         logging.error(f"Failed to set presence: {e}")
-        
-    init_db()
+
+    # init_db already ran before connecting; on_ready fires again on every reconnect
+    embed_templates.set_thumbnail(bot.user.display_avatar.url if bot.user.avatar else None)
+    lots_cache.start()
+    janitor.start()
+    persona.start()
+    HSW.start_compaction()
+    loop_lag.start()
+    if worker_pool is not None:
+        worker_pool.start()
+    try:
+        await metrics_exporter.start()
+    except OSError as e:
+        logging.error(f"Failed to start metrics exporter: {e}")
 
 @bot.slash_command(name="draw_lots", description="Ask Reimu Hakurei to draw a fortune for you, seeking spiritual guidance!")
+@metrics.timed("reimu_command_seconds", command="draw_lots")
 async def draw_lots_command(interaction: discord.Interaction):
     cooldown_hours = 5
     user_id = interaction.user
     guild_id = str(user_id.guild.id)
     user_id_str = str(user_id.id)
     
-    on_cooldown, remaining_time = is_on_cooldown(user_id, cooldown_hours)
-    
-    if on_cooldown:
-        user_data = load_json("Reimu_lots.json", default={})
-        if guild_id not in user_data:
-            user_data[guild_id] = {}
-        if user_id_str not in user_data[guild_id]:
-            user_data[guild_id][user_id_str] = {}
-        
-        repeat_count = user_data[guild_id][user_id_str].get("repeat_count", 0) + 1
-        user_data[guild_id][user_id_str]["repeat_count"] = repeat_count
-        save_json("Reimu_lots.json", user_data)
-        
-        if repeat_count == 1:
-            await interaction.response.send_message(
-                f"Hey, don't rush to draw lots! My spiritual power isn't ready yet. Come back in {remaining_time}, or I'll charge you extra donation money!",
-                ephemeral=True
-            )
-            return
-        elif repeat_count == 2:
-            await interaction.response.send_message(
-                f"You're still trying to draw?! I said my spiritual power isn't ready. Come back in {remaining_time}! Keep this up, and I'll charge you 5000 donation money!",
-                ephemeral=True
-            )
-            return
+    # State changes happen under the user's lock; Discord calls wait until it is released
+    async with user_locks.lock(guild_id, user_id_str):
+        user_lots = lots_cache.get(guild_id, user_id_str)
+        on_cooldown, remaining_time = is_on_cooldown(user_lots, cooldown_hours)
+
+        if on_cooldown:
+            repeat_count = user_lots.get("repeat_count", 0) + 1
+            user_lots["repeat_count"] = repeat_count
+            lots_cache.mark_dirty(guild_id)
         else:
-            # Penalty deduction
-            reimu_balance_data = load_json("Reimu_balance.json", default={})
-            balance_data = load_json("balance.json", default={})
-            
-            if guild_id not in reimu_balance_data:
-                reimu_balance_data[guild_id] = {}
-            if user_id_str not in reimu_balance_data[guild_id]:
-                reimu_balance_data[guild_id][user_id_str] = 0
-
-            if guild_id not in balance_data:
-                balance_data[guild_id] = {}
-            if user_id_str not in balance_data[guild_id]:
-                balance_data[guild_id][user_id_str] = 0
-
-            reimu_balance = reimu_balance_data[guild_id][user_id_str]
-            normal_balance = balance_data[guild_id][user_id_str]
-
-            if reimu_balance >= 5000:
-                reimu_balance_data[guild_id][user_id_str] -= 5000
-                save_json("Reimu_balance.json", reimu_balance_data)
-                user_data[guild_id][user_id_str]["repeat_count"] = 0
-                save_json("Reimu_lots.json", user_data)
-                await interaction.response.send_message(
-                    f"You've tried {repeat_count} times, and I'm fed up! Deducted 5000 from your special donation money. Remaining: {reimu_balance_data[guild_id][user_id_str]}!",
-                    ephemeral=True
-                )
-                return
-            elif normal_balance >= 5000:
-                balance_data[guild_id][user_id_str] -= 5000
-                save_json("balance.json", balance_data)
-                user_data[guild_id][user_id_str]["repeat_count"] = 0
-                save_json("Reimu_lots.json", user_data)
-                await interaction.response.send_message(
-                    f"You've tried {repeat_count} times, and I'm fed up! Deducted 5000 from your regular donation money. Remaining: {balance_data[guild_id][user_id_str]}!",
-                    ephemeral=True
-                )
-                return
+            if OMIKUJI_DAILY:
+                fortune = omikuji_engine.draw_daily(user_id_str, guild_id)
             else:
-                total = reimu_balance + normal_balance
-                await interaction.response.send_message(
-                    f"Hmph, you've tried {repeat_count} times, but your donation money isn't enough (total: {total})! I'll let you off this time, but don't expect it next time!",
-                    ephemeral=True
-                )
-                return
-    
-    await interaction.response.defer()
-    
-    result_text, color = draw_lots()
-    
-    embed = discord.Embed(
-        title="🎋 Reimu Hakurei's Fortune 🎋",
-        description=(
-            f"I am Reimu Hakurei, the shrine maiden of the Hakurei Shrine, now drawing a fortune for you!\n\n"
-            f"{result_text}\n\n"
-            "This is a result guided by spiritual power, so accept it graciously~ If your luck is bad, visit the shrine more often and donate some money!"
-        ),
-        color=color
-    )
-    
-    if bot.user.avatar:
-        embed.set_thumbnail(url=bot.user.display_avatar.url)
-    
-    fortune_type = result_text.split("\n")[0].split(":")[1].strip()
-    good_fortunes = ["Great Blessing", "Moderate Blessing", "Blessing"]
-    bad_fortunes = ["Misfortune", "Great Misfortune"]
-    
-    if fortune_type in good_fortunes:
-        comments = [
-            "Hmm, this fortune is pretty good. Come back to the shrine to thank me, and don't forget the donation money!",
-            "Nice luck! Looks like my spiritual power is reliable as always!",
-            "Great Blessing, huh? Perfect day to relax with some tea~",
-            "Not bad, this fortune makes me want to draw a few more myself!",
-            "My spiritual power says you're lucky today. Don't waste it!"
-        ]
-    elif fortune_type in bad_fortunes:
-        comments = [
-            "Ouch, this luck... Want me to blast away the bad fortune with my spell cards? It'll cost you, of course!",
-            "Misfortune? Don't blame me, the fortune decides itself. I'm just the shrine maiden~",
-            "Great Misfortune? Better come to the shrine for a blessing, or I can't guarantee tomorrow!",
-            "This luck is rough. Hurry to the shrine, and I'll figure out a way to help!",
-            "My spiritual power says your luck is bad. Play it safe and visit the shrine for a blessing!"
-        ]
+                fortune = omikuji_engine.draw()
+            user_lots["repeat_count"] = 0
+            update_cooldown(user_lots)
+            lots_cache.mark_dirty(guild_id)
+
+    if not on_cooldown:
+        await interaction.response.defer()
+        await interaction.followup.send(embed=embed_templates.draw_lots(fortune))
+        return
+
+    if repeat_count == 1:
+        await interaction.response.send_message(
+            f"Hey, don't rush to draw lots! My spiritual power isn't ready yet. Come back in {remaining_time}, or I'll charge you extra donation money!",
+            ephemeral=True
+        )
+        return
+    elif repeat_count == 2:
+        await interaction.response.send_message(
+            f"You're still trying to draw?! I said my spiritual power isn't ready. Come back in {remaining_time}! Keep this up, and I'll charge you 5000 donation money!",
+            ephemeral=True
+        )
+        return
+
+    # Penalty deduction; defer first so a slow disk can't run out the interaction deadline
+    await interaction.response.defer(ephemeral=True)
+    async with user_locks.lock(guild_id, user_id_str):
+        user_lots = lots_cache.get(guild_id, user_id_str)
+        if user_lots.get("repeat_count", 0) < 3:
+            # Another draw charged the penalty and reset the count while this one deferred
+            charged = False
+        else:
+            charged = True
+            pocket, reimu_balance, normal_balance = await storage.debit_from_one(guild_id, user_id_str, 5000)
+            if pocket is not None:
+                user_lots["repeat_count"] = 0
+                lots_cache.mark_dirty(guild_id)  # Again: a flush during the await above already took the old count
+                leaderboards.set_balance(guild_id, user_id_str, reimu_balance + normal_balance)
+
+    if not charged:
+        message = f"Hey, don't rush to draw lots! My spiritual power isn't ready yet. Come back in {remaining_time}, or I'll charge you extra donation money!"
+    elif pocket == SPECIAL:
+        message = f"You've tried {repeat_count} times, and I'm fed up! Deducted 5000 from your special donation money. Remaining: {reimu_balance}!"
+    elif pocket is not None:
+        message = f"You've tried {repeat_count} times, and I'm fed up! Deducted 5000 from your regular donation money. Remaining: {normal_balance}!"
     else:
-        comments = [
-            "It's alright, a calm life is true happiness. Don't worry too much~",
-            "Small Blessing? Work hard, and things will improve. I believe in you!",
-            "My spiritual power says this is a fair result. Stop complaining and go earn some donation money!",
-            "Average luck? Play it steady and avoid risks!",
-            "This fortune says your luck is ordinary. A shrine visit could boost it!"
-        ]
-    
-    embed.set_footer(text=random.choice(comments))
-    
-    user_data = load_json("Reimu_lots.json", default={})
-    if guild_id not in user_data:
-        user_data[guild_id] = {}
-    if user_id_str not in user_data[guild_id]:
-        user_data[guild_id][user_id_str] = {}
-    user_data[guild_id][user_id_str]["repeat_count"] = 0
-    save_json("Reimu_lots.json", user_data)
-    
-    await interaction.followup.send(embed=embed)
-    update_cooldown(user_id)
+        total = reimu_balance + normal_balance
+        message = f"Hmph, you've tried {repeat_count} times, but your donation money isn't enough (total: {total})! I'll let you off this time, but don't expect it next time!"
+    await interaction.followup.send(message, ephemeral=True)
 
 @bot.slash_command(name="donate", description="Donate offering money to Reimu Hakurei to support the shrine!")
+@metrics.timed("reimu_command_seconds", command="donate")
 async def donate_command_chinese(interaction: discord.Interaction, amount: int):
     try:
         # Defer the response to avoid 3-second timeout
@@ -493,111 +597,55 @@ async def donate_command_chinese(interaction: discord.Interaction, amount: int):
 
         logging.info(f"[Donate] {user_id_str} in guild {guild_id} attempting to donate {amount} offering money")
 
-        # Check cooldown
-        on_cooldown, remaining_time = is_on_donation_cooldown(user_id, 1)
-        if on_cooldown:
-            await interaction.followup.send(
-                f"You just donated! Reimu is grateful, but wait {remaining_time} before donating again, or the shrine will be overwhelmed by your enthusiasm!",
-                ephemeral=True
-            )
-            logging.info(f"[Donate] {user_id_str} is on cooldown, remaining time: {remaining_time}")
+        refusal = None
+        # Discord calls wait until the user's lock is released
+        async with user_locks.lock(guild_id, user_id_str):
+            # Check cooldown
+            user_lots = lots_cache.get(guild_id, user_id_str)
+            on_cooldown, remaining_time = is_on_donation_cooldown(user_lots, 1)
+            if on_cooldown:
+                refusal = f"You just donated! Reimu is grateful, but wait {remaining_time} before donating again, or the shrine will be overwhelmed by your enthusiasm!"
+                logging.info(f"[Donate] {user_id_str} is on cooldown, remaining time: {remaining_time}")
+            else:
+                # Deduct balance, special offering money first
+                try:
+                    reimu_balance, normal_balance = await storage.debit(guild_id, user_id_str, amount)
+                except InsufficientFunds as e:
+                    refusal = f"Your balance is only {e.total}, not enough to donate {amount}! Go earn some more offering money~"
+                    logging.info(f"[Donate] {user_id_str} insufficient balance: {e.total} < {amount}")
+            if refusal is None:
+                # Update lots data, making sure all required keys exist
+                user_lots.setdefault("donation_count", 0)
+                user_lots.setdefault("total_donated", 0)
+                user_lots.setdefault("donation_cooldown", None)
+                user_lots.setdefault("draw_cooldown", None)
+                user_lots.setdefault("repeat_count", 0)
+
+                user_lots["donation_count"] += 1
+                user_lots["total_donated"] += amount
+                user_lots["donation_cooldown"] = (datetime.now() + timedelta(minutes=1)).isoformat()
+                leaderboards.set_donated(guild_id, user_id_str, user_lots["total_donated"])
+                leaderboards.set_balance(guild_id, user_id_str, reimu_balance + normal_balance)
+
+                cooldown_reduced = False
+                draw_cd_str = user_lots.get("draw_cooldown")
+                if amount >= 1000 and draw_cd_str and isinstance(draw_cd_str, str):
+                    try:
+                        current_cooldown = datetime.fromisoformat(draw_cd_str)
+                        if current_cooldown > datetime.now():
+                            new_cooldown = current_cooldown - timedelta(hours=1)
+                            user_lots["draw_cooldown"] = None if new_cooldown <= datetime.now() else new_cooldown.isoformat()
+                            cooldown_reduced = True
+                    except ValueError as e:
+                        logging.warning(f"[Donate] Error parsing draw_cooldown: {draw_cd_str} ({e})")
+
+                lots_cache.mark_dirty(guild_id)
+
+        if refusal is not None:
+            await interaction.followup.send(refusal, ephemeral=True)
             return
 
-        # Load data with defaults
-        reimu_balance_data = load_json("Reimu_balance.json", default={})
-        reimu_balance_data.setdefault(guild_id, {}).setdefault(user_id_str, 0)
-        reimu_balance = reimu_balance_data[guild_id][user_id_str]
-
-        balance_data = load_json("balance.json", default={})
-        balance_data.setdefault(guild_id, {}).setdefault(user_id_str, 0)
-        user_balance = balance_data[guild_id][user_id_str]
-
-        total_balance = reimu_balance + user_balance
-        if total_balance < amount:
-            await interaction.followup.send(
-                f"Your balance is only {total_balance}, not enough to donate {amount}! Go earn some more offering money~",
-                ephemeral=True
-            )
-            logging.info(f"[Donate] {user_id_str} insufficient balance: {total_balance} < {amount}")
-            return
-
-        # Deduct balance
-        if reimu_balance >= amount:
-            reimu_balance_data[guild_id][user_id_str] -= amount
-        else:
-            balance_data[guild_id][user_id_str] -= (amount - reimu_balance)
-            reimu_balance_data[guild_id][user_id_str] = 0
-
-        save_json("Reimu_balance.json", reimu_balance_data)
-        save_json("balance.json", balance_data)
-
-        # Update lots data
-        lots_data = load_json("Reimu_lots.json", default={})
-        lots_data.setdefault(guild_id, {}).setdefault(user_id_str, {
-            "draw_cooldown": None,
-            "repeat_count": 0,
-            "donation_cooldown": None,
-            "donation_count": 0,
-            "total_donated": 0
-        })
-
-        user_lots = lots_data[guild_id][user_id_str]
-        # Ensure all required keys exist
-        user_lots.setdefault("donation_count", 0)
-        user_lots.setdefault("total_donated", 0)
-        user_lots.setdefault("donation_cooldown", None)
-        user_lots.setdefault("draw_cooldown", None)
-        user_lots.setdefault("repeat_count", 0)
-
-        user_lots["donation_count"] += 1
-        user_lots["total_donated"] += amount
-        user_lots["donation_cooldown"] = (datetime.now() + timedelta(minutes=1)).isoformat()
-
-        cooldown_reduced = False
-        draw_cd_str = user_lots.get("draw_cooldown")
-        if amount >= 1000 and draw_cd_str and isinstance(draw_cd_str, str):
-            try:
-                current_cooldown = datetime.fromisoformat(draw_cd_str)
-                if current_cooldown > datetime.now():
-                    new_cooldown = current_cooldown - timedelta(hours=1)
-                    user_lots["draw_cooldown"] = None if new_cooldown <= datetime.now() else new_cooldown.isoformat()
-                    cooldown_reduced = True
-            except ValueError as e:
-                logging.warning(f"[Donate] Error parsing draw_cooldown: {draw_cd_str} ({e})")
-
-        save_json("Reimu_lots.json", lots_data)
-
-        # Prepare thank-you message
-        if amount < 1000:
-            thanks_comments = [
-                f"Thanks for donating {amount} offering money! It’s not much, but Reimu appreciates it~",
-                f"Got your {amount} offering money! The shrine can buy some tea leaves now. Thanks!",
-                f"Thank you for donating {amount} offering money! Reimu will remember your kindness~"
-            ]
-        elif 1000 <= amount <= 5000:
-            thanks_comments = [
-                f"Wow, {amount} offering money! Thanks, the shrine can finally get some repairs!",
-                f"You donated {amount} offering money! Reimu is thrilled to have such a great supporter~",
-                f"Thanks for the {amount} offering money! Reimu will pray for your good fortune!"
-            ]
-        else:
-            thanks_comments = [
-                f"Whoa, {amount} offering money?! Reimu is touched; the shrine is saved!",
-                f"You donated {amount} offering money?! You're the biggest contributor, and Reimu will pray extra hard for you!",
-                f"Thank you for {amount} offering money! Reimu will never forget you; this means a lot to the shrine!"
-            ]
-
-        embed = discord.Embed(
-            title="🎁 Thank You for Your Donation 🎁",
-            description=(
-                f"You donated **{amount}** offering money to the Hakurei Shrine!\n"
-                f"Your current balance is **{reimu_balance_data[guild_id][user_id_str]}**.\n\n"
-                f"{random.choice(thanks_comments)}"
-                + ("\n\n✨ Since you donated over 1000, your fortune-drawing cooldown is reduced by 1 hour!" if cooldown_reduced else "")
-            ),
-            color=discord.Color.gold()
-        )
-        embed.set_footer(text="Reimu Hakurei | Thank you for your support!")
+        embed = embed_templates.donate(amount, reimu_balance, cooldown_reduced)
 
         try:
             await interaction.followup.send(embed=embed)
@@ -626,169 +674,184 @@ async def donate_command_chinese(interaction: discord.Interaction, amount: int):
                 logging.error(f"[Donate] Failed to send DM to {user_id_str}: {dm_error}")
 
 @bot.slash_command(name="work", description="Work at the Hakurei Shrine to earn offering money!")
+@metrics.timed("reimu_command_seconds", command="work")
 async def work_command(interaction: discord.Interaction):
     user_id = str(interaction.user.id)
     guild_id = str(interaction.guild.id)
 
     on_cooldown, remaining_time = HSW.is_on_work_cooldown(guild_id, user_id, cooldown_hours=1)
     if on_cooldown:
-        embed = discord.Embed(
-            title="🎋 Reimu's Reminder",
-            description=f"Reimu says you've just worked and are too tired! Come back in **{remaining_time}**!",
-            color=0xDC143C
-        )
+        embed = embed_templates.work_cooldown(remaining_time)
         await interaction.response.send_message(embed=embed, ephemeral=True)
         return
 
-    selected_work, task, reward = HSW.do_work(guild_id, user_id)
-
-    balance_data = HSW.load_json("Reimu_balance.json")
-    balance_data.setdefault(guild_id, {})
-    balance_data[guild_id].setdefault(user_id, 0)
-
-    balance_data[guild_id][user_id] += reward
-    HSW.save_json("Reimu_balance.json", balance_data)
+    await interaction.response.defer()
+    # Checked again under the lock: another /work may have finished while this one deferred
+    async with user_locks.lock(guild_id, user_id):
+        on_cooldown, remaining_time = HSW.is_on_work_cooldown(guild_id, user_id, cooldown_hours=1)
+        if not on_cooldown:
+            selected_work, task, reward = await storage.do_work(guild_id, user_id)
+            reimu_balance, normal_balance = await storage.credit(guild_id, user_id, reward)
+            leaderboards.set_balance(guild_id, user_id, reimu_balance + normal_balance)
 
-    embed = discord.Embed(
-        title="🎋 Hakurei Shrine Work",
-        description=(
-            f"You completed the **{task}** task and earned **{reward}** offering money!\n"
-            f"**Current Balance**: {balance_data[guild_id][user_id]} offering money"
-        ),
-        color=0xDC143C
-    )
-    await interaction.response.send_message(embed=embed)
+    if on_cooldown:
+        embed = embed_templates.work_cooldown(remaining_time)
+    else:
+        embed = embed_templates.work_done(task, reward, reimu_balance)
+    await interaction.followup.send(embed=embed)
 
 @bot.slash_command(name="work_progress", description="Check your work progress at the Hakurei Shrine!")
+@metrics.timed("reimu_command_seconds", command="work_progress")
 async def work_progress(interaction: discord.Interaction):
     user_id = str(interaction.user.id)
     guild_id = str(interaction.guild.id)
 
     progress = HSW.get_user_progress(guild_id, user_id)
 
-    embed = discord.Embed(
-        title="📋 Your Work Progress",
-        description=(
-            f"**Basic Tasks**: {progress['basic']} times\n"
-            f"**Normal Tasks**: {progress['normal']} times\n"
-            f"**Hard Tasks**: {progress['hard']} times"
-        ),
-        color=0xDC143C
-    )
+    embed = embed_templates.work_progress(progress)
     await interaction.response.send_message(embed=embed)
     
 @bot.slash_command(name="balance", description="Check your offering money balance!")
+@metrics.timed("reimu_command_seconds", command="balance")
 async def balance_command(interaction: discord.Interaction):
     user_id = interaction.user
     guild_id = str(user_id.guild.id)
     user_id_str = str(user_id.id)
 
-    reimu_balance_data = load_json("Reimu_balance.json", default={})
-    balance_data = load_json("balance.json", default={})
-
-    reimu_balance = 0
-    normal_balance = 0
-
-    if guild_id in reimu_balance_data and user_id_str in reimu_balance_data[guild_id]:
-        reimu_balance = reimu_balance_data[guild_id][user_id_str]
+    reimu_balance, normal_balance = await storage.get_balance(guild_id, user_id_str)
 
-    if guild_id in balance_data and user_id_str in balance_data[guild_id]:
-        normal_balance = balance_data[guild_id][user_id_str]
+    embed = embed_templates.balance(reimu_balance, normal_balance)
 
-    total_balance = reimu_balance + normal_balance
+    await interaction.response.send_message(embed=embed)
 
-    embed = discord.Embed(
-        title="✨ Hakurei Shrine · Offering Money Ledger ✨",
-        description=(
-            f"**👛 Special Offering Money**: {format_currency(reimu_balance)} yen\n"
-            f"**🪙 Regular Offering Money**: {format_currency(normal_balance)} yen\n\n"
-            f"**💰 Total**: {format_currency(total_balance)} yen"
-        ),
-        color=discord.Color.red()
+@bot.slash_command(name="leaderboard", description="See who has supported the Hakurei Shrine the most!")
+@metrics.timed("reimu_command_seconds", command="leaderboard")
+async def leaderboard_command(
+    interaction: discord.Interaction,
+    board: discord.Option(str, "What to rank by", choices=[DONATIONS, BALANCE], default=DONATIONS),
+    scope: discord.Option(str, "This server or every server", choices=["server", "global"], default="server"),
+    page: discord.Option(int, "Page number", min_value=1, default=1)
+):
+    user_id_str = str(interaction.user.id)
+    guild_id = str(interaction.guild.id) if interaction.guild and scope == "server" else None
+
+    ranking = leaderboards.board(board, guild_id)
+    page = min(page, ranking.pages())
+    entries = ranking.page(page, per_page=10)
+
+    embed = embed_templates.leaderboard(
+        board, guild_id is not None, entries, page, ranking.pages(),
+        caller_rank=ranking.rank(user_id_str), caller_score=ranking.score(user_id_str)
     )
 
-    if bot.user.avatar:
-        embed.set_thumbnail(url=bot.user.display_avatar.url)
-
-    if total_balance >= 10**18:
-        footer_text = "Σ( ° △ °|||) This amount of offering money is insane?!"
-    else:
-        footer_text = "Thank you for supporting the Hakurei Shrine. Reimu will bless you! ✨"
-
-    embed.set_footer(text=footer_text)
+    await interaction.response.send_message(embed=embed, allowed_mentions=discord.AllowedMentions.none())
+
+def shard_summary():
+    if not shard_plan.enabled:
+        return {"mode": shard_plan.describe(), "guilds": len(bot.guilds), "latency_ms": bot.latency * 1000}
+    guilds = Counter(guild.shard_id for guild in bot.guilds)
+    summary = {"process": shard_plan.describe()}
+    for shard_id, shard in sorted(bot.shards.items()):
+        state = "closed" if shard.is_closed() else f"{shard.latency * 1000:.0f} ms"
+        summary[f"shard {shard_id}"] = f"{guilds.get(shard_id, 0)} guilds · {state}"
+    return summary
+
+def key_summary():
+    return {
+        stats["key"]: (
+            f"{stats['remaining']}/{stats['limit']} left · {stats['requests']} requests · "
+            f"{stats['throttles']} throttled · {stats['errors']} errors"
+        ) + (f" · backing off {stats['backoff_s']:.0f}s" if stats["backoff_s"] else "")
+        for stats in key_pool_stats()
+    }
+
+@bot.slash_command(name="stats", description="Show Reimu Hakurei's latency and cache readings, author only")
+async def stats_command(interaction: discord.Interaction):
+    if interaction.user.id != AUTHOR_ID:
+        await interaction.response.send_message(embed=embed_templates.stats_denied, ephemeral=True)
+        return
 
-    await interaction.response.send_message(embed=embed)
+    embed = embed_templates.stats(
+        [
+            ("Slash commands", metrics.histograms("reimu_command_seconds")),
+            ("Mentions", metrics.histograms("reimu_mention_seconds")),
+            ("LLM", metrics.histograms("reimu_llm_seconds")),
+            ("LLM first chunk", metrics.histograms("reimu_llm_first_chunk_seconds")),
+            ("SQLite", metrics.histograms("reimu_sqlite_seconds")),
+            ("JSON files", metrics.histograms("reimu_json_seconds")),
+            ("Storage pool", metrics.histograms("reimu_storage_seconds")),
+            ("Event loop lag", metrics.histograms("reimu_event_loop_lag_seconds")),
+        ],
+        [
+            ("Shards", shard_summary()),
+            ("Workers", worker_pool.stats() if worker_pool is not None else {"mode": "in process"}),
+            ("LLM errors", metrics.counters("reimu_llm_errors_total")),
+            ("LLM client", llm.stats()),
+            ("API keys", key_summary()),
+            ("Coalescing", mention_batcher.stats() if mention_batcher is not None else {"window": "off"}),
+            ("Caches", {
+                "response_hit_ratio": response_cache.stats()["hit_ratio"],
+                "lots_hit_ratio": lots_cache.stats()["hit_ratio"],
+                "reply_fetches_avoided": reply_tracker.stats()["fetches_avoided"],
+                "lock_contention_ratio": user_locks.stats()["contention_ratio"],
+            }),
+        ]
+    )
+    await interaction.response.send_message(embed=embed, ephemeral=True)
 
 @bot.slash_command(name="shutdown", description="Have Reimu Hakurei shut down the bot, author only")
 async def shutdown(interaction: discord.Interaction):
     if interaction.user.id != AUTHOR_ID:
-        embed = discord.Embed(
-            title="🚫 Insufficient Permissions",
-            description="Hey, this is a sensitive shrine operation! Only my master can use this command~",
-            color=discord.Color.red()
-        )
-        embed.set_footer(text="Reimu Hakurei | Go donate some offering money instead~")
+        embed = embed_templates.shutdown_denied
         await interaction.response.send_message(embed=embed, ephemeral=True)
         return
 
-    embed = discord.Embed(
-        title="⛩️ Shutting Down...",
-        description="I'm off to rest. Don't disturb me! The shrine is temporarily closed. Thanks for your donations~",
-        color=discord.Color.orange()
-    )
-    embed.set_footer(text="Reimu Hakurei | Bye-bye~")
+    embed = embed_templates.shutting_down
     await interaction.response.send_message(embed=embed, ephemeral=False)
 
     try:
         await bot.close()
     except Exception as e:
         logging.error(f"Failed to shutdown bot: {e}")
-        embed = discord.Embed(
-            title="❌ Shutdown Failed",
-            description=(
-                f"Oops, something went wrong during shutdown...\n"
-                f"Error message: {e}\n\n"
-                "Maybe the spiritual power isn't stable. Check the log (`reimu-error.log`) or try again later!"
-            ),
-            color=discord.Color.red()
-        )
-        embed.set_footer(text="Reimu Hakurei | Guess I need to try harder...")
+        embed = embed_templates.shutdown_failed(e)
         await interaction.followup.send(embed=embed, ephemeral=True)
 
 @bot.slash_command(name="restart", description="Have Reimu Hakurei restart the bot, author only")
 async def restart(interaction: discord.Interaction):
     if interaction.user.id != AUTHOR_ID:
-        embed = discord.Embed(
-            title="🚫 Insufficient Permissions",
-            description="Hey, this is a big shrine matter! Only my master can use this command~",
-            color=discord.Color.red()
-        )
-        embed.set_footer(text="Reimu Hakurei | Go donate some offering money instead~")
+        embed = embed_templates.restart_denied
         await interaction.response.send_message(embed=embed, ephemeral=True)
         return
 
-    embed = discord.Embed(
-        title="⛩️ Restarting...",
-        description="I'm adjusting my spiritual power and will be back soon! The shrine is temporarily closed, but don't worry, I'll return quickly~",
-        color=discord.Color.blue()
-    )
-    embed.set_footer(text="Reimu Hakurei | Wait for me!")
+    embed = embed_templates.restarting
     await interaction.response.send_message(embed=embed, ephemeral=False)
 
     try:
+        if worker_pool is not None:
+            await worker_pool.stop()  # Otherwise the workers outlive the exec, still holding the database
+        lots_cache.flush()
+        HSW.compact()
         os.execv(sys.executable, [sys.executable] + sys.argv)
     except Exception as e:
         logging.error(f"Failed to restart bot: {e}")
-        embed = discord.Embed(
-            title="❌ Restart Failed",
-            description=(
-                f"Oops, something went wrong during restart...\n"
-                f"Error message: {e}\n\n"
-                "Maybe some spiritual interference. Check the log (`reimu-error.log`) or try again later!"
-            ),
-            color=discord.Color.red()
-        )
-        embed.set_footer(text="Reimu Hakurei | Looks like I need to try again...")
+        embed = embed_templates.restart_failed(e)
         await interaction.followup.send(embed=embed, ephemeral=True)
 
-bot.run(TOKEN)
+if __name__ == "__main__":
+    lots_cache.load()
+    startup.mark("lots cache")
+    HSW.load_work_data()
+    startup.mark("work journal")
+    init_db()
+    startup.mark("init_db")
+    if "--profile-startup" in sys.argv:
+        print(startup.report())
+        db.close()
+        sys.exit(0)
+    logging.info(f"Running {shard_plan.describe()}")
+    logging.info(f"Startup took {sum(seconds for _, seconds in startup.phases) * 1000:.0f} ms")
+    bot.run(TOKEN)
+    storage.close()
+    lots_cache.flush()
+    HSW.compact()
+    db.close()
@@ -0,0 +1,190 @@
+"""Latency and throughput of the slash-command handlers on synthetic data, with no Discord connection.
+
+    python benchmarks/bench_commands.py --users 1000 100000 1000000 --guilds 200 --calls 5000
+
+Each population size runs in its own process inside a scratch directory, so
+the bot's files (``example3.db``, ``Reimu_lots.json``, ``Hakurei_work.json``,
+``reimu-error.log``) never touch the working tree. Users are picked at random
+for every call, so small populations mostly exercise the cooldown replies and
+large ones the full command path.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUILD_BASE = 10**17
+USER_BASE = 2 * 10**17
+
+
+class FakeResponse:
+    def __init__(self):
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def defer(self, ephemeral=False, **kwargs):
+        self.done = True
+
+    async def send_message(self, content=None, *, embed=None, ephemeral=False, **kwargs):
+        self.done = True
+
+
+class FakeFollowup:
+    async def send(self, content=None, *, embed=None, ephemeral=False, **kwargs):
+        pass
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+
+class FakeMember:
+    def __init__(self, user_id, guild):
+        self.id = user_id
+        self.guild = guild
+
+    async def send(self, content=None, **kwargs):
+        pass
+
+
+class FakeInteraction:
+    """The parts of ``discord.Interaction`` the handlers touch."""
+
+    def __init__(self, guild_id, user_id):
+        self.guild = FakeGuild(guild_id)
+        self.user = FakeMember(user_id, self.guild)
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+
+
+def user_ids(users, guilds):
+    for u in range(users):
+        yield GUILD_BASE + u % guilds, USER_BASE + u
+
+
+def populate(users, guilds, rng):
+    """Write the JSON stores and return the ``Balances`` rows for the same users."""
+    now = datetime.now()
+    lots, work, balances = {}, {}, []
+    for guild_id, user_id in user_ids(users, guilds):
+        g, u = str(guild_id), str(user_id)
+        drew = rng.random() < 0.5
+        lots.setdefault(g, {})[u] = {
+            "draw_cooldown": (now - timedelta(hours=rng.randint(6, 48))).isoformat() if drew else None,
+            "repeat_count": 0,
+            "donation_count": rng.randint(0, 20),
+            "total_donated": rng.randint(0, 100000),
+            "donation_cooldown": None,
+        }
+        basic = rng.randint(0, 40)
+        work.setdefault(g, {})[u] = {
+            "basic": basic,
+            "normal": rng.randint(0, 30) if basic >= 10 else 0,
+            "hard": 0,
+            "last_work": None,
+        }
+        balances.append((g, u, rng.randint(0, 50000), rng.randint(0, 50000)))
+    with open("Reimu_lots.json", "w", encoding="utf-8") as f:
+        json.dump(lots, f)
+    with open("Hakurei_work.json", "w", encoding="utf-8") as f:
+        json.dump(work, f)
+    return balances
+
+
+def percentile(samples, q):
+    return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+async def drive(name, handler, calls, users, guilds, rng, args_for=lambda rng: ()):
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(calls):
+        u = rng.randrange(users)
+        interaction = FakeInteraction(GUILD_BASE + u % guilds, USER_BASE + u)
+        t0 = time.perf_counter()
+        await handler(interaction, *args_for(rng))
+        latencies.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    print(
+        f"  {name:<14} p50 {percentile(latencies, 0.50):>8.3f} ms  "
+        f"p99 {percentile(latencies, 0.99):>8.3f} ms  {calls / elapsed:>10,.0f} calls/s"
+    )
+
+
+def worker(users, guilds, calls, seed):
+    rng = random.Random(seed)
+    sys.path.insert(0, REPO)
+
+    t0 = time.perf_counter()
+    balances = populate(users, guilds, rng)
+    generated = time.perf_counter() - t0
+
+    # Imported here so the bot opens its database and log inside the scratch directory
+    import Reimu
+    import Hakurei_Shrine_Work as HSW
+    logging.getLogger().setLevel(logging.WARNING)
+
+    t0 = time.perf_counter()
+    Reimu.ledger.init_schema()
+    with Reimu.db.write() as conn:
+        conn.executemany("INSERT INTO Balances (guild_id, user_id, special, regular) VALUES (?, ?, ?, ?)", balances)
+    del balances
+    Reimu.lots_cache.load()
+    HSW.load_work_data()
+    Reimu.init_db()
+    loaded = time.perf_counter() - t0
+    print(f"{users:,} users in {guilds:,} guilds (generate {generated:.1f}s, load {loaded:.1f}s)")
+
+    def callback(command):
+        return getattr(command, "callback", command)
+
+    async def run():
+        await drive("draw_lots", callback(Reimu.draw_lots_command), calls, users, guilds, rng)
+        await drive("donate", callback(Reimu.donate_command_chinese), calls, users, guilds, rng,
+                    lambda rng: (rng.randint(100, 8000),))
+        await drive("work", callback(Reimu.work_command), calls, users, guilds, rng)
+        await drive("work_progress", callback(Reimu.work_progress), calls, users, guilds, rng)
+        await drive("balance", callback(Reimu.balance_command), calls, users, guilds, rng)
+        await Reimu.llm.close()
+
+    asyncio.run(run())
+    Reimu.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 100_000, 1_000_000])
+    parser.add_argument("--guilds", type=int, default=200)
+    parser.add_argument("--calls", type=int, default=5000, help="calls per command")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.users[0], args.guilds, args.calls, args.seed)
+        return
+
+    for users in args.users:
+        with tempfile.TemporaryDirectory(prefix="reimu-bench-") as scratch:
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", "--users", str(users),
+                 "--guilds", str(min(args.guilds, users)), "--calls", str(args.calls), "--seed", str(args.seed)],
+                cwd=scratch,
+                check=True
+            )
+
+
+if __name__ == "__main__":
+    main()
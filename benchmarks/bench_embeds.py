@@ -0,0 +1,169 @@
+"""Render cost per command: embeds built inline (as the handlers used to) against the templates.
+
+    python benchmarks/bench_embeds.py --renders 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord  # noqa: E402
+
+from embeds import EmbedTemplates, format_currency  # noqa: E402
+from omikuji import OmikujiEngine  # noqa: E402
+
+AVATAR_URL = "https://cdn.discordapp.com/avatars/0/0.png"
+
+
+class _Avatar:
+    url = AVATAR_URL
+
+
+class _User:
+    # Stands in for bot.user; display_avatar builds an Asset on every access in discord
+    avatar = "0"
+
+    @property
+    def display_avatar(self):
+        return _Avatar()
+
+
+def legacy_draw_lots(fortune, user):
+    embed = discord.Embed(
+        title="🎋 Reimu Hakurei's Fortune 🎋",
+        description=(
+            f"I am Reimu Hakurei, the shrine maiden of the Hakurei Shrine, now drawing a fortune for you!\n\n"
+            f"{fortune.text}\n\n"
+            "This is a result guided by spiritual power, so accept it graciously~ If your luck is bad, visit the shrine more often and donate some money!"
+        ),
+        color=fortune.color
+    )
+    if user.avatar:
+        embed.set_thumbnail(url=user.display_avatar.url)
+    if fortune.category == "good":
+        comments = [
+            "Hmm, this fortune is pretty good. Come back to the shrine to thank me, and don't forget the donation money!",
+            "Nice luck! Looks like my spiritual power is reliable as always!",
+            "Great Blessing, huh? Perfect day to relax with some tea~",
+            "Not bad, this fortune makes me want to draw a few more myself!",
+            "My spiritual power says you're lucky today. Don't waste it!"
+        ]
+    elif fortune.category == "bad":
+        comments = [
+            "Ouch, this luck... Want me to blast away the bad fortune with my spell cards? It'll cost you, of course!",
+            "Misfortune? Don't blame me, the fortune decides itself. I'm just the shrine maiden~",
+            "Great Misfortune? Better come to the shrine for a blessing, or I can't guarantee tomorrow!",
+            "This luck is rough. Hurry to the shrine, and I'll figure out a way to help!",
+            "My spiritual power says your luck is bad. Play it safe and visit the shrine for a blessing!"
+        ]
+    else:
+        comments = [
+            "It's alright, a calm life is true happiness. Don't worry too much~",
+            "Small Blessing? Work hard, and things will improve. I believe in you!",
+            "My spiritual power says this is a fair result. Stop complaining and go earn some donation money!",
+            "Average luck? Play it steady and avoid risks!",
+            "This fortune says your luck is ordinary. A shrine visit could boost it!"
+        ]
+    embed.set_footer(text=random.choice(comments))
+    return embed
+
+
+def legacy_donate(amount, balance, cooldown_reduced):
+    if amount < 1000:
+        thanks_comments = [
+            f"Thanks for donating {amount} offering money! It’s not much, but Reimu appreciates it~",
+            f"Got your {amount} offering money! The shrine can buy some tea leaves now. Thanks!",
+            f"Thank you for donating {amount} offering money! Reimu will remember your kindness~"
+        ]
+    elif 1000 <= amount <= 5000:
+        thanks_comments = [
+            f"Wow, {amount} offering money! Thanks, the shrine can finally get some repairs!",
+            f"You donated {amount} offering money! Reimu is thrilled to have such a great supporter~",
+            f"Thanks for the {amount} offering money! Reimu will pray for your good fortune!"
+        ]
+    else:
+        thanks_comments = [
+            f"Whoa, {amount} offering money?! Reimu is touched; the shrine is saved!",
+            f"You donated {amount} offering money?! You're the biggest contributor, and Reimu will pray extra hard for you!",
+            f"Thank you for {amount} offering money! Reimu will never forget you; this means a lot to the shrine!"
+        ]
+    embed = discord.Embed(
+        title="🎁 Thank You for Your Donation 🎁",
+        description=(
+            f"You donated **{amount}** offering money to the Hakurei Shrine!\n"
+            f"Your current balance is **{balance}**.\n\n"
+            f"{random.choice(thanks_comments)}"
+            + ("\n\n✨ Since you donated over 1000, your fortune-drawing cooldown is reduced by 1 hour!" if cooldown_reduced else "")
+        ),
+        color=discord.Color.gold()
+    )
+    embed.set_footer(text="Reimu Hakurei | Thank you for your support!")
+    return embed
+
+
+def legacy_balance(special, regular, user):
+    total = special + regular
+    embed = discord.Embed(
+        title="✨ Hakurei Shrine · Offering Money Ledger ✨",
+        description=(
+            f"**👛 Special Offering Money**: {format_currency(special)} yen\n"
+            f"**🪙 Regular Offering Money**: {format_currency(regular)} yen\n\n"
+            f"**💰 Total**: {format_currency(total)} yen"
+        ),
+        color=discord.Color.red()
+    )
+    if user.avatar:
+        embed.set_thumbnail(url=user.display_avatar.url)
+    embed.set_footer(text="Thank you for supporting the Hakurei Shrine. Reimu will bless you! ✨")
+    return embed
+
+
+def legacy_denied():
+    embed = discord.Embed(
+        title="🚫 Insufficient Permissions",
+        description="Hey, this is a sensitive shrine operation! Only my master can use this command~",
+        color=discord.Color.red()
+    )
+    embed.set_footer(text="Reimu Hakurei | Go donate some offering money instead~")
+    return embed
+
+
+def run(name, renders, fn):
+    started = time.perf_counter()
+    for i in range(renders):
+        fn(i)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<28} {renders / elapsed:>12,.0f} renders/s  {elapsed * 1e6 / renders:>7.2f} us/render")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--renders", type=int, default=200_000)
+    args = parser.parse_args()
+
+    engine = OmikujiEngine()
+    templates = EmbedTemplates(engine.fortunes)
+    templates.set_thumbnail(AVATAR_URL)
+    user = _User()
+    fortunes = engine.fortunes
+    n = len(fortunes)
+
+    run("draw_lots (inline)", args.renders, lambda i: legacy_draw_lots(fortunes[i % n], user))
+    run("draw_lots (template)", args.renders, lambda i: templates.draw_lots(fortunes[i % n]))
+    run("donate (inline)", args.renders, lambda i: legacy_donate(i % 8000, i, i % 2 == 0))
+    run("donate (template)", args.renders, lambda i: templates.donate(i % 8000, i, i % 2 == 0))
+    run("balance (inline)", args.renders, lambda i: legacy_balance(i * 997, i, user))
+    run("balance (template)", args.renders, lambda i: templates.balance(i * 997, i))
+    run("work (template)", args.renders, lambda i: templates.work_done("Sweep the shrine", 100, i))
+    run("leaderboard (template)", args.renders // 10, lambda i: templates.leaderboard(
+        "donations", True, [(r, 10**17 + r, 10**6 - r) for r in range(1, 11)], 1, 5, caller_rank=3, caller_score=999997
+    ))
+    run("permission denied (inline)", args.renders, lambda i: legacy_denied())
+    run("permission denied (shared)", args.renders, lambda i: templates.shutdown_denied)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Throughput of bulk omikuji draws: the old render-and-parse path against the engine.
+
+    python benchmarks/bench_omikuji.py --draws 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from omikuji import OmikujiEngine, fortune_colors, omikuji_fortunes  # noqa: E402
+
+
+def legacy_draw():
+    # What draw_lots + draw_lots_command did per call before the engine existed
+    fortune = random.choice(omikuji_fortunes)
+    result_text = (
+        f"**Fortune**: {fortune['Fortune']}\n"
+        f"**Love**: {fortune['Love']}\n"
+        f"**Career**: {fortune['Career']}\n"
+        f"**Health**: {fortune['Health']}\n"
+        f"**Suggested Action**: {fortune['Suggested Action']}\n"
+        f"**Lucky Item**: {fortune['Lucky Item']}"
+    )
+    color = fortune_colors[fortune["Fortune"]]
+    fortune_type = result_text.split("\n")[0].split(":")[1].strip()
+    good_fortunes = ["Great Blessing", "Moderate Blessing", "Blessing"]
+    bad_fortunes = ["Misfortune", "Great Misfortune"]
+    return fortune_type in good_fortunes, fortune_type in bad_fortunes, color
+
+
+def run(name, draws, fn):
+    started = time.perf_counter()
+    for i in range(draws):
+        fn(i)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<28} {draws / elapsed:>14,.0f} draws/s  {elapsed * 1e9 / draws:>8.0f} ns/draw")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--draws", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    uniform = OmikujiEngine()
+    weighted = OmikujiEngine(weights={"Great Blessing": 5, "Great Misfortune": 0.5})
+
+    run("legacy render + parse", args.draws, lambda i: legacy_draw())
+    run("engine.draw (uniform)", args.draws, lambda i: uniform.draw())
+    run("engine.draw (weighted)", args.draws, lambda i: weighted.draw())
+    run("engine.draw_daily", args.draws, lambda i: uniform.draw_daily(i, 42))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""Replay a recorded gateway trace through the bot's handlers against the stub LLM server.
+
+Record a trace by running the bot with ``REIMU_TRACE_FILE=reimu.trace``, then:
+
+    python benchmarks/replay_trace.py reimu.trace --speedup 1 10 50 --latency 0.8
+
+Every speed-up runs in its own process inside a scratch directory, with a
+fresh ``tools/stub_llm_server.py`` answering completions after ``--latency``
+seconds. Events are dispatched on the trace's own schedule divided by the
+speed-up and handled concurrently, as the gateway would deliver them, so the
+report shows where latency starts climbing and throughput stops following
+the offered rate.
+"""
+import argparse
+import asyncio
+import inspect
+import itertools
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from bench_commands import FakeInteraction, percentile  # noqa: E402
+from trace_recorder import read_trace  # noqa: E402
+
+BOT_ID = 10**17 - 1
+_ids = itertools.count(10**18)
+
+
+def snowflake(pseudonym):
+    return int(pseudonym, 16) >> 8 if pseudonym else None
+
+
+class FakeBotUser:
+    id = BOT_ID
+    mention = f"<@{BOT_ID}>"
+    bot = True
+
+
+BOT_USER = FakeBotUser()
+
+
+class FakeAuthor:
+    # bot=True makes process_commands return early; prefix commands are not part of the replay
+    bot = True
+
+    def __init__(self, user_id):
+        self.id = user_id
+
+
+class FakeChannel:
+    def __init__(self, channel_id, replay):
+        self.id = channel_id
+        self.replay = replay
+
+    async def send(self, content=None, **kwargs):
+        sent = FakeSentMessage(next(_ids))
+        self.replay.last_bot_message[self.id] = sent.id
+        return sent
+
+    async def fetch_message(self, message_id):
+        return FakeSentMessage(message_id)
+
+
+class FakeSentMessage:
+    def __init__(self, message_id):
+        self.id = message_id
+        self.author = BOT_USER
+
+    async def edit(self, content=None, **kwargs):
+        return self
+
+
+class FakeReference:
+    resolved = None
+
+    def __init__(self, message_id):
+        self.message_id = message_id
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+
+class FakeMessage:
+    def __init__(self, event, channel, reference_id):
+        words = max(event.get("words", 1), 1)
+        text = " ".join(["omikuji"] * words)[:max(event.get("length", 0), 1)]
+        self.id = next(_ids)
+        self.content = f"{BOT_USER.mention} {text}" if event.get("mention") else text
+        self.author = FakeAuthor(snowflake(event["user"]))
+        self.guild = FakeGuild(snowflake(event["guild"])) if event.get("guild") else None
+        self.channel = channel
+        self.reference = FakeReference(reference_id) if reference_id else None
+
+
+class Replay:
+    def __init__(self, reimu, events):
+        self.reimu = reimu
+        self.events = events
+        self.channels = {}
+        self.last_bot_message = {}
+        self.latencies = {}
+        self.dispatch_lag = []
+        self.errors = 0
+        commands = {
+            "draw_lots": reimu.draw_lots_command,
+            "donate": reimu.donate_command_chinese,
+            "work": reimu.work_command,
+            "work_progress": reimu.work_progress,
+            "balance": reimu.balance_command,
+            "leaderboard": reimu.leaderboard_command,
+        }
+        self.handlers = {name: getattr(command, "callback", command) for name, command in commands.items()}
+
+    def channel(self, pseudonym):
+        channel_id = snowflake(pseudonym)
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            channel = self.channels[channel_id] = FakeChannel(channel_id, self)
+        return channel
+
+    async def handle(self, event):
+        started = time.perf_counter()
+        try:
+            if event["kind"] == "message":
+                channel = self.channel(event["channel"])
+                reference_id = self.last_bot_message.get(channel.id) if event.get("reply") else None
+                if event.get("reply") and reference_id is None:
+                    event = dict(event, mention=True)  # Nothing to reply to yet in this run
+                await self.reimu.on_message(FakeMessage(event, channel, reference_id))
+                kind = "mention/reply"
+            else:
+                handler = self.handlers.get(event["command"])
+                if handler is None or not event.get("guild"):
+                    return
+                await handler(
+                    FakeInteraction(snowflake(event["guild"]), snowflake(event["user"])),
+                    **self.options(handler, event.get("options", {}))
+                )
+                kind = event["command"]
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"[Replay] {event.get('kind')} failed: {e}")
+            return
+        self.latencies.setdefault(kind, []).append((time.perf_counter() - started) * 1000)
+
+    def options(self, handler, given):
+        # Fill in what Discord would: the declared default of every option left out.
+        # py-cord declares options as annotations (``board: discord.Option(...)``)
+        options = dict(given)
+        for name, param in itertools.islice(inspect.signature(handler).parameters.items(), 1, None):
+            if name in options:
+                continue
+            for declared in (param.annotation, param.default):
+                if hasattr(declared, "default"):
+                    options[name] = declared.default
+                    break
+        return options
+
+    async def run(self, speedup):
+        loop = asyncio.get_running_loop()
+        tasks = []
+        origin = loop.time()
+        for event in self.events:
+            due = origin + event["t"] / speedup
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.dispatch_lag.append(max(loop.time() - due, 0.0) * 1000)
+            tasks.append(asyncio.create_task(self.handle(event)))
+        await asyncio.gather(*tasks)
+        return loop.time() - origin
+
+
+def wait_for_port(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Stub LLM server did not come up on port {port}")
+
+
+def worker(trace, speedup, seed_balance):
+    events = list(read_trace(trace))
+    if not events:
+        print("Trace has no events")
+        return
+
+    import Reimu
+    import Hakurei_Shrine_Work as HSW
+    logging.getLogger().setLevel(logging.WARNING)
+
+    Reimu.lots_cache.load()
+    HSW.load_work_data()
+    Reimu.init_db()
+    if seed_balance:
+        users = {(e["guild"], e["user"]) for e in events if e.get("guild")}
+        for guild, user in users:
+            Reimu.ledger.credit(str(snowflake(guild)), str(snowflake(user)), seed_balance)
+    Reimu.bot._connection.user = BOT_USER
+
+    replay = Replay(Reimu, events)
+    span = events[-1]["t"] / speedup
+
+    async def run():
+        elapsed = await replay.run(speedup)
+        await Reimu.llm.close()
+        return elapsed
+
+    elapsed = asyncio.run(run())
+    Reimu.db.close()
+
+    handled = sum(len(v) for v in replay.latencies.values())
+    lag = sorted(replay.dispatch_lag)
+    print(
+        f"x{speedup:g}: {len(events)} events over {span:.1f}s offered "
+        f"({len(events) / span if span else float('inf'):,.1f}/s), "
+        f"finished in {elapsed:.1f}s ({handled / elapsed:,.1f}/s), {replay.errors} errors, "
+        f"dispatch lag p99 {percentile(lag, 0.99):.1f} ms"
+    )
+    for kind, samples in sorted(replay.latencies.items()):
+        samples.sort()
+        print(
+            f"  {kind:<14} {len(samples):>7} · p50 {percentile(samples, 0.50):>9.2f} ms  "
+            f"p99 {percentile(samples, 0.99):>9.2f} ms"
+        )
+    llm = Reimu.metrics.histograms("reimu_llm_seconds").get("")
+    if llm:
+        print(f"  {'llm':<14} {llm['count']:>7} · p50 {llm['p50_ms']:>9.2f} ms  p99 {llm['p99_ms']:>9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("trace")
+    parser.add_argument("--speedup", type=float, nargs="+", default=[1.0])
+    parser.add_argument("--latency", type=float, default=0.5, help="stub LLM seconds per completion")
+    parser.add_argument("--port", type=int, default=8089, help="port for the stub LLM server")
+    parser.add_argument("--concurrency", type=int, default=8, help="REIMU_LLM_CONCURRENCY for the replayed bot")
+    parser.add_argument("--seed-balance", type=int, default=100000, help="offering money given to every traced user")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.trace, args.speedup[0], args.seed_balance)
+        return
+
+    trace = os.path.abspath(args.trace)
+    for speedup in args.speedup:
+        stub = subprocess.Popen([
+            sys.executable, os.path.join(REPO, "tools", "stub_llm_server.py"),
+            "--port", str(args.port), "--latency", str(args.latency)
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_port(args.port)
+            env = dict(
+                os.environ,
+                REIMU_API_URL=f"http://127.0.0.1:{args.port}/v1",
+                CHATANYWHERE_API3="stub",
+                REIMU_LLM_CONCURRENCY=str(args.concurrency),
+                REIMU_TRACE_FILE="",
+            )
+            with tempfile.TemporaryDirectory(prefix="reimu-replay-") as scratch:
+                subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), trace, "--worker", "--speedup", str(speedup),
+                     "--seed-balance", str(args.seed_balance)],
+                    cwd=scratch, env=env, check=True
+                )
+        finally:
+            stub.terminate()
+            stub.wait()
+
+
+if __name__ == "__main__":
+    main()
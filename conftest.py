@@ -0,0 +1 @@
+# Lets the tests under tests/ import the bot's top-level modules
@@ -0,0 +1,179 @@
+import re
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+# Kana, CJK ideographs and Hangul: BPE spends about a token per character on these,
+# so each one is counted alone instead of as part of a "word"
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_TOKEN_RE = re.compile(rf"[{_CJK}]|[^\W{_CJK}]+|[^\w\s]", re.UNICODE)
+
+
+class TokenCounter:
+    """Counts tokens with tiktoken when it is installed, otherwise estimates them.
+
+    The estimate counts words, punctuation marks and single CJK characters,
+    which tracks the real BPE count closely enough to keep a prompt within
+    budget. tiktoken and its encoding are only loaded on the first count,
+    not at import.
+    """
+
+    def __init__(self, encoding="o200k_base"):
+        self.encoding_name = encoding
+        self._encoding = None
+        self._loaded = False
+
+    def _load(self):
+        self._loaded = True
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(self.encoding_name)
+        except (ImportError, KeyError, ValueError):  # Optional, fall back to an estimate
+            self._encoding = None
+
+    def __call__(self, text):
+        if not self._loaded:
+            self._load()
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return len(_TOKEN_RE.findall(text))
+
+
+class ContextBuilder:
+    """Builds the "Known context" block for a user from their newest messages.
+
+    Only the newest ``max_rows`` rows are read, and lines are kept newest
+    first while they fit in ``token_budget``; a line that does not fit is
+    skipped. The window is cached per user and extended in place when ``add``
+    reports a new message, so a reply only reads the database the first time
+    a user is seen (or after ``invalidate``). Rows read elsewhere are only
+    cached if no ``add`` or ``invalidate`` came in while they were read; see
+    ``loading``. With ``ttl`` set, a window is read again once it is ``ttl`` seconds old,
+    so messages the retention purge deleted drop out of it even in a process
+    that never hears about the purge.
+    """
+
+    def __init__(self, store, max_rows=50, token_budget=1000, max_users=1000, count_tokens=None, ttl=None):
+        self.store = store
+        self.max_rows = max_rows
+        self.token_budget = token_budget
+        self.max_users = max_users
+        self.ttl = ttl
+        self.count_tokens = count_tokens or TokenCounter()
+        self._windows = OrderedDict()
+        self._loads = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _line(self, speaker, message):
+        line = f"{speaker} says {message}"
+        return line, self.count_tokens(line)
+
+    def _trim(self, window):
+        lines, total, _ = window
+        while lines and (total[0] > self.token_budget or len(lines) > self.max_rows):
+            _, tokens = lines.popleft()
+            total[0] -= tokens
+
+    def _load(self, user_id, rows=None):
+        lines = deque()
+        total = 0
+        if rows is None:
+            rows = self.store.recent(user_id, self.max_rows)
+        for speaker, message in rows:
+            line, tokens = self._line(speaker, message)
+            if total + tokens > self.token_budget:
+                # One long message must not hide the shorter, older ones behind it
+                continue
+            lines.appendleft((line, tokens))
+            total += tokens
+        return lines, [total], time.monotonic()
+
+    def _get(self, user_id):
+        window = self._windows.get(user_id)
+        if window is not None and self.ttl is not None and time.monotonic() - window[2] >= self.ttl:
+            del self._windows[user_id]
+            return None
+        return window
+
+    def _window(self, user_id, rows=None):
+        window = self._get(user_id)
+        if window is not None:
+            self.hits += 1
+            self._windows.move_to_end(user_id)
+            return window
+        self.misses += 1
+        window = self._load(user_id, rows)
+        self._windows[user_id] = window
+        if len(self._windows) > self.max_users:
+            self._windows.popitem(last=False)
+        return window
+
+    def cached(self, user_id):
+        return self._get(user_id) is not None
+
+    @contextmanager
+    def loading(self, user_id):
+        """Wrap a read of ``user_id``'s rows done outside the builder.
+
+        Yields a load whose ``stale`` flag is set if a message was added or
+        the user invalidated before the block ended; such rows may miss that
+        message (or still hold purged ones) and must not be cached.
+        """
+        load = self._loads.get(user_id)
+        if load is None:
+            load = self._loads[user_id] = _Load()
+        load.readers += 1
+        try:
+            yield load
+        finally:
+            load.readers -= 1
+            if not load.readers:
+                del self._loads[user_id]
+
+    def _mark_stale(self, user_id):
+        load = self._loads.get(user_id)
+        if load is not None:
+            load.stale = True
+
+    def build(self, user_id, rows=None):
+        """Return the context block; ``rows`` (``store.recent``, fetched elsewhere) spares the read on a miss."""
+        lines, _, _ = self._window(user_id, rows)
+        return "\n".join(line for line, _ in lines)
+
+    def peek(self, user_id, rows=None):
+        """Like ``build``, but a user without a cached window is read without caching one."""
+        window = self._get(user_id)
+        lines, _, _ = window if window is not None else self._load(user_id, rows)
+        return "\n".join(line for line, _ in lines)
+
+    def add(self, user_id, message, repeat_count=0):
+        """Extend a cached window after ``MessageStore.record``.
+
+        Repeats (``repeat_count > 0``) already have a line in the window.
+        """
+        if repeat_count:
+            return
+        self._mark_stale(user_id)
+        window = self._get(user_id)
+        if window is None:
+            return
+        line, tokens = self._line(user_id, message)
+        window[0].append((line, tokens))
+        window[1][0] += tokens
+        self._trim(window)
+
+    def invalidate(self, user_id=None):
+        if user_id is None:
+            self._windows.clear()
+            for load in self._loads.values():
+                load.stale = True
+        else:
+            self._windows.pop(user_id, None)
+            self._mark_stale(user_id)
+
+
+class _Load:
+    def __init__(self):
+        self.readers = 0
+        self.stale = False
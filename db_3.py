@@ -21,6 +21,12 @@ def init_db():
                 info TEXT NOT NULL
             )
         """)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS GuildPersona (
+                guild_id TEXT PRIMARY KEY,
+                info TEXT NOT NULL
+            )
+        """)
         conn.commit()
         conn.close()
         print("Database initialized successfully.")
@@ -137,6 +143,48 @@ def delete_bulk_background_info(record_ids):
     except Exception as e:
         print(f"Unknown error: {e}")
 
+# Set the persona text used for one guild instead of the default
+def set_guild_persona(guild_id, info):
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        c = conn.cursor()
+
+        print(f"Setting persona for guild {guild_id}")
+        c.execute("""
+            INSERT INTO GuildPersona (guild_id, info) VALUES (?, ?)
+            ON CONFLICT (guild_id) DO UPDATE SET info = excluded.info
+        """, (guild_id, info))
+        conn.commit()
+        print("Guild persona saved. The running bot picks it up within 30 seconds.")
+        conn.close()
+
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+    except Exception as e:
+        print(f"Unknown error: {e}")
+
+# Remove a guild's persona override so it falls back to the default
+def delete_guild_persona(guild_id):
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        c = conn.cursor()
+
+        print(f"Deleting persona for guild {guild_id}")
+        c.execute("DELETE FROM GuildPersona WHERE guild_id = ?", (guild_id,))
+        conn.commit()
+
+        if c.rowcount > 0:
+            print("Guild persona deleted.")
+        else:
+            print("No persona found for that guild.")
+
+        conn.close()
+
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+    except Exception as e:
+        print(f"Unknown error: {e}")
+
 # Main program
 if __name__ == "__main__":
     init_db()
@@ -146,8 +194,10 @@ if __name__ == "__main__":
     print("3. Add bulk background info")
     print("4. Delete data by ID")
     print("5. Delete bulk data by IDs")
+    print("6. Set a guild persona")
+    print("7. Delete a guild persona")
 
-    choice = input("Please select an option (1/2/3/4/5): ").strip()
+    choice = input("Please select an option (1/2/3/4/5/6/7): ").strip()
 
     if choice == "1":
         user_id = input("Enter user ID: ").strip()
@@ -182,5 +232,15 @@ if __name__ == "__main__":
                 print("Invalid input. Please enter valid numeric IDs.")
         except ValueError:
             print("Invalid input. Please ensure the format is correct.")
+    elif choice == "6":
+        guild_id = input("Enter guild ID: ").strip()
+        info = input("Enter persona text for this guild: ").strip()
+        if guild_id and info:
+            set_guild_persona(guild_id, info)
+        else:
+            print("Guild ID and persona text are both required.")
+    elif choice == "7":
+        guild_id = input("Enter guild ID: ").strip()
+        delete_guild_persona(guild_id)
     else:
         print("Invalid choice.")
@@ -0,0 +1,302 @@
+import random
+
+import discord
+
+SHRINE_RED = 0xDC143C
+
+# Discord rejects the whole message if an embed breaks any of these
+FIELD_VALUE_LIMIT = 1024
+MAX_FIELDS = 25
+EMBED_TOTAL_LIMIT = 6000
+
+FORTUNE_COMMENTS = {
+    "good": (
+        "Hmm, this fortune is pretty good. Come back to the shrine to thank me, and don't forget the donation money!",
+        "Nice luck! Looks like my spiritual power is reliable as always!",
+        "Great Blessing, huh? Perfect day to relax with some tea~",
+        "Not bad, this fortune makes me want to draw a few more myself!",
+        "My spiritual power says you're lucky today. Don't waste it!",
+    ),
+    "bad": (
+        "Ouch, this luck... Want me to blast away the bad fortune with my spell cards? It'll cost you, of course!",
+        "Misfortune? Don't blame me, the fortune decides itself. I'm just the shrine maiden~",
+        "Great Misfortune? Better come to the shrine for a blessing, or I can't guarantee tomorrow!",
+        "This luck is rough. Hurry to the shrine, and I'll figure out a way to help!",
+        "My spiritual power says your luck is bad. Play it safe and visit the shrine for a blessing!",
+    ),
+    "neutral": (
+        "It's alright, a calm life is true happiness. Don't worry too much~",
+        "Small Blessing? Work hard, and things will improve. I believe in you!",
+        "My spiritual power says this is a fair result. Stop complaining and go earn some donation money!",
+        "Average luck? Play it steady and avoid risks!",
+        "This fortune says your luck is ordinary. A shrine visit could boost it!",
+    ),
+}
+
+# Thank-you lines by donation size: under 1000, 1000-5000, above 5000
+THANKS_COMMENTS = (
+    (
+        "Thanks for donating {amount} offering money! It’s not much, but Reimu appreciates it~",
+        "Got your {amount} offering money! The shrine can buy some tea leaves now. Thanks!",
+        "Thank you for donating {amount} offering money! Reimu will remember your kindness~",
+    ),
+    (
+        "Wow, {amount} offering money! Thanks, the shrine can finally get some repairs!",
+        "You donated {amount} offering money! Reimu is thrilled to have such a great supporter~",
+        "Thanks for the {amount} offering money! Reimu will pray for your good fortune!",
+    ),
+    (
+        "Whoa, {amount} offering money?! Reimu is touched; the shrine is saved!",
+        "You donated {amount} offering money?! You're the biggest contributor, and Reimu will pray extra hard for you!",
+        "Thank you for {amount} offering money! Reimu will never forget you; this means a lot to the shrine!",
+    ),
+)
+
+LEADERBOARD_TITLES = {
+    "donations": "💰 Top Donors",
+    "balance": "👛 Richest Worshippers",
+}
+
+_CURRENCY_UNITS = (
+    (10**20, "gai"),
+    (10**16, "kyo"),
+    (10**12, "cho"),
+    (10**8, "oku"),
+    (10**4, "man"),
+)
+
+
+def format_currency(amount):
+    for value, unit in _CURRENCY_UNITS:
+        if amount >= value:
+            return f"{amount / value:.2f} {unit}"
+    return str(amount)
+
+
+def _chunk_lines(lines, limit=FIELD_VALUE_LIMIT):
+    """Pack lines into values of at most ``limit`` characters, shortening any single line that is longer."""
+    chunks, current = [], ""
+    for line in lines:
+        if len(line) > limit:
+            line = line[:limit - 1] + "…"
+        if current and len(current) + 1 + len(line) > limit:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _static(title, description, color, footer):
+    embed = discord.Embed(title=title, description=description, color=color)
+    embed.set_footer(text=footer)
+    return embed
+
+
+class EmbedTemplates:
+    """Embeds for every slash command, with the static parts built once.
+
+    Titles, colors, footers, comment tables and the per-fortune omikuji
+    descriptions are computed in ``__init__``; the per-command methods only
+    format the values that change per interaction. Embeds with no dynamic
+    fields at all are shared instances, so callers must not modify them.
+    The bot's avatar URL is set once through ``set_thumbnail`` when the
+    client is ready instead of being looked up on every command.
+    """
+
+    def __init__(self, fortunes):
+        self.thumbnail_url = None
+        self._gold = discord.Color.gold()
+        self._red = discord.Color.red()
+
+        self._fortunes = {
+            fortune: (
+                "I am Reimu Hakurei, the shrine maiden of the Hakurei Shrine, now drawing a fortune for you!\n\n"
+                f"{fortune.text}\n\n"
+                "This is a result guided by spiritual power, so accept it graciously~ If your luck is bad, visit the shrine more often and donate some money!",
+                discord.Color(fortune.color),
+                FORTUNE_COMMENTS.get(fortune.category, FORTUNE_COMMENTS["neutral"]),
+            )
+            for fortune in fortunes
+        }
+
+        self.shutdown_denied = _static(
+            "🚫 Insufficient Permissions",
+            "Hey, this is a sensitive shrine operation! Only my master can use this command~",
+            self._red,
+            "Reimu Hakurei | Go donate some offering money instead~",
+        )
+        self.restart_denied = _static(
+            "🚫 Insufficient Permissions",
+            "Hey, this is a big shrine matter! Only my master can use this command~",
+            self._red,
+            "Reimu Hakurei | Go donate some offering money instead~",
+        )
+        self.shutting_down = _static(
+            "⛩️ Shutting Down...",
+            "I'm off to rest. Don't disturb me! The shrine is temporarily closed. Thanks for your donations~",
+            discord.Color.orange(),
+            "Reimu Hakurei | Bye-bye~",
+        )
+        self.stats_denied = _static(
+            "🚫 Insufficient Permissions",
+            "Hey, the shrine's account books are for my master's eyes only~",
+            self._red,
+            "Reimu Hakurei | Go donate some offering money instead~",
+        )
+        self.restarting = _static(
+            "⛩️ Restarting...",
+            "I'm adjusting my spiritual power and will be back soon! The shrine is temporarily closed, but don't worry, I'll return quickly~",
+            discord.Color.blue(),
+            "Reimu Hakurei | Wait for me!",
+        )
+
+    def set_thumbnail(self, url):
+        self.thumbnail_url = url
+
+    def draw_lots(self, fortune):
+        description, color, comments = self._fortunes[fortune]
+        embed = discord.Embed(title="🎋 Reimu Hakurei's Fortune 🎋", description=description, color=color)
+        if self.thumbnail_url:
+            embed.set_thumbnail(url=self.thumbnail_url)
+        embed.set_footer(text=random.choice(comments))
+        return embed
+
+    def donate(self, amount, balance, cooldown_reduced):
+        tier = 0 if amount < 1000 else 1 if amount <= 5000 else 2
+        description = (
+            f"You donated **{amount}** offering money to the Hakurei Shrine!\n"
+            f"Your current balance is **{balance}**.\n\n"
+            f"{random.choice(THANKS_COMMENTS[tier]).format(amount=amount)}"
+        )
+        if cooldown_reduced:
+            description += "\n\n✨ Since you donated over 1000, your fortune-drawing cooldown is reduced by 1 hour!"
+        embed = discord.Embed(title="🎁 Thank You for Your Donation 🎁", description=description, color=self._gold)
+        embed.set_footer(text="Reimu Hakurei | Thank you for your support!")
+        return embed
+
+    def work_cooldown(self, remaining_time):
+        return discord.Embed(
+            title="🎋 Reimu's Reminder",
+            description=f"Reimu says you've just worked and are too tired! Come back in **{remaining_time}**!",
+            color=SHRINE_RED
+        )
+
+    def work_done(self, task, reward, balance):
+        return discord.Embed(
+            title="🎋 Hakurei Shrine Work",
+            description=(
+                f"You completed the **{task}** task and earned **{reward}** offering money!\n"
+                f"**Current Balance**: {balance} offering money"
+            ),
+            color=SHRINE_RED
+        )
+
+    def work_progress(self, progress):
+        return discord.Embed(
+            title="📋 Your Work Progress",
+            description=(
+                f"**Basic Tasks**: {progress['basic']} times\n"
+                f"**Normal Tasks**: {progress['normal']} times\n"
+                f"**Hard Tasks**: {progress['hard']} times"
+            ),
+            color=SHRINE_RED
+        )
+
+    def balance(self, special, regular):
+        total = special + regular
+        embed = discord.Embed(
+            title="✨ Hakurei Shrine · Offering Money Ledger ✨",
+            description=(
+                f"**👛 Special Offering Money**: {format_currency(special)} yen\n"
+                f"**🪙 Regular Offering Money**: {format_currency(regular)} yen\n\n"
+                f"**💰 Total**: {format_currency(total)} yen"
+            ),
+            color=self._red
+        )
+        if self.thumbnail_url:
+            embed.set_thumbnail(url=self.thumbnail_url)
+        if total >= 10**18:
+            embed.set_footer(text="Σ( ° △ °|||) This amount of offering money is insane?!")
+        else:
+            embed.set_footer(text="Thank you for supporting the Hakurei Shrine. Reimu will bless you! ✨")
+        return embed
+
+    def leaderboard(self, board, is_server, entries, page, pages, caller_rank=None, caller_score=0):
+        if entries:
+            description = "\n".join(
+                f"**#{rank}** <@{member}> · {format_currency(score)} yen" for rank, member, score in entries
+            )
+        else:
+            description = "Nobody is on this ranking yet... Go donate some offering money and be the first!"
+        scope = "This Server" if is_server else "All of Gensokyo"
+        embed = discord.Embed(
+            title=f"⛩️ {LEADERBOARD_TITLES[board]} · {scope} ⛩️",
+            description=description,
+            color=self._red
+        )
+        if caller_rank:
+            embed.set_footer(text=f"Page {page}/{pages} | You are #{caller_rank} with {format_currency(caller_score)} yen")
+        else:
+            embed.set_footer(text=f"Page {page}/{pages} | You're not ranked yet. Reimu is waiting for your offering~")
+        return embed
+
+    def stats(self, latencies, counters):
+        """``latencies`` is ``[(title, {label: histogram snapshot})]``, ``counters`` is ``[(title, {name: value})]``."""
+        embed = discord.Embed(title="📊 Hakurei Shrine · Spiritual Power Readings", color=self._red)
+        footer = "Reimu Hakurei | Owner eyes only"
+        sections = [
+            (title, [
+                f"`{label or 'all'}` {s['count']} · p50 {s['p50_ms']:.1f} ms · p99 {s['p99_ms']:.1f} ms · max {s['max_ms']:.0f} ms"
+                for label, s in sorted(series.items())
+            ], "No samples yet")
+            for title, series in latencies
+        ] + [
+            (title, [
+                f"`{name}` {value:.2f}" if isinstance(value, float) else f"`{name}` {value}"
+                for name, value in values.items()
+            ], "Nothing yet")
+            for title, values in counters
+        ]
+        # Long sections continue in further fields; whatever still doesn't fit is dropped, not sent as an invalid embed
+        fields = [
+            (title if i == 0 else f"{title} (cont.)", value)
+            for title, lines, empty in sections
+            for i, value in enumerate(_chunk_lines(lines) or [empty])
+        ]
+        total = len(embed.title) + len(footer)
+        for shown, (name, value) in enumerate(fields):
+            if (shown == MAX_FIELDS - 1 and len(fields) > MAX_FIELDS) or total + len(name) + len(value) > EMBED_TOTAL_LIMIT - 100:
+                embed.add_field(name="…", value=f"{len(fields) - shown} more fields left out", inline=False)
+                break
+            embed.add_field(name=name, value=value, inline=False)
+            total += len(name) + len(value)
+        embed.set_footer(text=footer)
+        return embed
+
+    def shutdown_failed(self, error):
+        embed = discord.Embed(
+            title="❌ Shutdown Failed",
+            description=(
+                f"Oops, something went wrong during shutdown...\n"
+                f"Error message: {error}\n\n"
+                "Maybe the spiritual power isn't stable. Check the log (`reimu-error.log`) or try again later!"
+            ),
+            color=self._red
+        )
+        embed.set_footer(text="Reimu Hakurei | Guess I need to try harder...")
+        return embed
+
+    def restart_failed(self, error):
+        embed = discord.Embed(
+            title="❌ Restart Failed",
+            description=(
+                f"Oops, something went wrong during restart...\n"
+                f"Error message: {error}\n\n"
+                "Maybe some spiritual interference. Check the log (`reimu-error.log`) or try again later!"
+            ),
+            color=self._red
+        )
+        embed.set_footer(text="Reimu Hakurei | Looks like I need to try again...")
+        return embed
@@ -0,0 +1,150 @@
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+LEAST_RECENTLY_THROTTLED = "lrt"
+WEIGHTED_ROUND_ROBIN = "wrr"
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value):
+    """Parse ``Retry-After`` / ``x-ratelimit-reset-*`` values such as ``"20"``, ``"1.5s"`` or ``"6m0s"``."""
+    if value is None:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _today():
+    return datetime.now(timezone.utc).date()
+
+
+class ApiKey:
+    def __init__(self, key, limit=200, remaining=None, weight=1):
+        self.key = key
+        self.limit = limit
+        self.remaining = limit if remaining is None else remaining
+        self.weight = weight
+        self.throttled_until = 0.0
+        self.last_throttled = 0.0
+        self.current_weight = 0
+        self.requests = 0
+        self.throttles = 0
+        self.errors = 0
+        self.day = _today()
+
+    @property
+    def label(self):
+        return f"...{self.key[-4:]}" if self.key else "<unset>"
+
+    def available(self, now):
+        return bool(self.key) and self.remaining > 0 and now >= self.throttled_until
+
+
+class KeyPool:
+    """Spreads completions over several API keys and steps around the throttled ones.
+
+    Each key tracks its remaining daily quota (reset at UTC midnight, or taken
+    from ``x-ratelimit-remaining-requests`` when the API sends it) and a
+    back-off deadline set by 429 responses. ``acquire`` picks among the
+    usable keys either by least-recently-throttled (``"lrt"``) or smooth
+    weighted round-robin (``"wrr"``, weights from ``weight``).
+
+    When ``shares`` processes each run a pool over the same keys, every pool
+    only spends ``1/shares`` of each key's quota, so together they stay
+    within the daily limit.
+    """
+
+    def __init__(self, keys, policy=LEAST_RECENTLY_THROTTLED, default_backoff=30.0, shares=1):
+        self.shares = max(shares, 1)
+        self.keys = [
+            k if isinstance(k, ApiKey) else ApiKey(k.get("key"), k.get("limit", 200), k.get("remaining"), k.get("weight", 1))
+            for k in keys
+        ]
+        for key in self.keys:
+            key.limit //= self.shares
+            key.remaining //= self.shares
+        self.policy = policy
+        self.default_backoff = default_backoff
+        self._lock = threading.Lock()
+
+    def _roll_day(self, key):
+        today = _today()
+        if key.day != today:
+            key.day = today
+            key.remaining = key.limit
+
+    def acquire(self):
+        """Return the key to use for the next request, or None if every key is exhausted or backing off."""
+        now = time.monotonic()
+        with self._lock:
+            for key in self.keys:
+                self._roll_day(key)
+            candidates = [k for k in self.keys if k.available(now)]
+            if not candidates:
+                return None
+            if self.policy == WEIGHTED_ROUND_ROBIN:
+                total = sum(k.weight for k in candidates)
+                for k in candidates:
+                    k.current_weight += k.weight
+                chosen = max(candidates, key=lambda k: k.current_weight)
+                chosen.current_weight -= total
+            else:
+                chosen = min(candidates, key=lambda k: (k.last_throttled, -k.remaining))
+            chosen.requests += 1
+            return chosen
+
+    def report(self, key, status, headers=None):
+        """Record the outcome of a request made with ``key``."""
+        headers = headers or {}
+        now = time.monotonic()
+        with self._lock:
+            remaining = headers.get("x-ratelimit-remaining-requests")
+            if remaining is not None and remaining.isdigit():
+                # The header counts what is left on the key across every process
+                key.remaining = min(int(remaining) // self.shares, key.limit)
+            elif status == 200:
+                key.remaining = max(key.remaining - 1, 0)
+
+            if status == 429:
+                backoff = (
+                    parse_duration(headers.get("retry-after"))
+                    or parse_duration(headers.get("x-ratelimit-reset-requests"))
+                    or self.default_backoff
+                )
+                key.throttles += 1
+                key.last_throttled = now
+                key.throttled_until = now + backoff
+            elif status >= 400:
+                key.errors += 1
+
+    def retry_after(self):
+        """Seconds until some key comes off back-off, or None if none is backing off."""
+        now = time.monotonic()
+        waits = [k.throttled_until - now for k in self.keys if k.key and k.remaining > 0 and k.throttled_until > now]
+        return min(waits) if waits else None
+
+    def stats(self):
+        now = time.monotonic()
+        return [
+            {
+                "key": k.label,
+                "remaining": k.remaining,
+                "limit": k.limit,
+                "requests": k.requests,
+                "throttles": k.throttles,
+                "errors": k.errors,
+                "backoff_s": max(k.throttled_until - now, 0.0),
+            }
+            for k in self.keys
+        ]
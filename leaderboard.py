@@ -0,0 +1,147 @@
+from bisect import bisect_left, insort
+
+try:
+    from sortedcontainers import SortedList
+except ImportError:  # Optional, fall back to a plain sorted list
+    SortedList = None
+
+DONATIONS = "donations"
+BALANCE = "balance"
+BOARDS = (DONATIONS, BALANCE)
+
+
+class _BisectList:
+    """The bits of ``SortedList`` that ``RankedBoard`` uses, on a plain list."""
+
+    def __init__(self, items=()):
+        self._items = sorted(items)
+
+    def add(self, item):
+        insort(self._items, item)
+
+    def remove(self, item):
+        index = bisect_left(self._items, item)
+        del self._items[index]
+
+    def bisect_left(self, item):
+        return bisect_left(self._items, item)
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def __len__(self):
+        return len(self._items)
+
+
+class RankedBoard:
+    """Members ordered by score, highest first, with O(log n) rank lookup.
+
+    Entries are ``(-score, member)`` tuples in a sorted container, so equal
+    scores are ordered by member ID and every rank is stable.
+    """
+
+    def __init__(self, scores=None):
+        self._scores = {member: score for member, score in (scores or {}).items() if score > 0}
+        items = [(-score, member) for member, score in self._scores.items()]
+        self._order = SortedList(items) if SortedList is not None else _BisectList(items)
+
+    def update(self, member, score):
+        old = self._scores.get(member)
+        if old == score:
+            return
+        if old is not None:
+            self._order.remove((-old, member))
+        if score > 0:
+            self._scores[member] = score
+            self._order.add((-score, member))
+        else:
+            self._scores.pop(member, None)
+
+    def score(self, member):
+        return self._scores.get(member, 0)
+
+    def rank(self, member):
+        """1-based rank of ``member``, or None if they have no score."""
+        score = self._scores.get(member)
+        if score is None:
+            return None
+        return self._order.bisect_left((-score, member)) + 1
+
+    def page(self, page=1, per_page=10):
+        """Return ``[(rank, member, score), ...]`` for a 1-based page."""
+        start = max(page - 1, 0) * per_page
+        end = min(start + per_page, len(self._order))
+        return [(i + 1, self._order[i][1], -self._order[i][0]) for i in range(start, end)]
+
+    def pages(self, per_page=10):
+        return max((len(self._order) + per_page - 1) // per_page, 1)
+
+    def __len__(self):
+        return len(self._order)
+
+
+class Leaderboards:
+    """Per-guild and global rankings for total donations and offering money balance.
+
+    Handlers report a user's new total after every donate/work/penalty
+    event; the global boards rank users by their sum over all guilds.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._guilds = {board: {} for board in BOARDS}
+        self._global = {board: RankedBoard() for board in BOARDS}
+        self._global_totals = {board: {} for board in BOARDS}
+
+    def set_score(self, board, guild_id, user_id, score):
+        guild_board = self._guilds[board].setdefault(guild_id, RankedBoard())
+        delta = score - guild_board.score(user_id)
+        if not delta:
+            return
+        guild_board.update(user_id, score)
+        totals = self._global_totals[board]
+        total = totals.get(user_id, 0) + delta
+        if total > 0:
+            totals[user_id] = total
+        else:
+            totals.pop(user_id, None)
+        self._global[board].update(user_id, total)
+
+    def set_donated(self, guild_id, user_id, total_donated):
+        self.set_score(DONATIONS, guild_id, user_id, total_donated)
+
+    def set_balance(self, guild_id, user_id, balance):
+        self.set_score(BALANCE, guild_id, user_id, balance)
+
+    def board(self, board, guild_id=None):
+        """The guild's board, or the global one when ``guild_id`` is None."""
+        if guild_id is None:
+            return self._global[board]
+        return self._guilds[board].get(guild_id) or RankedBoard()
+
+    def _load(self, board, rows):
+        guilds = {}
+        totals = {}
+        for guild_id, user_id, score in rows:
+            if score > 0:
+                guilds.setdefault(guild_id, {})[user_id] = score
+                totals[user_id] = totals.get(user_id, 0) + score
+        self._guilds[board] = {guild_id: RankedBoard(scores) for guild_id, scores in guilds.items()}
+        self._global[board] = RankedBoard(totals)
+        self._global_totals[board] = totals
+
+    def rebuild(self, lots_data, balances):
+        """Recompute every board from the lots data and ``(guild_id, user_id, balance)`` rows.
+
+        Each board is sorted once rather than built entry by entry.
+        """
+        self.clear()
+        self._load(DONATIONS, (
+            (guild_id, user_id, record.get("total_donated", 0))
+            for guild_id, users in lots_data.items()
+            for user_id, record in users.items()
+            if isinstance(record, dict)
+        ))
+        self._load(BALANCE, balances)
@@ -0,0 +1,251 @@
+import json
+import logging
+import os
+
+SPECIAL = "special"  # Offering money earned at this shrine (formerly Reimu_balance.json)
+REGULAR = "regular"  # Regular offering money (formerly balance.json)
+
+INT64_MAX = 2**63 - 1
+
+
+class InsufficientFunds(Exception):
+    """Raised when a debit asks for more than the user's combined balance."""
+
+    def __init__(self, special, regular, amount):
+        super().__init__(f"balance {special + regular} is less than {amount}")
+        self.special = special
+        self.regular = regular
+        self.amount = amount
+
+    @property
+    def total(self):
+        return self.special + self.regular
+
+
+class Ledger:
+    """Offering money balances stored in SQLite, one row per (guild_id, user_id).
+
+    Every transfer runs inside a single transaction, so the special and the
+    regular pocket can never drift apart the way the two JSON files could.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def init_schema(self):
+        with self.db.write("ledger.schema") as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS Balances (
+                    guild_id TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    special INTEGER NOT NULL DEFAULT 0,
+                    regular INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (guild_id, user_id)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS LedgerMeta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            """)
+
+    def get_balance(self, guild_id, user_id):
+        """Return ``(special, regular)`` for the user, zeros if they have no row yet."""
+        rows = self.db.execute("""
+            SELECT special, regular FROM Balances WHERE guild_id = ? AND user_id = ?
+        """, (guild_id, user_id), op="ledger.get_balance")
+        return rows[0] if rows else (0, 0)
+
+    def totals(self):
+        """Yield ``(guild_id, user_id, special + regular)`` for every row."""
+        yield from self.db.reader().execute("SELECT guild_id, user_id, special + regular FROM Balances")
+
+    def _balance_in(self, conn, guild_id, user_id):
+        row = conn.execute("""
+            SELECT special, regular FROM Balances WHERE guild_id = ? AND user_id = ?
+        """, (guild_id, user_id)).fetchone()
+        return row if row else (0, 0)
+
+    def _store(self, conn, guild_id, user_id, special, regular):
+        conn.execute("""
+            INSERT INTO Balances (guild_id, user_id, special, regular) VALUES (?, ?, ?, ?)
+            ON CONFLICT (guild_id, user_id) DO UPDATE SET
+                special = excluded.special,
+                regular = excluded.regular
+        """, (guild_id, user_id, special, regular))
+
+    def credit(self, guild_id, user_id, amount, pocket=SPECIAL):
+        """Add ``amount`` to one pocket and return the new ``(special, regular)``."""
+        with self.db.write("ledger.credit") as conn:
+            special, regular = self._balance_in(conn, guild_id, user_id)
+            if pocket == SPECIAL:
+                special += amount
+            else:
+                regular += amount
+            self._store(conn, guild_id, user_id, special, regular)
+        return special, regular
+
+    def debit(self, guild_id, user_id, amount):
+        """Spend ``amount``, emptying the special pocket before touching the regular one.
+
+        Returns the new ``(special, regular)``; raises ``InsufficientFunds``
+        without changing anything if the combined balance is too small.
+        """
+        with self.db.write("ledger.debit") as conn:
+            special, regular = self._balance_in(conn, guild_id, user_id)
+            if special + regular < amount:
+                raise InsufficientFunds(special, regular, amount)
+            if special >= amount:
+                special -= amount
+            else:
+                regular -= amount - special
+                special = 0
+            self._store(conn, guild_id, user_id, special, regular)
+        return special, regular
+
+    def debit_from_one(self, guild_id, user_id, amount):
+        """Take ``amount`` from whichever single pocket can cover it, special first.
+
+        Returns ``(pocket, special, regular)``; ``pocket`` is None when neither
+        pocket holds ``amount`` on its own, in which case nothing is deducted.
+        """
+        with self.db.write("ledger.debit_from_one") as conn:
+            special, regular = self._balance_in(conn, guild_id, user_id)
+            if special >= amount:
+                special -= amount
+                pocket = SPECIAL
+            elif regular >= amount:
+                regular -= amount
+                pocket = REGULAR
+            else:
+                return None, special, regular
+            self._store(conn, guild_id, user_id, special, regular)
+        return pocket, special, regular
+
+    def migrate_from_json(self, special_path="Reimu_balance.json", regular_path="balance.json", batch_size=5000):
+        """Import the old JSON ledgers once; later calls are no-ops.
+
+        This is a one-way cut-over: once imported, the ledger is the only
+        source of truth and later changes to either file are ignored.
+
+        The files are walked one guild at a time, so the whole
+        ``{guild: {user: amount}}`` mapping is never held in memory at once.
+        Returns the number of balances written.
+        """
+        if self.db.execute("SELECT 1 FROM LedgerMeta WHERE key = 'json_migrated'", op="ledger.migrate"):
+            return 0
+
+        written = 0
+        with self.db.write("ledger.migrate") as conn:
+            for path, column in ((special_path, SPECIAL), (regular_path, REGULAR)):
+                if not os.path.exists(path):
+                    continue
+                sql = f"""
+                    INSERT INTO Balances (guild_id, user_id, {column}) VALUES (?, ?, ?)
+                    ON CONFLICT (guild_id, user_id) DO UPDATE SET {column} = excluded.{column}
+                """
+                batch = []
+                try:
+                    for guild_id, users in iter_json_members(path):
+                        if not isinstance(users, dict):
+                            continue
+                        for user_id, amount in users.items():
+                            batch.append((str(guild_id), str(user_id), _to_amount(amount)))
+                        if len(batch) >= batch_size:
+                            conn.executemany(sql, batch)
+                            written += len(batch)
+                            batch.clear()
+                except (json.JSONDecodeError, ValueError) as e:
+                    logging.error(f"Error migrating {path}: {e}")
+                    raise
+                if batch:
+                    conn.executemany(sql, batch)
+                    written += len(batch)
+            conn.execute("INSERT INTO LedgerMeta (key, value) VALUES ('json_migrated', ?)", (str(written),))
+        logging.info(f"Migrated {written} balances from JSON into the ledger")
+        return written
+
+
+def _to_amount(value):
+    try:
+        amount = int(value)
+    except (TypeError, ValueError):
+        return 0
+    if amount > INT64_MAX:
+        logging.warning(f"Clamping oversized balance {amount} to {INT64_MAX}")
+        return INT64_MAX
+    return amount
+
+
+def iter_json_members(path, read_size=1 << 16):
+    """Yield ``(key, value)`` for each member of the top-level JSON object in ``path``.
+
+    The file is read in ``read_size`` chunks and only one member is decoded at
+    a time.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = ""
+        pos = 0
+        eof = False
+
+        def more():
+            nonlocal buf, pos, eof
+            chunk = f.read(read_size)
+            if not chunk:
+                eof = True
+                return False
+            buf = buf[pos:] + chunk
+            pos = 0
+            return True
+
+        def skip_ws():
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n":
+                    pos += 1
+                if pos < len(buf) or not more():
+                    return
+
+        def expect(char):
+            nonlocal pos
+            skip_ws()
+            if pos >= len(buf) or buf[pos] != char:
+                raise ValueError(f"{path}: expected {char!r} at offset {pos}")
+            pos += 1
+
+        def decode():
+            nonlocal pos
+            skip_ws()
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                    # A value that ends exactly at the buffer edge may be a
+                    # truncated number, so only trust it once more text is in.
+                    if end < len(buf) or eof:
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                more()
+
+        skip_ws()
+        if pos >= len(buf):
+            return
+        expect("{")
+        skip_ws()
+        if pos < len(buf) and buf[pos] == "}":
+            return
+        while True:
+            key = decode()
+            expect(":")
+            value = decode()
+            yield key, value
+            skip_ws()
+            if pos < len(buf) and buf[pos] == ",":
+                pos += 1
+                continue
+            expect("}")
+            return
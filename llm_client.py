@@ -0,0 +1,200 @@
+import asyncio
+import json
+
+import aiohttp
+
+from key_pool import KeyPool
+
+
+class LLMError(Exception):
+    """Raised when a completion cannot be produced (HTTP error, bad payload or timeout)."""
+
+
+class LLMClient:
+    """Async client for an OpenAI-compatible ``/chat/completions`` endpoint.
+
+    One keep-alive ``aiohttp`` session is shared by every request, and at
+    most ``max_concurrency`` completions are in flight at once; the rest wait
+    on a semaphore. ``timeout`` covers both the wait for a slot and the
+    request itself. Cancelling the awaiting task aborts the request.
+
+    Keys come from ``key_pool``; a 429 on one key moves the request on to the
+    next usable key. Passing a single ``api_key`` instead builds a one-key pool.
+    """
+
+    def __init__(self, base_url, api_key=None, model="gpt-4o-mini", max_concurrency=8, timeout=60.0, connect_timeout=10.0, key_pool=None):
+        self.base_url = base_url.rstrip("/")
+        self.key_pool = key_pool or KeyPool([{"key": api_key, "limit": 10**9}])
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self._semaphore = None
+        self._session = None
+        self.in_flight = 0
+        self.completed = 0
+        self.errors = 0
+        self.timeouts = 0
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=self.connect_timeout)
+            )
+        return self._session
+
+    def _get_semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _open(self, session, payload):
+        """Send ``payload`` and return the open 200 response; the caller releases it."""
+        for _ in range(len(self.key_pool.keys)):
+            key = self.key_pool.acquire()
+            if key is None:
+                break
+            headers = {"Authorization": f"Bearer {key.key}"}
+            resp = await session.post(f"{self.base_url}/chat/completions", json=payload, headers=headers)
+            self.key_pool.report(key, resp.status, resp.headers)
+            if resp.status == 429:
+                resp.release()
+                continue
+            if resp.status != 200:
+                body = await resp.text()
+                resp.release()
+                raise LLMError(f"HTTP {resp.status}: {body[:200]}")
+            return resp
+        wait = self.key_pool.retry_after()
+        raise LLMError("no API key available" + (f", next one frees up in {wait:.0f}s" if wait else ""))
+
+    async def _post(self, payload):
+        session = await self._get_session()
+        async with self._get_semaphore():
+            self.in_flight += 1
+            try:
+                async with await self._open(session, payload) as resp:
+                    return await resp.json()
+            finally:
+                self.in_flight -= 1
+
+    async def complete(self, messages, timeout=None, **params):
+        """Return the assistant text for ``messages``."""
+        payload = {"model": self.model, "messages": messages, **params}
+        try:
+            data = await asyncio.wait_for(self._post(payload), timeout or self.timeout)
+            content = data["choices"][0]["message"]["content"].strip()
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise LLMError(f"completion timed out after {timeout or self.timeout}s")
+        except (aiohttp.ClientError, KeyError, IndexError, TypeError, ValueError) as e:
+            self.errors += 1
+            raise LLMError(str(e)) from e
+        except LLMError:
+            self.errors += 1
+            raise
+        self.completed += 1
+        return content
+
+    async def stream(self, messages, timeout=None, **params):
+        """Yield the assistant text for ``messages`` piece by piece as it is generated.
+
+        The request is sent with ``"stream": true`` and the server-sent events
+        are parsed as they arrive. ``timeout`` bounds the wait for a slot, the
+        wait for the response headers and every gap between two events, not
+        the whole reply, so a long answer that keeps streaming never times out.
+        """
+        payload = {"model": self.model, "messages": messages, "stream": True, **params}
+        timeout = timeout or self.timeout
+        session = await self._get_session()
+        semaphore = self._get_semaphore()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise LLMError(f"no completion slot freed up within {timeout}s")
+        self.in_flight += 1
+        try:
+            async with await asyncio.wait_for(self._open(session, payload), timeout) as resp:
+                while True:
+                    line = await asyncio.wait_for(resp.content.readline(), timeout)
+                    if not line:
+                        break
+                    line = line.decode("utf-8").strip()
+                    if not line.startswith("data:"):
+                        continue  # Blank separators, comments and keep-alives
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    delta = json.loads(data)["choices"][0].get("delta") or {}
+                    if delta.get("content"):
+                        yield delta["content"]
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise LLMError(f"stream stalled for {timeout}s")
+        except (aiohttp.ClientError, KeyError, IndexError, TypeError, ValueError) as e:
+            self.errors += 1
+            raise LLMError(str(e)) from e
+        except LLMError:
+            self.errors += 1
+            raise
+        else:
+            self.completed += 1
+        finally:
+            self.in_flight -= 1
+            semaphore.release()
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "max_concurrency": self.max_concurrency,
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Fire concurrent completions at an OpenAI-compatible endpoint.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8081/v1")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--stream", action="store_true", help="stream the completions and report time to first chunk")
+    args = parser.parse_args()
+
+    async def first_chunk(client, messages):
+        started = time.perf_counter()
+        first = None
+        async for _ in client.stream(messages):
+            if first is None:
+                first = time.perf_counter() - started
+        return first
+
+    async def main():
+        client = LLMClient(args.base_url, "stub-key", max_concurrency=args.concurrency)
+        call = first_chunk if args.stream else lambda c, m: c.complete(m)
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(call(client, [{"role": "user", "content": f"hello {i}"}]) for i in range(args.requests)),
+            return_exceptions=True
+        )
+        elapsed = time.perf_counter() - started
+        await client.close()
+        failed = sum(isinstance(r, Exception) for r in results)
+        print(f"{args.requests} requests in {elapsed:.2f}s, {failed} failed, stats={client.stats()}")
+        if args.stream:
+            firsts = sorted(r for r in results if isinstance(r, float))
+            if firsts:
+                print(f"first chunk: p50 {firsts[len(firsts) // 2] * 1000:.0f} ms, max {firsts[-1] * 1000:.0f} ms")
+
+    asyncio.run(main())
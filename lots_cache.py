@@ -0,0 +1,261 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+from periodic import PeriodicTask
+
+
+def _read(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError as e:
+        logging.error(f"Error loading {path}: {e}")
+        return {}
+
+
+class LotsCache:
+    """In-memory copy of ``Reimu_lots.json`` with write-behind flushing.
+
+    Commands look up a user's record once, change it in place and call
+    ``mark_dirty``. The file is only rewritten by ``flush``, which the
+    background task runs every ``flush_interval`` seconds and which should be
+    called once more on shutdown. ``on_timing(op, seconds)`` is told how long
+    each ``"lots_load"`` and ``"lots_flush"`` took.
+
+    Each guild's JSON is kept encoded between flushes. A flush copies only the
+    dirty guilds on the event loop; encoding them and writing the file happen
+    in the executor, and a lock keeps a single write in flight at a time.
+    """
+
+    def __init__(self, path="Reimu_lots.json", flush_interval=10.0, on_timing=None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.on_timing = on_timing
+        self._data = None
+        self._dirty = set()
+        self._encoded = {}
+        self._write_lock = threading.Lock()
+        self._flusher = PeriodicTask(self.flush_async, flush_interval, f"Flush of {path}")
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.last_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def load(self):
+        started = time.perf_counter()
+        self._data = _read(self.path)
+        # Runs before the bot connects, so flushes never have to encode clean guilds
+        with self._write_lock:
+            self._encoded = {guild_id: self._encode(users) for guild_id, users in self._data.items()}
+        if self.on_timing is not None:
+            self.on_timing("lots_load", time.perf_counter() - started)
+        return self._data
+
+    @property
+    def data(self):
+        if self._data is None:
+            self.load()
+        return self._data
+
+    def get(self, guild_id, user_id):
+        """Return the user's record, creating an empty one if they have none yet."""
+        guild = self.data.get(guild_id)
+        if guild is not None:
+            record = guild.get(user_id)
+            if record is not None:
+                self.hits += 1
+                return record
+        self.misses += 1
+        return self.data.setdefault(guild_id, {}).setdefault(user_id, {})
+
+    def mark_dirty(self, guild_id):
+        self._dirty.add(guild_id)
+
+    @property
+    def dirty(self):
+        return bool(self._dirty)
+
+    @staticmethod
+    def _encode(users):
+        return json.dumps(users, ensure_ascii=False)
+
+    def _snapshot(self):
+        """Copy the dirty guilds so the executor can encode them while commands keep running."""
+        dirty = {
+            guild_id: {user_id: dict(record) for user_id, record in self.data.get(guild_id, {}).items()}
+            for guild_id in self._dirty
+        }
+        self._dirty.clear()
+        return dirty
+
+    def _write(self, dirty):
+        with self._write_lock:
+            for guild_id, users in dirty.items():
+                self._encoded[guild_id] = self._encode(users)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write("{")
+                f.write(",".join(f"{json.dumps(guild_id)}:{users}" for guild_id, users in self._encoded.items()))
+                f.write("}")
+            os.replace(tmp_path, self.path)
+
+    def _record_flush(self, started):
+        elapsed = (time.perf_counter() - started) * 1000
+        self.flushes += 1
+        self.last_flush_ms = elapsed
+        self.total_flush_ms += elapsed
+        if self.on_timing is not None:
+            self.on_timing("lots_flush", elapsed / 1000)
+
+    def flush(self, force=False):
+        """Write the cache to disk now if anything changed since the last flush (or always, with ``force``)."""
+        if self._data is None or not (self._dirty or force):
+            return False
+        started = time.perf_counter()
+        dirty = self._snapshot()
+        try:
+            self._write(dirty)
+        except Exception as e:
+            self._flush_failed(dirty, e)
+            return False
+        self._record_flush(started)
+        return True
+
+    async def flush_async(self):
+        """Like ``flush``, but encoding and writing run in the default executor.
+
+        The snapshot is taken on the event loop so it never sees a half
+        finished command.
+        """
+        if self._data is None or not self._dirty:
+            return False
+        started = time.perf_counter()
+        dirty = self._snapshot()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, dirty)
+        except Exception as e:
+            self._flush_failed(dirty, e)
+            return False
+        self._record_flush(started)
+        return True
+
+    def _flush_failed(self, dirty, error):
+        # Whatever went wrong (disk, encoding, a bad value), the guilds stay dirty for the next flush
+        self._dirty |= dirty.keys()
+        self.flush_errors += 1
+        logging.error(f"Failed to flush {self.path}: {error}")
+
+    def start(self):
+        """Start the background flush task; calling it again is a no-op."""
+        self._flusher.start()
+
+    async def stop(self):
+        await self._flusher.stop()
+        await self.flush_async()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "dirty_guilds": len(self._dirty),
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "last_flush_ms": self.last_flush_ms,
+            "avg_flush_ms": self.total_flush_ms / self.flushes if self.flushes else 0.0,
+        }
+
+
+class ShardedLotsCache:
+    """``LotsCache`` split by shard: one file and one cache per shard this process runs.
+
+    Lookups go to the cache of the guild's shard, so each shard's file only
+    holds (and only rewrites) its own guilds. The first time a shard has no
+    file of its own (a new deployment, or a changed shard count), its guilds
+    are taken from ``ShardPlan.previous_layout``: the newest of the files of
+    an earlier shard count or the unsharded ``path``.
+    """
+
+    def __init__(self, path, plan, flush_interval=10.0, on_timing=None):
+        self.path = path
+        self.plan = plan
+        self.shards = {
+            shard_id: LotsCache(plan.path(path, shard_id), flush_interval, on_timing)
+            for shard_id in plan.shard_ids
+        }
+
+    def load(self):
+        seeded = self.plan.seed_new_shards((self.path,), lambda paths: _read(paths[0]), self._seed)
+        for shard_id, cache in self.shards.items():
+            if shard_id not in seeded:
+                cache.load()
+        return self.data
+
+    def _seed(self, shard_id, guilds):
+        cache = self.shards[shard_id]
+        cache.load().update(guilds)
+        for guild_id in guilds:
+            cache.mark_dirty(guild_id)
+        cache.flush(force=True)
+
+    @property
+    def data(self):
+        """All guilds of every shard in one mapping (the records themselves are shared)."""
+        merged = {}
+        for cache in self.shards.values():
+            merged.update(cache.data)
+        return merged
+
+    def _cache(self, guild_id):
+        return self.shards[self.plan.shard_of(guild_id)]
+
+    def get(self, guild_id, user_id):
+        return self._cache(guild_id).get(guild_id, user_id)
+
+    def mark_dirty(self, guild_id):
+        self._cache(guild_id).mark_dirty(guild_id)
+
+    @property
+    def dirty(self):
+        return any(cache.dirty for cache in self.shards.values())
+
+    def flush(self):
+        flushed = [cache.flush() for cache in self.shards.values()]
+        return any(flushed)
+
+    async def flush_async(self):
+        flushed = [await cache.flush_async() for cache in self.shards.values()]
+        return any(flushed)
+
+    def start(self):
+        for cache in self.shards.values():
+            cache.start()
+
+    async def stop(self):
+        for cache in self.shards.values():
+            await cache.stop()
+
+    def stats(self):
+        per_shard = [cache.stats() for cache in self.shards.values()]
+        hits = sum(s["hits"] for s in per_shard)
+        misses = sum(s["misses"] for s in per_shard)
+        flushes = sum(s["flushes"] for s in per_shard)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+            "dirty_guilds": sum(s["dirty_guilds"] for s in per_shard),
+            "flushes": flushes,
+            "flush_errors": sum(s["flush_errors"] for s in per_shard),
+            "last_flush_ms": max(s["last_flush_ms"] for s in per_shard),
+            "avg_flush_ms": sum(s["avg_flush_ms"] * s["flushes"] for s in per_shard) / flushes if flushes else 0.0,
+        }
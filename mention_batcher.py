@@ -0,0 +1,75 @@
+import asyncio
+import logging
+
+
+class _Batch:
+    def __init__(self, channel, done):
+        self.channel = channel
+        self.items = []
+        self.done = done
+        self.timer = None
+
+
+class MentionBatcher:
+    """Groups the mentions a channel receives within ``window`` seconds.
+
+    The first mention in a quiet channel opens a batch. Every mention in the
+    same channel during the next ``window`` seconds joins it, and the batch
+    is handed to ``handler(channel, items)`` when the window closes or as
+    soon as it holds ``max_batch`` mentions. ``submit`` returns once the
+    handler has answered the batch it joined. A failing handler is logged
+    once, not once per mention.
+    """
+
+    def __init__(self, handler, window=0.3, max_batch=8):
+        self.handler = handler
+        self.window = window
+        self.max_batch = max_batch
+        self._batches = {}
+        self._tasks = set()
+        self.mentions = 0
+        self.batches = 0
+        self.largest = 0
+
+    async def submit(self, channel, item):
+        loop = asyncio.get_running_loop()
+        batch = self._batches.get(channel.id)
+        if batch is None:
+            batch = self._batches[channel.id] = _Batch(channel, loop.create_future())
+            batch.timer = loop.call_later(self.window, self._flush, channel.id)
+        batch.items.append(item)
+        self.mentions += 1
+        done = batch.done
+        if len(batch.items) >= self.max_batch:
+            self._flush(channel.id)
+        # Shielded: one cancelled on_message must not cancel the others' reply
+        await asyncio.shield(done)
+
+    def _flush(self, channel_id):
+        batch = self._batches.pop(channel_id, None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        self.batches += 1
+        self.largest = max(self.largest, len(batch.items))
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        try:
+            await self.handler(batch.channel, batch.items)
+        except Exception as e:
+            logging.exception(f"[Coalesce] Failed to answer {len(batch.items)} mentions in channel {batch.channel.id}: {e}")
+        finally:
+            if not batch.done.done():
+                batch.done.set_result(None)
+
+    def stats(self):
+        return {
+            "mentions": self.mentions,
+            "batches": self.batches,
+            "mentions_per_batch": self.mentions / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest,
+            "open_batches": len(self._batches),
+        }
@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+
+from periodic import PeriodicTask
+
+PERMANENT_AFTER = 10  # Repeats before a message is kept forever
+RETENTION_MINUTES = 30  # How long non-permanent messages are kept
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)  # RETURNING arrived in SQLite 3.35
+
+
+def message_hash(message):
+    return hashlib.blake2b(message.encode("utf-8"), digest_size=16).digest()
+
+
+class MessageStore:
+    """The ``UserMessages`` table that feeds conversation context to the AI.
+
+    Each non-permanent message is stored once per user, identified by a hash
+    of its text; repeats only bump ``repeat_count`` until the row becomes
+    permanent.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def init_schema(self):
+        with self.db.write("messages.schema") as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS UserMessages
+                         (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                          user_id TEXT,
+                          message TEXT,
+                          repeat_count INTEGER DEFAULT 0,
+                          is_permanent BOOLEAN DEFAULT FALSE,
+                          created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                          msg_hash BLOB)''')
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(UserMessages)")}
+            if "msg_hash" not in columns:
+                conn.execute("ALTER TABLE UserMessages ADD COLUMN msg_hash BLOB")
+        self.backfill_hashes()
+        with self.db.write("messages.schema") as conn:
+            # Older databases may hold the same message twice; keep the first copy
+            # so the unique index below can be built.
+            conn.execute("""
+                DELETE FROM UserMessages
+                WHERE is_permanent = 0 AND id NOT IN (
+                    SELECT MIN(id) FROM UserMessages WHERE is_permanent = 0 GROUP BY user_id, msg_hash
+                )
+            """)
+            conn.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_usermessages_user_hash
+                ON UserMessages (user_id, msg_hash) WHERE is_permanent = 0
+            """)
+            # Rows are read newest first per user; the rowid rides along in the index
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_usermessages_user ON UserMessages (user_id)")
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_usermessages_expiry
+                ON UserMessages (created_at) WHERE is_permanent = 0
+            """)
+
+    def backfill_hashes(self, batch_size=5000):
+        """Fill ``msg_hash`` for rows written before the column existed."""
+        total = 0
+        while True:
+            rows = self.db.execute(
+                "SELECT id, message FROM UserMessages WHERE msg_hash IS NULL LIMIT ?", (batch_size,),
+                op="messages.backfill"
+            )
+            if not rows:
+                break
+            with self.db.write("messages.backfill") as conn:
+                conn.executemany(
+                    "UPDATE UserMessages SET msg_hash = ? WHERE id = ?",
+                    [(message_hash(message or ""), row_id) for row_id, message in rows]
+                )
+            total += len(rows)
+        if total:
+            logging.info(f"Backfilled message hashes for {total} rows")
+        return total
+
+    def record(self, user_id, message):
+        """Store ``message`` or count a repeat of it.
+
+        Returns the row's ``repeat_count`` afterwards, so 0 means the message
+        was new.
+        """
+        upsert = """
+            INSERT INTO UserMessages (user_id, message, msg_hash) VALUES (?, ?, ?)
+            ON CONFLICT (user_id, msg_hash) WHERE is_permanent = 0 DO UPDATE SET
+                repeat_count = repeat_count + 1,
+                is_permanent = repeat_count + 1 >= ?
+        """
+        msg_hash = message_hash(message)
+        with self.db.write("messages.record") as conn:
+            if HAS_RETURNING:
+                return conn.execute(upsert + " RETURNING repeat_count",
+                                    (user_id, message, msg_hash, PERMANENT_AFTER)).fetchone()[0]
+            conn.execute(upsert, (user_id, message, msg_hash, PERMANENT_AFTER))
+            # Same transaction, so this reads the row the upsert just touched: the
+            # one non-permanent copy, or the newest permanent one if it just got there
+            row = conn.execute("""
+                SELECT repeat_count FROM UserMessages WHERE user_id = ? AND msg_hash = ?
+                ORDER BY is_permanent, id DESC LIMIT 1
+            """, (user_id, msg_hash)).fetchone()
+            return row[0]
+
+    def recent(self, user_id, limit):
+        """Return the newest ``limit`` ``(user_id, message)`` rows for the user and 'system', newest first."""
+        return self.db.execute("""
+            SELECT user_id, message FROM (
+                SELECT * FROM (
+                    SELECT id, user_id, message FROM UserMessages
+                    WHERE user_id = ? ORDER BY id DESC LIMIT ?
+                )
+                UNION ALL
+                SELECT * FROM (
+                    SELECT id, user_id, message FROM UserMessages
+                    WHERE user_id = 'system' ORDER BY id DESC LIMIT ?
+                )
+            )
+            ORDER BY id DESC LIMIT ?
+        """, (user_id, limit, limit, limit), op="messages.recent")
+
+    def purge_expired(self, minutes=RETENTION_MINUTES, batch_size=500):
+        """Delete up to ``batch_size`` non-permanent rows older than ``minutes``.
+
+        Returns the number of rows deleted; call again until it returns less
+        than ``batch_size`` to clear the whole backlog.
+        """
+        # created_at is filled by CURRENT_TIMESTAMP, i.e. UTC text in this format
+        cutoff = (datetime.now(timezone.utc) - timedelta(minutes=minutes)).strftime("%Y-%m-%d %H:%M:%S")
+        with self.db.write("messages.purge") as conn:
+            c = conn.execute("""
+                DELETE FROM UserMessages WHERE id IN (
+                    SELECT id FROM UserMessages
+                    WHERE is_permanent = 0 AND created_at < ?
+                    LIMIT ?
+                )
+            """, (cutoff, batch_size))
+            return c.rowcount
+
+
+class RetentionJanitor:
+    """Background task that expires old messages in small batches.
+
+    Each batch runs in the default executor and is its own transaction, so
+    neither the event loop nor the writer connection is held for long.
+    """
+
+    def __init__(self, store, minutes=RETENTION_MINUTES, interval=60.0, batch_size=500, on_reclaim=None):
+        self.store = store
+        self.on_reclaim = on_reclaim  # Called with the row count after a run that deleted anything
+        self.minutes = minutes
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task = PeriodicTask(self.run_once, interval, "Retention run", run_first=True)
+        self.runs = 0
+        self.rows_reclaimed = 0
+        self.last_run_rows = 0
+        self.last_run_ms = 0.0
+        self.total_run_ms = 0.0
+
+    async def run_once(self):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        deleted = 0
+        while True:
+            batch = await loop.run_in_executor(None, self.store.purge_expired, self.minutes, self.batch_size)
+            deleted += batch
+            if batch < self.batch_size:
+                break
+            await asyncio.sleep(0)
+        elapsed = (time.perf_counter() - started) * 1000
+        self.runs += 1
+        self.rows_reclaimed += deleted
+        self.last_run_rows = deleted
+        self.last_run_ms = elapsed
+        self.total_run_ms += elapsed
+        if deleted:
+            logging.info(f"Deleted {deleted} old messages in {elapsed:.1f} ms")
+            if self.on_reclaim is not None:
+                self.on_reclaim(deleted)
+        return deleted
+
+    def start(self):
+        self._task.start()
+
+    async def stop(self):
+        await self._task.stop()
+
+    def stats(self):
+        return {
+            "runs": self.runs,
+            "rows_reclaimed": self.rows_reclaimed,
+            "last_run_rows": self.last_run_rows,
+            "last_run_ms": self.last_run_ms,
+            "avg_run_ms": self.total_run_ms / self.runs if self.runs else 0.0,
+        }
@@ -0,0 +1,260 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from periodic import PeriodicTask
+
+# Seconds; the same spread as the Prometheus client defaults plus the slow LLM tail
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Estimate the ``q`` quantile by interpolating inside its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "avg_ms": self.sum / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.quantile(0.50) * 1000,
+            "p99_ms": self.quantile(0.99) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _first_value(key):
+    return key[0][1] if key else ""
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class Metrics:
+    """Latency histograms, counters and gauges, rendered in the Prometheus text format.
+
+    Series are created on first use, keyed by metric name and labels.
+    ``observe``, ``inc`` and ``set`` take a lock, so storage code running in
+    executor threads can report timings too. Callbacks registered with
+    ``collect`` run before every ``render`` to refresh gauges that mirror
+    state kept elsewhere.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def inc(self, name, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def collect(self, callback):
+        self._collectors.append(callback)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def timed(self, name, **labels):
+        """Decorator that times every call of a coroutine function."""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observer(self, name, label="op"):
+        """Return an ``on_timing(op, seconds)`` callback that records into ``name``."""
+        def on_timing(op, seconds):
+            self.observe(name, seconds, **{label: op})
+        return on_timing
+
+    def histograms(self, name):
+        """``{label value: snapshot}`` for every series of ``name``, keyed by its first label."""
+        with self._lock:
+            return {_first_value(key): h.snapshot() for key, h in self._histograms.get(name, {}).items()}
+
+    def counters(self, name):
+        with self._lock:
+            return {_first_value(key): value for key, value in self._counters.get(name, {}).items()}
+
+    def render(self):
+        for callback in self._collectors:
+            try:
+                callback()
+            except Exception as e:
+                logging.error(f"Metrics collector failed: {e}")
+        lines = []
+        with self._lock:
+            for name in sorted(self._histograms):
+                lines.append(f"# TYPE {name} histogram")
+                for key, h in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, n in zip(self.buckets, h.counts):
+                        cumulative += n
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {h.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {h.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {h.count}")
+            for name in sorted(self._counters):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name in sorted(self._gauges):
+                lines.append(f"# TYPE {name} gauge")
+                for key, value in sorted(self._gauges[name].items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class PhaseTimer:
+    """Wall-clock time of consecutive phases, e.g. the steps of startup."""
+
+    def __init__(self, started=None):
+        self.phases = []
+        self._last = started if started is not None else time.perf_counter()
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def report(self):
+        total = sum(seconds for _, seconds in self.phases)
+        lines = [f"{name:<16} {seconds * 1000:>9.1f} ms" for name, seconds in self.phases]
+        lines.append(f"{'total':<16} {total * 1000:>9.1f} ms")
+        return "\n".join(lines)
+
+
+class LoopLagMonitor:
+    """Samples event-loop lag: how late a ``sleep(interval)`` wakes up."""
+
+    def __init__(self, metrics, interval=0.5, name="reimu_event_loop_lag_seconds"):
+        self.metrics = metrics
+        self.interval = interval
+        self.name = name
+        self._last = None
+        self._task = PeriodicTask(self._sample, interval, "Event loop lag sample")
+
+    async def _sample(self):
+        now = asyncio.get_running_loop().time()
+        self.metrics.observe(self.name, max(now - self._last - self.interval, 0.0))
+        self._last = now
+
+    def start(self):
+        if not self._task.running:
+            self._last = asyncio.get_running_loop().time()
+            self._task.start()
+
+    async def stop(self):
+        await self._task.stop()
+
+
+class MetricsExporter:
+    """Publishes ``Metrics.render()`` for Prometheus.
+
+    With ``port`` set, serves ``GET /metrics`` on ``host`` (loopback by
+    default). With ``path`` set, rewrites that file every ``interval``
+    seconds for node_exporter's textfile collector. Either or both may be
+    used.
+    """
+
+    def __init__(self, metrics, port=None, path=None, host="127.0.0.1", interval=15.0):
+        self.metrics = metrics
+        self.port = port
+        self.path = path
+        self.host = host
+        self.interval = interval
+        self._runner = None
+        self._writer = PeriodicTask(self.write, interval, f"Metrics write to {path}", run_first=True, in_executor=True)
+
+    def write(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.metrics.render())
+        os.replace(tmp_path, self.path)
+
+    async def _handle(self, request):
+        from aiohttp import web
+        return web.Response(text=self.metrics.render(), content_type="text/plain", charset="utf-8")
+
+    async def start(self):
+        if self.port and self._runner is None:
+            from aiohttp import web  # Only loaded when the HTTP endpoint is enabled
+            app = web.Application()
+            app.router.add_get("/metrics", self._handle)
+            self._runner = web.AppRunner(app)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, self.host, self.port).start()
+            logging.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+        if self.path:
+            self._writer.start()
+
+    async def stop(self):
+        await self._writer.stop()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
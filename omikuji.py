@@ -1,4 +1,7 @@
+import hashlib
 import random
+from collections import namedtuple
+from datetime import date
 
 # Dictionary mapping fortune types to their corresponding colors (hex values)
 fortune_colors = {
@@ -71,10 +74,23 @@ omikuji_fortunes = [
     }
 ]
 
-# Function to randomly draw a fortune and return its text and color
-def draw_lots():
-    fortune = random.choice(omikuji_fortunes)
-    result_text = (
+# Which way each fortune leans, used to pick Reimu's comment
+fortune_categories = {
+    "Great Blessing": "good",
+    "Moderate Blessing": "good",
+    "Blessing": "good",
+    "Small Blessing": "neutral",
+    "Minor Blessing": "neutral",
+    "Misfortune": "bad",
+    "Great Misfortune": "bad"
+}
+
+# A drawn fortune with everything the command needs already worked out
+Fortune = namedtuple("Fortune", ["name", "color", "category", "text"])
+
+
+def render_fortune(fortune):
+    return (
         f"**Fortune**: {fortune['Fortune']}\n"
         f"**Love**: {fortune['Love']}\n"
         f"**Career**: {fortune['Career']}\n"
@@ -82,5 +98,79 @@ def draw_lots():
         f"**Suggested Action**: {fortune['Suggested Action']}\n"
         f"**Lucky Item**: {fortune['Lucky Item']}"
     )
-    color = fortune_colors[fortune["Fortune"]]
-    return result_text, color
+
+
+class AliasTable:
+    """Walker/Vose alias table: weighted sampling in O(1) per draw."""
+
+    def __init__(self, weights):
+        n = len(weights)
+        total = float(sum(weights))
+        if any(w < 0 for w in weights):
+            raise ValueError("weights must not be negative")
+        if n == 0 or total <= 0:
+            raise ValueError("weights must contain at least one positive value")
+        scaled = [w * n / total for w in weights]
+        self.prob = [0.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        for i in small + large:
+            self.prob[i] = 1.0
+        self.n = n
+
+    def pick(self, column, coin):
+        """Map a column in ``range(n)`` and a coin in ``[0, 1)`` to an index."""
+        return column if coin < self.prob[column] else self.alias[column]
+
+    def sample(self, rng=random):
+        return self.pick(rng.randrange(self.n), rng.random())
+
+
+class OmikujiEngine:
+    """Draws fortunes from pre-rendered ``Fortune`` objects.
+
+    ``weights`` maps fortune names to relative weights (missing names weigh
+    1, so the default is the same uniform draw as before).
+    ``draw_daily`` derives the result from the user, guild and date, so
+    the same person gets the same fortune all day without storing anything.
+    """
+
+    def __init__(self, fortunes=None, weights=None):
+        fortunes = fortunes if fortunes is not None else omikuji_fortunes
+        weights = weights or {}
+        self.fortunes = [
+            Fortune(
+                name=f["Fortune"],
+                color=fortune_colors[f["Fortune"]],
+                category=fortune_categories.get(f["Fortune"], "neutral"),
+                text=render_fortune(f)
+            )
+            for f in fortunes
+        ]
+        self.table = AliasTable([weights.get(f.name, 1) for f in self.fortunes])
+
+    def draw(self, rng=random):
+        return self.fortunes[self.table.sample(rng)]
+
+    def draw_daily(self, user_id, guild_id, day=None):
+        day = day or date.today()
+        digest = hashlib.blake2b(f"{user_id}:{guild_id}:{day.isoformat()}".encode("utf-8"), digest_size=16).digest()
+        column = int.from_bytes(digest[:8], "big") % self.table.n
+        coin = int.from_bytes(digest[8:], "big") / 2**64
+        return self.fortunes[self.table.pick(column, coin)]
+
+
+_default_engine = OmikujiEngine()
+
+
+# Function to randomly draw a fortune and return its text and color
+def draw_lots():
+    fortune = _default_engine.draw()
+    return fortune.text, fortune.color
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+
+
+class PeriodicTask:
+    """Runs ``job()`` every ``interval`` seconds in a background task.
+
+    ``job`` is a coroutine function, or a plain function run in the default
+    executor when ``in_executor`` is set. The first run happens after one
+    interval, or right away with ``run_first``. A run that raises is logged
+    as ``"<name> failed"`` and the loop carries on. ``stop`` cancels the
+    loop but waits for a run already in progress, so it never abandons one
+    halfway (a file half written, a batch half deleted).
+    """
+
+    def __init__(self, job, interval, name, run_first=False, in_executor=False):
+        self.job = job
+        self.interval = interval
+        self.name = name
+        self.run_first = run_first
+        self.in_executor = in_executor
+        self._task = None
+        self._current = None
+
+    async def _once(self):
+        try:
+            if self.in_executor:
+                await asyncio.get_running_loop().run_in_executor(None, self.job)
+            else:
+                await self.job()
+        except Exception as e:
+            logging.error(f"{self.name} failed: {e}")
+
+    async def _run(self):
+        if not self.run_first:
+            await asyncio.sleep(self.interval)
+        while True:
+            self._current = asyncio.ensure_future(self._once())
+            await asyncio.shield(self._current)
+            await asyncio.sleep(self.interval)
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the loop; calling it again while it runs is a no-op."""
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._current is not None:
+            await self._current
+            self._current = None
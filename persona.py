@@ -0,0 +1,110 @@
+import logging
+
+from periodic import PeriodicTask
+
+DEFAULT_PERSONA_ID = "Reimu Hakurei"
+DEFAULT_PERSONA = (
+    "I am Reimu Hakurei, the shrine maiden of the Hakurei Shrine, and the resolver of incidents in Gensokyo. "
+    "As the guardian of Gensokyo, I possess the ability to manipulate spiritual power and barriers, "
+    "defeating troublesome youkai with my spell cards. "
+    "I usually lead a relaxed life, enjoying tea and rice dumplings, "
+    "but the shrine's offerings are scarce, so I'm always worried about donation money. "
+    "Oh, if you visit the shrine, please donate some offering money; I'll be very happy~"
+)
+
+_WATCHED_TABLES = ("BackgroundInfo", "GuildPersona")
+
+
+class PersonaCache:
+    """Persona text for AI replies, read from the database once and kept in memory.
+
+    Triggers on ``BackgroundInfo`` and ``GuildPersona`` bump a version number
+    whenever either table changes, whoever changes it (the bot or
+    ``db_3.py``). The cache reloads when ``poll`` notices a new version, so
+    replies never query the persona tables themselves.
+    """
+
+    def __init__(self, db, persona_id=DEFAULT_PERSONA_ID, default_info=DEFAULT_PERSONA, poll_interval=30.0):
+        self.db = db
+        self.persona_id = persona_id
+        self.default_info = default_info
+        self.poll_interval = poll_interval
+        self.version = None
+        self.reloads = 0
+        self._default = default_info
+        self._guilds = {}
+        self._task = PeriodicTask(self.poll, poll_interval, "Persona reload", in_executor=True)
+
+    def init_schema(self):
+        with self.db.write("persona.schema") as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS GuildPersona (
+                    guild_id TEXT PRIMARY KEY,
+                    info TEXT NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS PersonaVersion (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    version INTEGER NOT NULL
+                )
+            """)
+            conn.execute("INSERT OR IGNORE INTO PersonaVersion (id, version) VALUES (1, 0)")
+            for table in _WATCHED_TABLES:
+                for event in ("INSERT", "UPDATE", "DELETE"):
+                    conn.execute(f"""
+                        CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_bump_version
+                        AFTER {event} ON {table}
+                        BEGIN
+                            UPDATE PersonaVersion SET version = version + 1 WHERE id = 1;
+                        END
+                    """)
+            if not conn.execute("SELECT 1 FROM BackgroundInfo WHERE user_id = ?", (self.persona_id,)).fetchone():
+                conn.execute("INSERT INTO BackgroundInfo (user_id, info) VALUES (?, ?)", (self.persona_id, self.default_info))
+
+    def _read_version(self):
+        rows = self.db.execute("SELECT version FROM PersonaVersion WHERE id = 1", op="persona.version")
+        return rows[0][0] if rows else 0
+
+    def load(self):
+        """Read the default persona and every guild override into memory."""
+        version = self._read_version()
+        rows = self.db.execute("SELECT info FROM BackgroundInfo WHERE user_id = ?", (self.persona_id,), op="persona.load")
+        self._default = "\n".join(row[0] for row in rows) if rows else self.default_info
+        self._guilds = dict(self.db.execute("SELECT guild_id, info FROM GuildPersona", op="persona.load"))
+        self.version = version
+        self.reloads += 1
+
+    def get(self, guild_id=None):
+        if guild_id is not None:
+            info = self._guilds.get(str(guild_id))
+            if info is not None:
+                return info
+        return self._default
+
+    def set_guild_persona(self, guild_id, info):
+        with self.db.write("persona.set") as conn:
+            conn.execute("""
+                INSERT INTO GuildPersona (guild_id, info) VALUES (?, ?)
+                ON CONFLICT (guild_id) DO UPDATE SET info = excluded.info
+            """, (str(guild_id), info))
+        self.load()
+
+    def clear_guild_persona(self, guild_id):
+        with self.db.write("persona.clear") as conn:
+            conn.execute("DELETE FROM GuildPersona WHERE guild_id = ?", (str(guild_id),))
+        self.load()
+
+    def poll(self):
+        """Reload if the persona tables changed since the last load; returns True if it did."""
+        if self._read_version() == self.version:
+            return False
+        self.load()
+        logging.info(f"Persona reloaded (version {self.version})")
+        return True
+
+    def start(self):
+        self._task.start()
+
+    async def stop(self):
+        await self._task.stop()
@@ -0,0 +1,110 @@
+import sqlite3
+import threading
+import logging
+import time
+from contextlib import contextmanager
+
+DB_PATH = "example3.db"
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+)
+
+
+class Database:
+    """Long-lived SQLite connections shared by every helper in the bot.
+
+    Writes go through one writer connection guarded by a lock, reads use one
+    connection per thread. Connections stay open for the life of the process,
+    so sqlite3's per-connection statement cache actually gets reused instead
+    of being thrown away after every query.
+
+    ``on_timing(op, seconds)``, if given, is called after every read query
+    and every write transaction (lock wait included). ``op`` is the label
+    the caller passed, such as ``"ledger.debit"``, or ``"read"`` /
+    ``"write"`` when it passed none.
+    """
+
+    def __init__(self, path=DB_PATH, cached_statements=256, timeout=30.0, on_timing=None):
+        self.path = path
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+        self.on_timing = on_timing
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        self._writer = None
+        self._readers = []
+        self._readers_lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            isolation_level=None
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def reader(self):
+        """Return this thread's read connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    @contextmanager
+    def write(self, op="write"):
+        """Run the block inside one IMMEDIATE transaction on the writer connection.
+
+        Nested calls from the same thread join the outer transaction.
+        """
+        started = time.perf_counter()
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._connect()
+            conn = self._writer
+            if conn.in_transaction:
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            else:
+                conn.execute("COMMIT")
+            finally:
+                if self.on_timing is not None:
+                    self.on_timing(op, time.perf_counter() - started)
+
+    def execute(self, sql, params=(), op="read"):
+        """Run a single read query and return all rows."""
+        started = time.perf_counter()
+        rows = self.reader().execute(sql, params).fetchall()
+        if self.on_timing is not None:
+            self.on_timing(op, time.perf_counter() - started)
+        return rows
+
+    def close(self):
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._readers_lock:
+            for conn in self._readers:
+                try:
+                    conn.close()
+                except sqlite3.Error as e:
+                    logging.warning(f"Failed to close read connection: {e}")
+            self._readers.clear()
+        self._local = threading.local()
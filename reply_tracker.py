@@ -0,0 +1,80 @@
+from collections import OrderedDict
+
+import discord
+
+
+class ReplyTracker:
+    """Decides whether a message replies to the bot without a REST call when it can.
+
+    Checked in order: the referenced message Discord already resolved on the
+    gateway event, a bounded LRU of message IDs the bot has sent, and the
+    client's message cache. ``channel.fetch_message`` is only used when all
+    three miss.
+    """
+
+    def __init__(self, max_ids=10000):
+        self.max_ids = max_ids
+        self._bot_message_ids = OrderedDict()
+        self.checks = 0
+        self.resolved_hits = 0
+        self.lru_hits = 0
+        self.cache_hits = 0
+        self.fetches = 0
+
+    def remember(self, message_id):
+        """Record a message the bot authored."""
+        self._bot_message_ids[message_id] = None
+        self._bot_message_ids.move_to_end(message_id)
+        if len(self._bot_message_ids) > self.max_ids:
+            self._bot_message_ids.popitem(last=False)
+
+    def _cached_message(self, bot, message_id):
+        get_message = getattr(bot, "get_message", None)
+        if get_message is not None:
+            return get_message(message_id)
+        return bot._connection._get_message(message_id)
+
+    async def is_reply_to_bot(self, message, bot):
+        reference = message.reference
+        if reference is None or reference.message_id is None:
+            return False
+        self.checks += 1
+        message_id = reference.message_id
+
+        resolved = reference.resolved
+        if isinstance(resolved, discord.Message):
+            self.resolved_hits += 1
+            return resolved.author == bot.user
+        if isinstance(resolved, discord.DeletedReferencedMessage):
+            self.resolved_hits += 1
+            return False
+
+        if message_id in self._bot_message_ids:
+            self.lru_hits += 1
+            self._bot_message_ids.move_to_end(message_id)
+            return True
+
+        cached = self._cached_message(bot, message_id)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached.author == bot.user
+
+        self.fetches += 1
+        try:
+            referenced_message = await message.channel.fetch_message(message_id)
+        except discord.NotFound:
+            return False
+        if referenced_message.author == bot.user:
+            self.remember(message_id)
+            return True
+        return False
+
+    def stats(self):
+        return {
+            "checks": self.checks,
+            "resolved_hits": self.resolved_hits,
+            "lru_hits": self.lru_hits,
+            "cache_hits": self.cache_hits,
+            "fetches": self.fetches,
+            "fetches_avoided": self.checks - self.fetches,
+        }
@@ -0,0 +1,110 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_prompt(prompt):
+    """Fold case and whitespace so trivially different repeats share a cache entry."""
+    return " ".join(prompt.casefold().split())
+
+
+def cache_key(prompt, persona_version, context):
+    h = hashlib.sha256()
+    for part in (normalize_prompt(prompt), str(persona_version), context):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class ResponseCache:
+    """LRU cache of AI replies with a time-to-live.
+
+    Keys come from ``cache_key``: the normalized user turn (which names the
+    speaker), the persona version and the context window, so a reply is reused only when the model would
+    have seen the same input. When ``db`` is given, entries are also written
+    to the ``ResponseCache`` table and survive restarts.
+    """
+
+    def __init__(self, max_entries=1024, ttl=600.0, db=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db = db
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_schema(self):
+        if self.db is None:
+            return
+        with self.db.write("response_cache.schema") as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ResponseCache (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+
+    def load(self):
+        """Drop expired rows and warm memory with the newest persisted entries."""
+        if self.db is None:
+            return 0
+        cutoff = time.time() - self.ttl
+        with self.db.write("response_cache.load") as conn:
+            conn.execute("DELETE FROM ResponseCache WHERE created_at < ?", (cutoff,))
+        rows = self.db.execute(
+            "SELECT key, response, created_at FROM ResponseCache ORDER BY created_at DESC LIMIT ?",
+            (self.max_entries,), op="response_cache.load"
+        )
+        with self._lock:
+            for key, response, created_at in reversed(rows):
+                self._entries[key] = (response, created_at)
+        return len(rows)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[1] <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+            self.misses += 1
+        return None
+
+    def put(self, key, response):
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (response, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        if self.db is not None:
+            with self.db.write("response_cache.put") as conn:
+                conn.execute("""
+                    INSERT INTO ResponseCache (key, response, created_at) VALUES (?, ?, ?)
+                    ON CONFLICT (key) DO UPDATE SET response = excluded.response, created_at = excluded.created_at
+                """, (key, response, now))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.db is not None:
+            with self.db.write("response_cache.clear") as conn:
+                conn.execute("DELETE FROM ResponseCache")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
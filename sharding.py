@@ -0,0 +1,140 @@
+import os
+import re
+
+
+def shard_for(guild_id, shard_count):
+    """The shard Discord delivers ``guild_id``'s events to."""
+    return (int(guild_id) >> 22) % shard_count
+
+
+def shard_path(base, shard_id, shard_count):
+    """``Reimu_lots.json`` -> ``Reimu_lots.shard3of8.json``."""
+    stem, ext = os.path.splitext(base)
+    return f"{stem}.shard{shard_id}of{shard_count}{ext}"
+
+
+def _mtime(paths):
+    return max((os.path.getmtime(p) for p in paths if os.path.exists(p)), default=None)
+
+
+def parse_shard_ids(value):
+    """Parse ``"0,1,2"``, ``"4-7"`` or a mix like ``"0,2-3"``; empty means all shards."""
+    if not value or not value.strip():
+        return None
+    ids = set()
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            ids.update(range(int(first), int(last) + 1))
+        else:
+            ids.add(int(part))
+    return sorted(ids)
+
+
+class ShardPlan:
+    """Which shards this process runs and how per-guild state is split between them.
+
+    With no ``shard_count`` the bot runs unsharded and every file keeps its
+    usual name. Otherwise each shard gets its own copy of the per-guild
+    files, named ``<stem>.shard<N>of<count><ext>``, so a process only loads
+    and flushes the guilds of the shards it was given, and files written
+    under a different shard count are never mistaken for current ones.
+    """
+
+    def __init__(self, shard_count=None, shard_ids=None):
+        self.shard_count = shard_count or None
+        if self.shard_count is None:
+            self.shard_ids = None
+        else:
+            self.shard_ids = sorted(shard_ids) if shard_ids is not None else list(range(self.shard_count))
+            invalid = [s for s in self.shard_ids if not 0 <= s < self.shard_count]
+            if invalid:
+                raise ValueError(f"Shard IDs {invalid} are outside 0..{self.shard_count - 1}")
+        self._owned = frozenset(self.shard_ids or ())
+
+    @property
+    def enabled(self):
+        return self.shard_count is not None
+
+    def shard_of(self, guild_id):
+        return shard_for(guild_id, self.shard_count)
+
+    def owns(self, guild_id):
+        return not self.enabled or self.shard_of(guild_id) in self._owned
+
+    def path(self, base, shard_id):
+        return shard_path(base, shard_id, self.shard_count)
+
+    def previous_layout(self, *bases):
+        """The files to repartition from when a shard of this count has none yet.
+
+        Every other shard count that left files behind, and the unsharded
+        ``bases`` themselves, are candidates; the one written most recently
+        holds the current data. Returns one tuple of paths (one per base)
+        per shard of that layout, or ``[]`` if there is nothing to seed from.
+        Raises ``RuntimeError`` if the newest layout is missing a shard, since
+        starting anyway would silently lose that shard's guilds.
+        """
+        stem, ext = os.path.splitext(os.path.basename(bases[0]))
+        pattern = re.compile(rf"{re.escape(stem)}\.shard(\d+)of(\d+){re.escape(ext)}$")
+        found = {}
+        for name in os.listdir(os.path.dirname(bases[0]) or "."):
+            match = pattern.match(name)
+            if match and int(match.group(2)) != self.shard_count:
+                found.setdefault(int(match.group(2)), set()).add(int(match.group(1)))
+
+        layouts = []
+        for count, present in found.items():
+            files = [tuple(shard_path(base, i, count) for base in bases) for i in range(count)]
+            layouts.append((_mtime(p for paths in files for p in paths), count, present, files))
+        unsharded_mtime = _mtime(bases)
+        if unsharded_mtime is not None:
+            layouts.append((unsharded_mtime, None, None, [tuple(bases)]))
+        if not layouts:
+            return []
+
+        _, count, present, files = max(layouts, key=lambda layout: layout[0])
+        if count is not None:
+            missing = sorted(set(range(count)) - present)
+            if missing:
+                raise RuntimeError(
+                    f"{bases[0]} was last sharded {count} ways but shards {missing} have no file; "
+                    f"restore them before starting with {self.shard_count} shards"
+                )
+        return files
+
+    def seed_new_shards(self, bases, read, write):
+        """Give each shard of this process that has none of its ``bases`` files yet its guilds.
+
+        The guilds come from ``previous_layout(*bases)``: ``read(paths)``
+        returns the ``{guild_id: ...}`` mapping kept in one old shard's files
+        (one path per base) and ``write(shard_id, guilds)`` stores a new
+        shard's part. Every new shard is written right away, even when it
+        gets no guilds, so it counts as present from then on. Returns the
+        ids of the shards that were seeded.
+        """
+        new = [
+            shard_id for shard_id in self.shard_ids
+            if not any(os.path.exists(self.path(base, shard_id)) for base in bases)
+        ]
+        if not new:
+            return []
+        previous = {}
+        for paths in self.previous_layout(*bases):
+            previous.update(read(paths))
+        for shard_id in new:
+            write(shard_id, {g: value for g, value in previous.items() if self.shard_of(g) == shard_id})
+        return new
+
+    def bot_kwargs(self):
+        if not self.enabled:
+            return {}
+        return {"shard_count": self.shard_count, "shard_ids": self.shard_ids}
+
+    def describe(self):
+        if not self.enabled:
+            return "unsharded"
+        return f"shards {','.join(map(str, self.shard_ids))} of {self.shard_count}"
@@ -0,0 +1,72 @@
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import Hakurei_Shrine_Work as HSW
+from ledger import SPECIAL
+
+
+class AsyncStorage:
+    """Awaitable wrappers for the blocking ledger, message and work-journal calls.
+
+    Everything runs on a dedicated pool of ``max_workers`` threads, so a slow
+    disk queues storage work there instead of stalling the event loop, and
+    the default executor stays free for the background flushes. The callers
+    already serialize each user's read-modify-write with ``UserLocks``; the
+    stores themselves are thread-safe. ``on_timing(op, seconds)`` receives
+    the time each call took, queueing included.
+    """
+
+    def __init__(self, ledger, message_store, max_workers=4, on_timing=None):
+        self.ledger = ledger
+        self.message_store = message_store
+        self.max_workers = max_workers
+        self.on_timing = on_timing
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="reimu-storage")
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def run(self, op, fn, *args, **kwargs):
+        started = time.perf_counter()
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, functools.partial(fn, *args, **kwargs)
+            )
+        finally:
+            self.in_flight -= 1
+            if self.on_timing is not None:
+                self.on_timing(op, time.perf_counter() - started)
+
+    async def get_balance(self, guild_id, user_id):
+        return await self.run("get_balance", self.ledger.get_balance, guild_id, user_id)
+
+    async def credit(self, guild_id, user_id, amount, pocket=SPECIAL):
+        return await self.run("credit", self.ledger.credit, guild_id, user_id, amount, pocket)
+
+    async def debit(self, guild_id, user_id, amount):
+        return await self.run("debit", self.ledger.debit, guild_id, user_id, amount)
+
+    async def debit_from_one(self, guild_id, user_id, amount):
+        return await self.run("debit_from_one", self.ledger.debit_from_one, guild_id, user_id, amount)
+
+    async def do_work(self, guild_id, user_id):
+        return await self.run("do_work", HSW.do_work, guild_id, user_id)
+
+    async def record_message(self, user_id, message):
+        return await self.run("record_message", self.message_store.record, user_id, message)
+
+    async def recent_messages(self, user_id, limit):
+        return await self.run("recent_messages", self.message_store.recent, user_id, limit)
+
+    def stats(self):
+        return {
+            "workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,78 @@
+import time
+
+DISCORD_LIMIT = 2000
+
+
+def split_point(text, limit=DISCORD_LIMIT):
+    """Where to cut ``text`` so the first part fits in ``limit`` characters.
+
+    Prefers the last line break, then the last space, in the second half of
+    the window; a single word longer than that is cut mid-word.
+    """
+    if len(text) <= limit:
+        return len(text)
+    for sep in ("\n", " "):
+        cut = text.rfind(sep, limit // 2, limit)
+        if cut != -1:
+            return cut + 1
+    return limit
+
+
+class StreamingReply:
+    """Shows a reply in a channel while it is still being generated.
+
+    The first non-blank text is sent as soon as it arrives. Later text is
+    applied by editing that message at most once every ``edit_interval``
+    seconds, which keeps a long reply well inside Discord's edit rate
+    limit. When the text outgrows ``limit`` characters, the message is
+    finished at a line break or space and the rest continues in a new
+    message. ``finish()`` applies whatever is still pending.
+    """
+
+    def __init__(self, channel, edit_interval=1.2, limit=DISCORD_LIMIT):
+        self.channel = channel
+        self.edit_interval = edit_interval
+        self.limit = limit
+        self.text = ""
+        self.messages = []
+        self.edits = 0
+        self._start = 0
+        self._current = None
+        self._shown = ""
+        self._last_update = 0.0
+
+    async def feed(self, chunk):
+        self.text += chunk
+        if not self.messages:
+            if self.text.strip():
+                await self._update()
+        elif time.monotonic() - self._last_update >= self.edit_interval:
+            await self._update()
+
+    async def finish(self):
+        """Apply any text not shown yet; returns every message sent."""
+        await self._update()
+        return self.messages
+
+    async def _update(self):
+        pending = self.text[self._start:]
+        while len(pending) > self.limit:
+            cut = split_point(pending, self.limit)
+            await self._show(pending[:cut])
+            self._start += cut
+            self._current = None
+            pending = self.text[self._start:]
+        await self._show(pending)
+        self._last_update = time.monotonic()
+
+    async def _show(self, content):
+        content = content.strip()
+        if not content or (self._current is not None and content == self._shown):
+            return
+        if self._current is None:
+            self._current = await self.channel.send(content)
+            self.messages.append(self._current)
+        else:
+            await self._current.edit(content=content)
+            self.edits += 1
+        self._shown = content
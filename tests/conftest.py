@@ -0,0 +1,10 @@
+import pytest
+
+from reimu_db import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / "reimu.db"))
+    yield database
+    database.close()
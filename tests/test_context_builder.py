@@ -0,0 +1,112 @@
+from context_builder import ContextBuilder, TokenCounter
+
+
+class FakeStore:
+    def __init__(self):
+        self.rows = {}
+        self.reads = 0
+
+    def recent(self, user_id, limit):
+        self.reads += 1
+        return list(reversed(self.rows.get(user_id, [])))[:limit]
+
+
+def words(text):
+    return len(text.split())
+
+
+def test_window_is_cached_and_extended():
+    store = FakeStore()
+    store.rows["u1"] = [("u1", "hello")]
+    builder = ContextBuilder(store, count_tokens=words)
+    assert builder.build("u1") == "u1 says hello"
+    builder.add("u1", "again")
+    assert builder.build("u1") == "u1 says hello\nu1 says again"
+    assert store.reads == 1
+
+
+def test_window_expires_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("context_builder.time.monotonic", lambda: now[0])
+    store = FakeStore()
+    store.rows["u1"] = [("u1", "old")]
+    builder = ContextBuilder(store, count_tokens=words, ttl=60)
+    assert builder.build("u1") == "u1 says old"
+    # The purge ran in another process; only the TTL drops the stale line
+    store.rows["u1"] = []
+    now[0] += 59
+    assert builder.cached("u1")
+    assert builder.build("u1") == "u1 says old"
+    now[0] += 1
+    assert not builder.cached("u1")
+    assert builder.build("u1") == ""
+    assert store.reads == 2
+
+
+def test_over_budget_line_is_skipped_not_a_stop():
+    store = FakeStore()
+    store.rows["u1"] = [("u1", "old"), ("u1", "x " * 50), ("u1", "new")]
+    builder = ContextBuilder(store, token_budget=8, count_tokens=words)
+    assert builder.build("u1") == "u1 says old\nu1 says new"
+
+
+def test_add_trims_oldest_lines_to_budget():
+    store = FakeStore()
+    store.rows["u1"] = [("u1", "a"), ("u1", "b")]
+    builder = ContextBuilder(store, token_budget=7, count_tokens=words)
+    builder.build("u1")
+    builder.add("u1", "c")
+    assert builder.build("u1") == "u1 says b\nu1 says c"
+    builder.add("u1", "c", repeat_count=1)
+    assert builder.build("u1") == "u1 says b\nu1 says c"
+
+
+def test_peek_does_not_cache():
+    store = FakeStore()
+    store.rows["u1"] = [("u1", "hi")]
+    builder = ContextBuilder(store, count_tokens=words)
+    assert builder.peek("u1") == "u1 says hi"
+    assert not builder.cached("u1")
+
+
+def test_estimate_counts_cjk_characters_individually():
+    count = TokenCounter(encoding="no-such-encoding")
+    assert count("hello, world") == 3
+    assert count("博丽灵梦") == 4
+    assert count("reimu说你好") == 4
+
+
+def test_rows_read_during_an_add_are_not_cached():
+    store = FakeStore()
+    store.rows["u1"] = [("u1", "first")]
+    builder = ContextBuilder(store, count_tokens=words)
+    with builder.loading("u1") as load:
+        rows = store.recent("u1", builder.max_rows)
+        # record() commits "second" after the read, before the window exists
+        store.rows["u1"].append(("u1", "second"))
+        builder.add("u1", "second")
+    assert load.stale
+    assert builder.peek("u1", rows) == "u1 says first"
+    assert not builder.cached("u1")
+    assert builder.build("u1") == "u1 says first\nu1 says second"
+
+
+def test_undisturbed_load_can_be_cached():
+    store = FakeStore()
+    store.rows["u1"] = [("u1", "first")]
+    builder = ContextBuilder(store, count_tokens=words)
+    with builder.loading("u1") as load:
+        rows = store.recent("u1", builder.max_rows)
+        builder.add("u2", "elsewhere")
+        builder.add("u1", "first", repeat_count=1)
+    assert not load.stale
+    assert builder.build("u1", rows) == "u1 says first"
+    assert builder.cached("u1")
+    assert builder._loads == {}
+
+
+def test_invalidate_marks_loads_in_flight_stale():
+    builder = ContextBuilder(FakeStore(), count_tokens=words)
+    with builder.loading("u1") as first, builder.loading("u2") as second:
+        builder.invalidate()
+    assert first.stale and second.stale
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+import Hakurei_Shrine_Work as HSW
+
+
+@pytest.fixture(autouse=True)
+def shrine(tmp_path, monkeypatch):
+    # The module keeps its state in globals and its files in the working directory
+    monkeypatch.chdir(tmp_path)
+    for name, value in (("_view", None), ("_plan", None), ("_journals", {}), ("_journal_entries", {}), ("_compactor", None)):
+        monkeypatch.setattr(HSW, name, value)
+    yield tmp_path
+    for journal in HSW._journals.values():
+        journal.close()
+
+
+def reload():
+    for journal in HSW._journals.values():
+        journal.close()
+    HSW._journals.clear()
+    HSW._view = None
+    return HSW.load_work_data()
+
+
+def test_work_is_journaled_and_replayed():
+    HSW.load_work_data()
+    HSW.do_work("g1", "u1")
+    HSW.do_work("g1", "u1")
+    HSW.do_work("g2", "u2")
+    assert HSW.journal_size() == 3
+    assert not os.path.exists(HSW.WORK_FILE)
+
+    view = reload()
+    assert sum(view["g1"]["u1"][kind] for kind in ("basic", "normal", "hard")) == 2
+    assert view["g2"]["u2"]["basic"] == 1
+    assert HSW.journal_size() == 3
+
+
+def test_replay_skips_a_torn_last_line(shrine):
+    HSW.load_work_data()
+    HSW.do_work("g1", "u1")
+    with open(HSW.JOURNAL_FILE, "a", encoding="utf-8") as f:
+        f.write('{"g": "g1", "u": "u1", "r": {"basic"')
+    view = reload()
+    assert view["g1"]["u1"]["basic"] == 1
+    assert HSW.journal_size() == 1
+
+
+def test_compact_writes_a_snapshot_and_empties_the_journal(shrine):
+    HSW.load_work_data()
+    assert not HSW.compact()
+    HSW.do_work("g1", "u1")
+    assert HSW.compact()
+    assert HSW.journal_size() == 0
+    assert (shrine / HSW.JOURNAL_FILE).read_text() == ""
+    assert json.loads((shrine / HSW.WORK_FILE).read_text())["g1"]["u1"]["basic"] == 1
+
+    # Work after the compaction lands in the fresh journal, on top of the snapshot
+    HSW.do_work("g1", "u1")
+    view = reload()
+    assert view["g1"]["u1"]["basic"] == 2
+    assert HSW.journal_size() == 1
+
+
+def test_periodic_compaction_and_stop(shrine):
+    HSW.load_work_data()
+    HSW.do_work("g1", "u1")
+
+    async def main():
+        HSW.start_compaction(interval=0.01)
+        await asyncio.sleep(0.05)
+        await HSW.stop_compaction()
+
+    asyncio.run(main())
+    assert HSW.journal_size() == 0
+    assert json.loads((shrine / HSW.WORK_FILE).read_text())["g1"]["u1"]["basic"] == 1
@@ -0,0 +1,23 @@
+from key_pool import KeyPool
+
+
+def test_shares_split_each_keys_quota():
+    pool = KeyPool([{"key": "sk-one", "limit": 200, "remaining": 150}], shares=4)
+    key = pool.keys[0]
+    assert (key.limit, key.remaining) == (50, 37)
+
+
+def test_shared_remaining_header_is_divided():
+    pool = KeyPool([{"key": "sk-one", "limit": 200}], shares=4)
+    key = pool.acquire()
+    pool.report(key, 200, {"x-ratelimit-remaining-requests": "120"})
+    assert key.remaining == 30
+    pool.report(key, 200, {"x-ratelimit-remaining-requests": "1000"})
+    assert key.remaining == 50
+
+
+def test_exhausted_share_stops_handing_out_the_key():
+    pool = KeyPool([{"key": "sk-one", "limit": 4}], shares=2)
+    for _ in range(2):
+        pool.report(pool.acquire(), 200)
+    assert pool.acquire() is None
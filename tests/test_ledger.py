@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+from ledger import REGULAR, SPECIAL, InsufficientFunds, Ledger, iter_json_members
+
+
+@pytest.fixture
+def ledger(db):
+    ledger = Ledger(db)
+    ledger.init_schema()
+    return ledger
+
+
+def test_credit_adds_to_one_pocket(ledger):
+    assert ledger.get_balance("g", "u") == (0, 0)
+    assert ledger.credit("g", "u", 30) == (30, 0)
+    assert ledger.credit("g", "u", 5, pocket=REGULAR) == (30, 5)
+    assert ledger.get_balance("g", "u") == (30, 5)
+    assert ledger.get_balance("other", "u") == (0, 0)
+
+
+def test_debit_spends_special_before_regular(ledger):
+    ledger.credit("g", "u", 30)
+    ledger.credit("g", "u", 50, pocket=REGULAR)
+    assert ledger.debit("g", "u", 20) == (10, 50)
+    assert ledger.debit("g", "u", 25) == (0, 35)
+    assert ledger.get_balance("g", "u") == (0, 35)
+
+
+def test_insufficient_funds_changes_nothing(ledger):
+    ledger.credit("g", "u", 10)
+    ledger.credit("g", "u", 5, pocket=REGULAR)
+    with pytest.raises(InsufficientFunds) as excinfo:
+        ledger.debit("g", "u", 16)
+    assert (excinfo.value.special, excinfo.value.regular, excinfo.value.amount) == (10, 5, 16)
+    assert excinfo.value.total == 15
+    assert ledger.get_balance("g", "u") == (10, 5)
+
+
+def test_debit_from_one_never_splits(ledger):
+    ledger.credit("g", "u", 10)
+    ledger.credit("g", "u", 20, pocket=REGULAR)
+    assert ledger.debit_from_one("g", "u", 10) == (SPECIAL, 0, 20)
+    assert ledger.debit_from_one("g", "u", 15) == (REGULAR, 0, 5)
+    assert ledger.debit_from_one("g", "u", 6) == (None, 0, 5)
+    assert ledger.get_balance("g", "u") == (0, 5)
+
+
+def test_migration_runs_once(ledger, tmp_path):
+    special = tmp_path / "Reimu_balance.json"
+    regular = tmp_path / "balance.json"
+    special.write_text(json.dumps({"g1": {"u1": 10, "u2": "7"}, "g2": {"u1": 2**70}}))
+    regular.write_text(json.dumps({"g1": {"u1": 3}, "bad": [1, 2]}))
+
+    assert ledger.migrate_from_json(str(special), str(regular), batch_size=1) == 4
+    assert ledger.get_balance("g1", "u1") == (10, 3)
+    assert ledger.get_balance("g1", "u2") == (7, 0)
+    assert ledger.get_balance("g2", "u1") == (2**63 - 1, 0)
+
+    ledger.debit("g1", "u1", 12)
+    regular.write_text(json.dumps({"g1": {"u1": 999}}))
+    assert ledger.migrate_from_json(str(special), str(regular)) == 0
+    assert ledger.get_balance("g1", "u1") == (0, 1)
+
+
+def test_migration_without_files(ledger, tmp_path):
+    assert ledger.migrate_from_json(str(tmp_path / "a.json"), str(tmp_path / "b.json")) == 0
+    assert ledger.migrate_from_json(str(tmp_path / "a.json"), str(tmp_path / "b.json")) == 0
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+@pytest.mark.parametrize("read_size", [1, 2, 3, 7, 1 << 16])
+def test_iter_json_members_matches_json_load(tmp_path, read_size, ensure_ascii):
+    data = {
+        "plain": {"u": 1},
+        'quote"d': {"a\\b": -12345678901234567890},
+        "brace}{,:": [1.5e3, None, True, "xé中"],
+        "幸运": {},
+        "": 0,
+    }
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps(data, indent=1, ensure_ascii=ensure_ascii), encoding="utf-8")
+    assert dict(iter_json_members(str(path), read_size=read_size)) == data
+
+
+@pytest.mark.parametrize("text", ["", "  \n", "{}", " { } "])
+def test_iter_json_members_empty(tmp_path, text):
+    path = tmp_path / "data.json"
+    path.write_text(text)
+    assert list(iter_json_members(str(path), read_size=1)) == []
+
+
+def test_iter_json_members_rejects_non_objects(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text("[1, 2]")
+    with pytest.raises(ValueError):
+        list(iter_json_members(str(path), read_size=2))
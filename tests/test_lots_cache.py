@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+from lots_cache import LotsCache
+
+
+def test_flush_writes_only_after_changes(tmp_path):
+    path = tmp_path / "lots.json"
+    path.write_text(json.dumps({"g1": {"u1": {"repeat_count": 1}}, "g2": {}}))
+    cache = LotsCache(str(path))
+    cache.load()
+    assert not cache.flush()
+    cache.get("g1", "u1")["repeat_count"] = 2
+    cache.get("g3", "u9")["total_donated"] = 5
+    cache.mark_dirty("g1")
+    cache.mark_dirty("g3")
+    assert cache.flush()
+    assert json.loads(path.read_text()) == {
+        "g1": {"u1": {"repeat_count": 2}}, "g2": {}, "g3": {"u9": {"total_donated": 5}},
+    }
+    assert cache.stats()["hits"] == 1
+
+
+def test_failed_flush_keeps_guilds_dirty(tmp_path, monkeypatch):
+    cache = LotsCache(str(tmp_path / "lots.json"))
+    cache.load()
+    cache.get("g1", "u1")["repeat_count"] = 1
+    cache.mark_dirty("g1")
+
+    def broken(users):
+        raise TypeError("not JSON serializable")
+
+    monkeypatch.setattr(cache, "_encode", broken)
+    assert not asyncio.run(cache.flush_async())
+    assert not cache.flush()
+    assert cache.dirty
+    assert cache.stats()["flush_errors"] == 2
+
+    monkeypatch.undo()
+    assert asyncio.run(cache.flush_async())
+    assert not cache.dirty
+    assert json.loads((tmp_path / "lots.json").read_text()) == {"g1": {"u1": {"repeat_count": 1}}}
+
+
+def test_background_flush_survives_errors_and_stop_flushes(tmp_path, monkeypatch):
+    path = tmp_path / "lots.json"
+    cache = LotsCache(str(path), flush_interval=0.01)
+    cache.load()
+    writes = []
+    write = cache._write
+
+    def flaky(dirty):
+        writes.append(set(dirty))
+        if len(writes) == 1:
+            raise ValueError("boom")
+        write(dirty)
+
+    monkeypatch.setattr(cache, "_write", flaky)
+
+    async def main():
+        cache.start()
+        cache.get("g1", "u1")["repeat_count"] = 1
+        cache.mark_dirty("g1")
+        await asyncio.sleep(0.05)
+        cache.get("g2", "u2")["repeat_count"] = 3
+        cache.mark_dirty("g2")
+        await cache.stop()
+
+    asyncio.run(main())
+    assert writes[0] == {"g1"} and writes[1] == {"g1"}
+    assert json.loads(path.read_text()) == {"g1": {"u1": {"repeat_count": 1}}, "g2": {"u2": {"repeat_count": 3}}}
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+import message_store
+from message_store import PERMANENT_AFTER, MessageStore, RetentionJanitor
+
+
+@pytest.fixture(params=[True, False], ids=["returning", "select"])
+def store(request, db, monkeypatch):
+    # Run every test against both the RETURNING upsert and the SQLite < 3.35 fallback
+    monkeypatch.setattr(message_store, "HAS_RETURNING", request.param)
+    store = MessageStore(db)
+    store.init_schema()
+    return store
+
+
+def test_record_counts_repeats(store):
+    assert store.record("u1", "hello") == 0
+    assert store.record("u1", "hello") == 1
+    assert store.record("u2", "hello") == 0
+    assert store.record("u1", "other") == 0
+    assert store.record("u1", "hello") == 2
+
+
+def test_message_becomes_permanent_and_starts_over(store, db):
+    counts = [store.record("u1", "hello") for _ in range(PERMANENT_AFTER + 2)]
+    assert counts == list(range(PERMANENT_AFTER + 1)) + [0]
+    rows = db.execute("SELECT repeat_count, is_permanent FROM UserMessages ORDER BY id")
+    assert rows == [(PERMANENT_AFTER, 1), (0, 0)]
+
+
+def test_recent_mixes_user_and_system_newest_first(store):
+    for text in ("a", "b", "c"):
+        store.record("u1", text)
+    store.record("system", "s")
+    store.record("u2", "x")
+    assert store.recent("u1", 3) == [("system", "s"), ("u1", "c"), ("u1", "b")]
+
+
+def test_purge_expired_keeps_new_and_permanent_rows(store, db):
+    store.record("u1", "old")
+    store.record("u1", "new")
+    for _ in range(PERMANENT_AFTER + 1):
+        store.record("u1", "kept")
+    with db.write() as conn:
+        conn.execute("UPDATE UserMessages SET created_at = '2000-01-01 00:00:00' WHERE message != 'new'")
+    assert store.purge_expired(minutes=30) == 1
+    assert sorted(m for _, m in store.recent("u1", 10)) == ["kept", "new"]
+
+
+def test_janitor_purges_in_batches(store, db):
+    reclaimed = []
+    for i in range(7):
+        store.record("u1", f"message {i}")
+    with db.write() as conn:
+        conn.execute("UPDATE UserMessages SET created_at = '2000-01-01 00:00:00'")
+    janitor = RetentionJanitor(store, batch_size=3, on_reclaim=reclaimed.append)
+
+    async def main():
+        janitor.start()
+        await asyncio.sleep(0.05)
+        await janitor.stop()
+
+    asyncio.run(main())
+    assert reclaimed == [7]
+    assert janitor.stats()["runs"] == 1
+    assert store.recent("u1", 10) == []
@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+from metrics import Histogram, LoopLagMonitor, Metrics, MetricsExporter
+
+
+def test_histogram_quantiles_stay_inside_their_bucket():
+    histogram = Histogram(buckets=(0.01, 0.1, 1.0))
+    for value in (0.005,) * 50 + (0.5,) * 50:
+        histogram.observe(value)
+    assert 0.0 <= histogram.quantile(0.5) <= 0.01
+    assert 0.1 <= histogram.quantile(0.99) <= 1.0
+
+
+def test_exporter_writes_the_textfile_without_the_http_server(tmp_path):
+    metrics = Metrics(buckets=(0.1,))
+    metrics.inc("reimu_errors_total", error="Timeout")
+    metrics.observe("reimu_llm_seconds", 0.05)
+    path = tmp_path / "reimu.prom"
+    MetricsExporter(metrics, path=str(path)).write()
+    text = path.read_text()
+    assert 'reimu_errors_total{error="Timeout"} 1' in text
+    assert 'reimu_llm_seconds_bucket{le="0.1"} 1' in text
+    assert "reimu_llm_seconds_count 1" in text
+
+
+def test_collectors_refresh_gauges_before_each_render():
+    metrics = Metrics()
+    remaining = [200]
+    metrics.collect(lambda: metrics.set("reimu_api_key_remaining", remaining[0], key="...abcd"))
+    assert 'reimu_api_key_remaining{key="...abcd"} 200' in metrics.render()
+    remaining[0] = 150
+    text = metrics.render()
+    assert "# TYPE reimu_api_key_remaining gauge" in text
+    assert 'reimu_api_key_remaining{key="...abcd"} 150' in text
+
+
+def test_loop_lag_monitor_sees_a_blocked_loop():
+    metrics = Metrics()
+    monitor = LoopLagMonitor(metrics, interval=0.01)
+
+    async def main():
+        monitor.start()
+        await asyncio.sleep(0.005)
+        time.sleep(0.1)  # Block the loop past the next sample
+        await asyncio.sleep(0.03)
+        await monitor.stop()
+
+    asyncio.run(main())
+    lag = metrics.histograms("reimu_event_loop_lag_seconds")[""]
+    assert lag["count"] >= 2
+    assert lag["max_ms"] >= 80
+
+
+def test_exporter_rewrites_the_file_until_stopped(tmp_path):
+    metrics = Metrics()
+    path = tmp_path / "reimu.prom"
+    exporter = MetricsExporter(metrics, path=str(path), interval=0.01)
+
+    async def main():
+        await exporter.start()
+        await asyncio.sleep(0.02)
+        metrics.inc("reimu_mentions_total")
+        await asyncio.sleep(0.03)
+        await exporter.stop()
+
+    asyncio.run(main())
+    assert "reimu_mentions_total 1" in path.read_text()
@@ -0,0 +1,49 @@
+import random
+from collections import Counter
+
+import pytest
+
+from omikuji import AliasTable, OmikujiEngine
+
+
+@pytest.mark.parametrize("weights", [[], [0, 0, 0], [3, -1], [-1, -2]])
+def test_rejects_weights_without_a_positive_total_or_with_negatives(weights):
+    with pytest.raises(ValueError):
+        AliasTable(weights)
+
+
+def test_every_column_maps_back_to_the_weights():
+    weights = [5, 1, 0, 2, 8]
+    table = AliasTable(weights)
+    # Each column holds 1/n of the mass, split between itself and its alias
+    mass = [0.0] * len(weights)
+    for column in range(table.n):
+        mass[column] += table.prob[column] / table.n
+        mass[table.alias[column]] += (1.0 - table.prob[column]) / table.n
+    total = sum(weights)
+    assert mass == pytest.approx([w / total for w in weights])
+
+
+def test_sample_frequencies_follow_the_weights():
+    weights = [6, 3, 1, 0]
+    table = AliasTable(weights)
+    rng = random.Random(1234)
+    draws = 100_000
+    counts = Counter(table.sample(rng) for _ in range(draws))
+    assert counts[3] == 0
+    for index, weight in enumerate(weights):
+        assert counts[index] / draws == pytest.approx(weight / sum(weights), abs=0.01)
+
+
+def test_missing_fortunes_weigh_one_and_zero_weight_is_never_drawn():
+    engine = OmikujiEngine(weights={"Great Misfortune": 0})
+    rng = random.Random(7)
+    drawn = Counter(engine.draw(rng).name for _ in range(20_000))
+    assert "Great Misfortune" not in drawn
+    assert len(drawn) == len(engine.fortunes) - 1
+    assert min(drawn.values()) / max(drawn.values()) > 0.85
+
+
+def test_draw_daily_is_stable_for_one_day():
+    engine = OmikujiEngine()
+    assert engine.draw_daily(1, 2) == engine.draw_daily(1, 2)
@@ -0,0 +1,60 @@
+import asyncio
+
+from periodic import PeriodicTask
+
+
+def test_failing_runs_are_logged_and_the_loop_keeps_going(caplog):
+    calls = []
+
+    async def job():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            raise RuntimeError("disk full")
+
+    async def main():
+        task = PeriodicTask(job, 0.01, "Test job", run_first=True)
+        task.start()
+        task.start()
+        await asyncio.sleep(0.035)
+        assert task.running
+        await task.stop()
+        assert not task.running
+
+    asyncio.run(main())
+    assert len(calls) >= 3
+    assert "Test job failed: disk full" in caplog.text
+
+
+def test_stop_waits_for_the_run_in_progress():
+    finished = []
+
+    async def job():
+        await asyncio.sleep(0.05)
+        finished.append(True)
+
+    async def main():
+        task = PeriodicTask(job, 0.01, "Slow job")
+        task.start()
+        await asyncio.sleep(0.03)
+        await task.stop()
+
+    asyncio.run(main())
+    assert finished == [True]
+
+
+def test_executor_jobs_and_first_interval():
+    calls = []
+
+    async def main():
+        task = PeriodicTask(lambda: calls.append(1), 10, "Sync job", in_executor=True)
+        task.start()
+        await asyncio.sleep(0.02)
+        await task.stop()
+        assert calls == []
+        task = PeriodicTask(lambda: calls.append(1), 10, "Sync job", run_first=True, in_executor=True)
+        task.start()
+        await asyncio.sleep(0.02)
+        await task.stop()
+
+    asyncio.run(main())
+    assert calls == [1]
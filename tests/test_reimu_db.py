@@ -0,0 +1,47 @@
+from ledger import Ledger
+from message_store import MessageStore
+from reimu_db import Database
+
+
+def test_timings_carry_the_callers_label(tmp_path):
+    timings = []
+    db = Database(str(tmp_path / "reimu.db"), on_timing=lambda op, seconds: timings.append(op))
+    try:
+        ledger = Ledger(db)
+        ledger.init_schema()
+        store = MessageStore(db)
+        store.init_schema()
+        timings.clear()
+
+        ledger.credit("g", "u", 10)
+        ledger.debit("g", "u", 3)
+        ledger.get_balance("g", "u")
+        store.record("u", "hello")
+        store.recent("u", 5)
+        with db.write() as conn:
+            conn.execute("DELETE FROM Balances")
+        db.execute("SELECT 1")
+    finally:
+        db.close()
+    assert timings == [
+        "ledger.credit", "ledger.debit", "ledger.get_balance",
+        "messages.record", "messages.recent", "write", "read",
+    ]
+
+
+def test_nested_writes_share_one_transaction(tmp_path):
+    db = Database(str(tmp_path / "reimu.db"))
+    try:
+        with db.write() as conn:
+            conn.execute("CREATE TABLE t (x INTEGER)")
+        try:
+            with db.write("outer") as conn:
+                conn.execute("INSERT INTO t VALUES (1)")
+                with db.write("inner") as inner:
+                    inner.execute("INSERT INTO t VALUES (2)")
+                raise RuntimeError("roll back both")
+        except RuntimeError:
+            pass
+        assert db.execute("SELECT COUNT(*) FROM t") == [(0,)]
+    finally:
+        db.close()
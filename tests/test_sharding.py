@@ -0,0 +1,118 @@
+import json
+import os
+
+import pytest
+
+import Hakurei_Shrine_Work as HSW
+from lots_cache import LotsCache, ShardedLotsCache
+from sharding import ShardPlan, parse_shard_ids, shard_for, shard_path
+
+# Guild i lands on shard i % count for every count that divides 8
+GUILDS = [str(i << 22) for i in range(8)]
+
+
+def age(*paths):
+    # The newest layout wins; don't leave that to the filesystem's timestamp resolution
+    for path in paths:
+        if os.path.exists(path):
+            os.utime(path, (1_000_000, 1_000_000))
+
+
+def test_shard_ids_and_paths():
+    assert parse_shard_ids(" ") is None
+    assert parse_shard_ids("0,2-4, 7") == [0, 2, 3, 4, 7]
+    assert [shard_for(g, 4) for g in GUILDS] == [0, 1, 2, 3, 0, 1, 2, 3]
+    assert shard_path("Reimu_lots.json", 3, 8) == "Reimu_lots.shard3of8.json"
+    with pytest.raises(ValueError):
+        ShardPlan(4, [4])
+
+
+def lots(tmp_path, count, shard_ids=None):
+    cache = ShardedLotsCache(str(tmp_path / "Reimu_lots.json"), ShardPlan(count, shard_ids))
+    cache.load()
+    return cache
+
+
+def test_lots_move_from_unsharded_to_2_then_4_shards(tmp_path):
+    unsharded = LotsCache(str(tmp_path / "Reimu_lots.json"))
+    unsharded.load()
+    for guild_id in GUILDS[:6]:
+        unsharded.get(guild_id, "u1")["total_donated"] = int(guild_id) >> 22
+        unsharded.mark_dirty(guild_id)
+    unsharded.flush()
+
+    two = lots(tmp_path, 2)
+    age(tmp_path / "Reimu_lots.json")
+    assert json.loads((tmp_path / "Reimu_lots.shard1of2.json").read_text()).keys() == {GUILDS[1], GUILDS[3], GUILDS[5]}
+    two.get(GUILDS[5], "u1")["total_donated"] = 999
+    two.mark_dirty(GUILDS[5])
+    two.flush()
+
+    # Seeded from the 2-shard files, which are newer than the unsharded one
+    four = lots(tmp_path, 4)
+    assert {g: four.get(g, "u1").get("total_donated") for g in GUILDS[:6]} == {
+        GUILDS[0]: 0, GUILDS[1]: 1, GUILDS[2]: 2, GUILDS[3]: 3, GUILDS[4]: 4, GUILDS[5]: 999,
+    }
+    # Shards 6 and 7 held nothing, but shard 3 of 4 still got a file
+    assert json.loads((tmp_path / "Reimu_lots.shard3of4.json").read_text()) == {GUILDS[3]: {"u1": {"total_donated": 3}}}
+
+
+def test_a_process_running_some_shards_seeds_only_those(tmp_path):
+    unsharded = LotsCache(str(tmp_path / "Reimu_lots.json"))
+    unsharded.load()
+    for guild_id in GUILDS:
+        unsharded.get(guild_id, "u1")["repeat_count"] = 1
+        unsharded.mark_dirty(guild_id)
+    unsharded.flush()
+
+    first = lots(tmp_path, 4, [0, 1])
+    assert sorted(first.data) == sorted([GUILDS[0], GUILDS[1], GUILDS[4], GUILDS[5]])
+    assert not (tmp_path / "Reimu_lots.shard2of4.json").exists()
+    second = lots(tmp_path, 4, [2, 3])
+    assert sorted(second.data) == sorted([GUILDS[2], GUILDS[3], GUILDS[6], GUILDS[7]])
+
+
+def test_refuses_to_reshard_from_an_incomplete_layout(tmp_path):
+    lots(tmp_path, 2)
+    (tmp_path / "Reimu_lots.shard1of2.json").unlink()
+    with pytest.raises(RuntimeError, match=r"shards \[1\] have no file"):
+        lots(tmp_path, 4)
+
+
+@pytest.fixture
+def shrine(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for name, value in (("_view", None), ("_plan", None), ("_journals", {}), ("_journal_entries", {})):
+        monkeypatch.setattr(HSW, name, value)
+    yield tmp_path
+    for journal in HSW._journals.values():
+        journal.close()
+
+
+def restart_shrine(count):
+    for journal in HSW._journals.values():
+        journal.close()
+    HSW._journals.clear()
+    HSW._view = None
+    HSW.configure_shards(ShardPlan(count))
+    return HSW.load_work_data()
+
+
+def test_work_journal_moves_to_new_shards_with_its_replay(shrine):
+    HSW.load_work_data()
+    HSW.do_work(GUILDS[0], "u1")
+    HSW.compact()
+    # Left in the journal only: the seed has to replay it too
+    HSW.do_work(GUILDS[1], "u1")
+
+    view = restart_shrine(2)
+    age(shrine / "Hakurei_work.json", shrine / "Hakurei_work.journal")
+    assert view[GUILDS[0]]["u1"]["basic"] == view[GUILDS[1]]["u1"]["basic"] == 1
+    assert HSW.journal_size() == 0
+    HSW.do_work(GUILDS[3], "u2")
+    assert (shrine / "Hakurei_work.shard1of2.journal").exists()
+
+    view = restart_shrine(4)
+    assert {g for g in view} == {GUILDS[0], GUILDS[1], GUILDS[3]}
+    assert json.loads((shrine / "Hakurei_work.shard2of4.json").read_text()) == {}
+    assert json.loads((shrine / "Hakurei_work.shard3of4.json").read_text())[GUILDS[3]]["u2"]["basic"] == 1
@@ -0,0 +1,35 @@
+import asyncio
+import os
+
+import pytest
+
+from workers import WorkerError, WorkerPool
+
+
+async def double(value):
+    # Module level, so the spawned workers can import it
+    if value == "crash":
+        os._exit(3)
+    if value == "fail":
+        raise ValueError("bad value")
+    return value * 2
+
+
+def test_results_errors_and_an_immediate_crash():
+    async def main():
+        pool = WorkerPool(double, size=2, heartbeat=0.2, timeout=10)
+        pool.start()
+        try:
+            assert await pool.submit("u1", 21) == 42
+            with pytest.raises(WorkerError, match="ValueError: bad value"):
+                await pool.submit("u1", "fail")
+            # Dying right after a reply must not wedge the other worker's answers or the restarted one's
+            with pytest.raises(WorkerError, match="exited"):
+                await pool.submit("u1", "crash")
+            await asyncio.sleep(0.5)
+            assert [await pool.submit(key, 1) for key in ("u1", "u2", "u3", "u4")] == [2, 2, 2, 2]
+            assert sum(w.restarts for w in pool._workers) == 1
+        finally:
+            await pool.stop()
+
+    asyncio.run(main())
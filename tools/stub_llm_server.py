@@ -0,0 +1,98 @@
+"""Local OpenAI-compatible chat completion server for testing Reimu without an API key.
+
+Run it, then point the bot at it:
+
+    python tools/stub_llm_server.py --port 8081 --latency 0.5
+    REIMU_API_URL=http://127.0.0.1:8081/v1 python Reimu.py
+
+Requests with ``"stream": true`` get the reply as server-sent events, one
+word every ``--token-delay`` seconds; ``--words`` pads replies to a given
+length so long answers can be tried out.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from aiohttp import web
+
+
+def build_app(latency=0.0, token_delay=0.02, words=0):
+    stats = {"requests": 0, "streamed": 0}
+
+    def reply_text(prompt):
+        text = f"(stub) Reimu heard: {prompt}"
+        if words:
+            filler = text.split() or ["omikuji"]
+            text = " ".join(filler[i % len(filler)] for i in range(words))
+        return text
+
+    async def stream_reply(request, payload, text):
+        stats["streamed"] += 1
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await resp.prepare(request)
+        base = {
+            "id": f"chatcmpl-stub-{stats['requests']}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": payload.get("model", "stub"),
+        }
+        pieces = text.split(" ")
+        for i, piece in enumerate(pieces):
+            delta = {"content": piece if i == 0 else " " + piece}
+            if i == 0:
+                delta["role"] = "assistant"
+            chunk = dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": None}])
+            await resp.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            if token_delay:
+                await asyncio.sleep(token_delay)
+        done = dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        await resp.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        await resp.write_eof()
+        return resp
+
+    async def chat_completions(request):
+        payload = await request.json()
+        stats["requests"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        prompt = next(
+            (m["content"] for m in reversed(payload.get("messages", [])) if m.get("role") == "user"),
+            ""
+        )
+        if payload.get("stream"):
+            return await stream_reply(request, payload, reply_text(prompt))
+        return web.json_response({
+            "id": f"chatcmpl-stub-{stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply_text(prompt)},
+                "finish_reason": "stop"
+            }],
+        })
+
+    async def get_stats(request):
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between streamed words")
+    parser.add_argument("--words", type=int, default=0, help="pad every reply to this many words")
+    args = parser.parse_args()
+    web.run_app(build_app(args.latency, args.token_delay, args.words), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
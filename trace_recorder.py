@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+TRACE_VERSION = 1
+
+
+class TraceRecorder:
+    """Appends anonymized gateway events to a JSON-lines trace for later replay.
+
+    Only the shape of the traffic is kept: when each event arrived, which
+    (pseudonymous) guild, channel and user it came from, whether it was a
+    mention or a reply, and how long the text was. IDs are replaced by a
+    keyed BLAKE2b digest, so they stay consistent within a trace but cannot
+    be matched back to Discord IDs without the salt. Message text is never
+    written.
+    """
+
+    def __init__(self, path, salt=None):
+        self.path = path
+        self.salt = (salt.encode("utf-8") if isinstance(salt, str) else salt) or os.urandom(16)
+        self._started = time.monotonic()
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+        self.events = 0
+        self._write({
+            "kind": "header",
+            "version": TRACE_VERSION,
+            "started": datetime.now(timezone.utc).isoformat(),
+        })
+
+    def pseudonym(self, value):
+        if value is None:
+            return None
+        return hashlib.blake2b(str(value).encode("utf-8"), key=self.salt, digest_size=8).hexdigest()
+
+    def _write(self, event):
+        self._file.write(json.dumps(event, separators=(",", ":")) + "\n")
+
+    def _event(self, kind, **fields):
+        self.events += 1
+        self._write({"t": round(time.monotonic() - self._started, 4), "kind": kind, **fields})
+
+    def record_message(self, message, mention, reply):
+        content = message.content or ""
+        self._event(
+            "message",
+            guild=self.pseudonym(message.guild.id if message.guild else None),
+            channel=self.pseudonym(message.channel.id),
+            user=self.pseudonym(message.author.id),
+            mention=mention,
+            reply=reply,
+            length=len(content),
+            words=len(content.split()),
+        )
+
+    def record_command(self, ctx):
+        # Option values are amounts, pages and fixed choices, never free text
+        options = {o["name"]: o["value"] for o in (getattr(ctx, "selected_options", None) or [])}
+        self._event(
+            "command",
+            command=ctx.command.qualified_name,
+            guild=self.pseudonym(ctx.guild.id if ctx.guild else None),
+            user=self.pseudonym(ctx.author.id),
+            options=options,
+        )
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def read_trace(path):
+    """Yield the events of a trace file, skipping headers and any torn line.
+
+    A trace appended to by several bot runs has one header per run; times
+    are shifted so each run continues where the previous one ended.
+    """
+    offset = last = 0.0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if event.get("kind") == "header":
+                offset = last
+                continue
+            event["t"] += offset
+            last = event["t"]
+            yield event
@@ -0,0 +1,56 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+
+class UserLocks:
+    """Per-user asyncio locks for read-modify-write sequences in commands.
+
+    Locks are striped: ``(guild_id, user_id)`` hashes onto one of ``stripes``
+    locks, so memory stays bounded however many users there are. Two users
+    only wait on each other if they share a stripe; one user's commands
+    always run one at a time.
+    """
+
+    def __init__(self, stripes=1024):
+        self.stripes = stripes
+        self._locks = [None] * stripes
+        self.acquisitions = 0
+        self.contended = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def _get(self, guild_id, user_id):
+        index = hash((str(guild_id), str(user_id))) % self.stripes
+        lock = self._locks[index]
+        if lock is None:
+            # Created on first use so it binds to the running loop
+            lock = self._locks[index] = asyncio.Lock()
+        return lock
+
+    @asynccontextmanager
+    async def lock(self, guild_id, user_id):
+        lock = self._get(guild_id, user_id)
+        if lock.locked():
+            self.contended += 1
+            started = time.perf_counter()
+            await lock.acquire()
+            waited = (time.perf_counter() - started) * 1000
+            self.total_wait_ms += waited
+            self.max_wait_ms = max(self.max_wait_ms, waited)
+        else:
+            await lock.acquire()
+        self.acquisitions += 1
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def stats(self):
+        return {
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "contention_ratio": self.contended / self.acquisitions if self.acquisitions else 0.0,
+            "avg_wait_ms": self.total_wait_ms / self.contended if self.contended else 0.0,
+            "max_wait_ms": self.max_wait_ms,
+        }
@@ -0,0 +1,278 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import zlib
+
+from periodic import PeriodicTask
+
+# Fields every heartbeat carries; anything else comes from the pool's ``health()``
+_BASE_HEALTH = ("pid", "handled", "failed", "in_flight", "lag_ms")
+
+
+class WorkerError(Exception):
+    """Raised when a worker process cannot produce a result (handler error, crash or timeout)."""
+
+
+class WorkerBusy(WorkerError):
+    """Raised when a worker's queue stays full for longer than ``busy_timeout``."""
+
+
+def _worker_main(index, handler, initializer, shutdown, health, requests, results, heartbeat):
+    """Entry point of a worker process: answer requests until a ``None`` arrives."""
+    asyncio.run(_serve(index, handler, initializer, shutdown, health, requests, results, heartbeat))
+
+
+async def _call(hook):
+    outcome = hook()
+    if asyncio.iscoroutine(outcome):
+        await outcome
+
+
+async def _serve(index, handler, initializer, shutdown, health, requests, results, heartbeat):
+    loop = asyncio.get_running_loop()
+    if initializer is not None:
+        await _call(initializer)
+    state = {"handled": 0, "failed": 0, "in_flight": 0, "lag_ms": 0.0}
+    tasks = set()
+    done = asyncio.Event()
+
+    async def run(request_id, args, kwargs):
+        state["in_flight"] += 1
+        try:
+            results.put(("result", request_id, True, await handler(*args, **kwargs)))
+            state["handled"] += 1
+        except Exception as e:
+            logging.exception(f"[Worker {index}] Request failed: {e}")
+            results.put(("result", request_id, False, f"{type(e).__name__}: {e}"))
+            state["failed"] += 1
+        finally:
+            state["in_flight"] -= 1
+
+    def dispatch(item):
+        if item is None:
+            done.set()
+            return
+        task = loop.create_task(run(*item))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    def read_requests():
+        while True:
+            item = requests.get()
+            loop.call_soon_threadsafe(dispatch, item)
+            if item is None:
+                return
+
+    threading.Thread(target=read_requests, name=f"reimu-worker-{index}-requests", daemon=True).start()
+
+    async def report():
+        # The heartbeat doubles as a lag probe: a blocked loop wakes up late
+        while True:
+            started = loop.time()
+            await asyncio.sleep(heartbeat)
+            state["lag_ms"] = max(loop.time() - started - heartbeat, 0.0) * 1000
+            extra = health() if health is not None else {}
+            results.put(("health", None, True, {"pid": os.getpid(), **state, **extra}))
+
+    reporter = loop.create_task(report())
+    await done.wait()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+    reporter.cancel()
+    if shutdown is not None:
+        try:
+            await _call(shutdown)
+        except Exception as e:
+            logging.exception(f"[Worker {index}] Shutdown failed: {e}")
+
+
+class _Worker:
+    def __init__(self, index, max_pending):
+        self.index = index
+        self.process = None
+        self.requests = None
+        self.results = None
+        self.reader = None
+        self.slots = asyncio.Semaphore(max_pending)
+        self.pending = {}
+        self.health = {}
+        self.last_seen = None
+        self.restarts = 0
+
+
+class WorkerPool:
+    """Runs ``handler`` in ``size`` separate processes, fed over multiprocessing queues.
+
+    ``submit(key, *args)`` sends the call to the worker picked by hashing
+    ``key``, so every call for one user lands in the same process and its
+    per-user caches stay coherent. Each worker has at most ``max_pending``
+    calls queued or running; further submits wait for a slot and give up
+    with ``WorkerBusy`` after ``busy_timeout`` seconds, so a backlog stays in
+    the workers instead of piling up in the gateway process.
+
+    ``handler`` is a coroutine function and it, ``initializer``,
+    ``shutdown`` and ``health`` must be importable by the worker
+    (module-level functions). ``initializer()`` runs once when a worker
+    starts and ``shutdown()`` once after it has answered its last request
+    on ``stop``; either may be a coroutine function. Every ``heartbeat``
+    seconds each worker reports its pid, request counts, event-loop lag and
+    whatever ``health()`` returns (scalars are shown in ``stats``, the rest
+    is only available from ``health_reports``). A worker that dies is restarted and its
+    outstanding calls fail with ``WorkerError``. Each worker answers on a
+    queue of its own, replaced when it restarts: a process killed halfway
+    through a send can leave a queue's write lock held forever, and that
+    must not silence the other workers.
+    """
+
+    def __init__(self, handler, size=2, max_pending=32, busy_timeout=5.0, timeout=120.0,
+                 initializer=None, shutdown=None, health=None, heartbeat=5.0):
+        self.handler = handler
+        self.size = size
+        self.max_pending = max_pending
+        self.busy_timeout = busy_timeout
+        self.timeout = timeout
+        self.initializer = initializer
+        self.shutdown = shutdown
+        self.health = health
+        self.heartbeat = heartbeat
+        self._context = multiprocessing.get_context("spawn")
+        self._workers = []
+        self._supervisor = PeriodicTask(self._restart_dead, heartbeat, "Worker supervision")
+        self._loop = None
+        self._ids = itertools.count()
+        self.rejected = 0
+
+    def _spawn(self, worker):
+        worker.requests = self._context.Queue()
+        worker.results = self._context.Queue()
+        worker.process = self._context.Process(
+            target=_worker_main,
+            args=(worker.index, self.handler, self.initializer, self.shutdown, self.health,
+                  worker.requests, worker.results, self.heartbeat),
+            name=f"reimu-worker-{worker.index}",
+            daemon=True,
+        )
+        worker.process.start()
+        worker.last_seen = time.monotonic()
+        worker.reader = threading.Thread(
+            target=self._read_results, args=(worker, worker.results),
+            name=f"reimu-worker-{worker.index}-results", daemon=True,
+        )
+        worker.reader.start()
+        logging.info(f"[Workers] Started worker {worker.index} (pid {worker.process.pid})")
+
+    def _read_results(self, worker, results):
+        # Polls, so the thread ends once a restart or stop() has replaced this queue
+        while worker.results is results:
+            try:
+                item = results.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            self._loop.call_soon_threadsafe(self._deliver, worker, *item)
+
+    def _deliver(self, worker, kind, request_id, ok, value):
+        worker.last_seen = time.monotonic()
+        if kind == "health":
+            worker.health = value
+            return
+        future = worker.pending.pop(request_id, None)
+        if future is None or future.done():
+            return
+        if ok:
+            future.set_result(value)
+        else:
+            future.set_exception(WorkerError(value))
+
+    def _fail_pending(self, worker, reason):
+        for future in worker.pending.values():
+            if not future.done():
+                future.set_exception(WorkerError(reason))
+        worker.pending.clear()
+
+    async def _restart_dead(self):
+        for worker in self._workers:
+            if worker.process.is_alive():
+                continue
+            logging.error(f"[Workers] Worker {worker.index} exited with code {worker.process.exitcode}, restarting")
+            self._fail_pending(worker, f"worker {worker.index} exited")
+            worker.restarts += 1
+            self._spawn(worker)
+
+    def start(self):
+        """Start the worker processes, or restart any that died; safe to call again."""
+        self._loop = asyncio.get_running_loop()
+        if not self._workers:
+            self._workers = [_Worker(i, self.max_pending) for i in range(self.size)]
+            for worker in self._workers:
+                self._spawn(worker)
+        self._supervisor.start()
+
+    def _pick(self, key):
+        return self._workers[zlib.crc32(str(key).encode("utf-8")) % self.size]
+
+    async def submit(self, key, *args, **kwargs):
+        """Run ``handler(*args, **kwargs)`` in the worker that owns ``key`` and return its result."""
+        worker = self._pick(key)
+        try:
+            await asyncio.wait_for(worker.slots.acquire(), self.busy_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise WorkerBusy(f"worker {worker.index} has {self.max_pending} calls queued")
+        request_id = next(self._ids)
+        future = self._loop.create_future()
+        worker.pending[request_id] = future
+        try:
+            worker.requests.put((request_id, args, kwargs))
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            raise WorkerError(f"worker {worker.index} did not answer within {self.timeout}s")
+        finally:
+            worker.pending.pop(request_id, None)
+            worker.slots.release()
+
+    def stats(self):
+        """One line per worker, for ``/stats``."""
+        now = time.monotonic()
+        summary = {"rejected": self.rejected}
+        for worker in self._workers:
+            health = worker.health
+            state = "up" if worker.process.is_alive() else "down"
+            seen = now - worker.last_seen if worker.last_seen is not None else 0.0
+            if seen > 3 * self.heartbeat:
+                state = "stale"
+            summary[f"worker {worker.index}"] = (
+                f"{state} · pid {health.get('pid', worker.process.pid)} · {len(worker.pending)} queued · "
+                f"{health.get('handled', 0)} done · {health.get('failed', 0)} failed · "
+                f"lag {health.get('lag_ms', 0.0):.0f} ms · seen {seen:.0f}s ago · {worker.restarts} restarts"
+            ) + "".join(
+                f" · {k} {v}" for k, v in health.items()
+                if k not in _BASE_HEALTH and not isinstance(v, (dict, list))
+            )
+        return summary
+
+    def health_reports(self):
+        """The latest heartbeat of every worker, including whatever ``health()`` added."""
+        return [worker.health for worker in self._workers]
+
+    async def stop(self, timeout=10.0):
+        await self._supervisor.stop()
+        if not self._workers:
+            return
+        loop = asyncio.get_running_loop()
+        for worker in self._workers:
+            worker.requests.put(None)
+        for worker in self._workers:
+            await loop.run_in_executor(None, worker.process.join, timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        for worker in self._workers:
+            worker.results = None
+        for worker in self._workers:
+            await loop.run_in_executor(None, worker.reader.join, timeout)
+            self._fail_pending(worker, "worker pool stopped")
+        self._workers = []